@@ -8,33 +8,76 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import asyncio
+import functools
 import hashlib
 import json
 import logging
 import os.path
+import threading
 import time
-from typing import Any, Callable, Dict, List
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
 from urllib import parse
 
 import requests
 from django.conf import settings
-from django.core.cache import cache
 from django.utils import translation
 from django.utils.translation import ugettext as _
+from requests import adapters
 from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.retry import Retry
 
 from backend import env
 from backend.configuration.models.system import SystemSettings
+from backend.core.translation.context import RespectsLanguage
 from backend.exceptions import ApiError, ApiRequestError, ApiResultError, AppBaseException
-from backend.utils.local import local
+from backend.utils.local import inject_request, local
 
 # TODO 整体复杂度较高，待优化降低复杂度和提高可读性
 from .constants import CLIENT_CRT_PATH, SSL_KEY, SSLEnum
 from .exception import DataAPIException
+from .response_cache import response_cache
 from .utils.params import add_esb_info_before_request, remove_auth_args
 
 logger = logging.getLogger("root")
 
+# 按 host 维度共享的连接池，避免每次请求都重新进行 TCP/TLS 握手
+_adapter_pool: Dict[Tuple, adapters.HTTPAdapter] = {}
+_adapter_pool_lock = threading.Lock()
+
+
+def get_pooled_adapter(url: str, pool_maxsize: int, connect_retries: int, backoff_factor: float):
+    """
+    获取 url 对应 host 的共享连接池，HTTPAdapter 内部的 PoolManager 是线程安全的，可以跨线程复用
+    @param url: 实际请求地址
+    @param pool_maxsize: 单个 host 的最大连接数
+    @param connect_retries: 建立连接失败时的重试次数
+    @param backoff_factor: 重试退避因子
+    """
+    parsed_url = parse.urlparse(url)
+    pool_key = (parsed_url.scheme, parsed_url.netloc, pool_maxsize, connect_retries, backoff_factor)
+    adapter = _adapter_pool.get(pool_key)
+    if adapter is not None:
+        return adapter
+
+    with _adapter_pool_lock:
+        adapter = _adapter_pool.get(pool_key)
+        if adapter is None:
+            # 这里只重试连接阶段的异常，读超时交由 DataAPI 自身的重试逻辑，避免非幂等请求被重复提交
+            retry = Retry(
+                total=connect_retries,
+                connect=connect_retries,
+                read=0,
+                status=0,
+                backoff_factor=backoff_factor,
+                raise_on_status=False,
+            )
+            adapter = adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
+            _adapter_pool[pool_key] = adapter
+    return adapter
+
 
 class DataResponse(object):
     """response for data api request"""
@@ -103,6 +146,10 @@ class DataAPI(object):
         cache_time: int = 0,
         default_timeout: int = 30,
         max_retry_times: int = 3,
+        connect_timeout: int = None,
+        pool_maxsize: int = None,
+        connect_retries: int = None,
+        retry_backoff_factor: float = None,
     ):
         """
         初始化一个请求句柄
@@ -122,6 +169,10 @@ class DataAPI(object):
         @param {int} cache_time 缓存时间
         @param {int} default_timeout 默认超时时间
         @param {int} max_retry_times 最大自动重试次数
+        @param {int} connect_timeout 建立连接的超时时间，为空时与读超时一致
+        @param {int} pool_maxsize 单个host的连接池大小，为空时取 settings.DATA_API_POOL_MAXSIZE
+        @param {int} connect_retries 连接失败的重试次数，为空时取 settings.DATA_API_CONNECT_RETRIES
+        @param {float} retry_backoff_factor 连接重试的退避因子，为空时取 settings.DATA_API_RETRY_BACKOFF_FACTOR
         """
         self.base = base
         self.url = f'{base.rstrip("/")}/{url.lstrip("/")}'
@@ -145,6 +196,11 @@ class DataAPI(object):
         self.default_timeout = default_timeout
         self.max_retry_times = max_retry_times
 
+        self.connect_timeout = connect_timeout
+        self.pool_maxsize = pool_maxsize
+        self.connect_retries = connect_retries
+        self.retry_backoff_factor = retry_backoff_factor
+
     def __call__(
         self,
         params=None,
@@ -167,12 +223,11 @@ class DataAPI(object):
             params = {}
         if headers is None:
             headers = {}
-        self.timeout = timeout or self.default_timeout
-        self.request_id = None
-        self.data = data
+        # 超时时间、request_id 等均为单次调用私有的状态，DataAPI 实例会在多线程间共享，不能挂载到 self 上
+        timeout = timeout or self.default_timeout
 
         try:
-            response = self._send_request(params, headers, use_admin=use_admin)
+            response = self._send_request(params, headers, use_admin=use_admin, timeout=timeout)
             if raw:
                 return response.response
 
@@ -194,7 +249,7 @@ class DataAPI(object):
                 params=params,
                 data=data,
                 raw=raw,
-                timeout=self.timeout + 30,
+                timeout=timeout + 30,
                 raise_exception=raise_exception,
                 use_admin=use_admin,
                 headers=headers,
@@ -228,7 +283,7 @@ class DataAPI(object):
             message += f" request_id => {request_id}"
         return message
 
-    def _send_request(self, params, headers, use_admin=False):
+    def _send_request(self, params, headers, use_admin=False, timeout=None):
         # 请求前的参数清洗处理 如果参数冻结了，则无需修改
         if not self.freeze_params:
             if self.before_request is not None:
@@ -242,19 +297,31 @@ class DataAPI(object):
 
         # 是否有默认返回，调试阶段可用
         if self.default_return_value is not None:
-            return DataResponse(self.default_return_value, self.request_id)
+            return DataResponse(self.default_return_value, None)
 
-        # 缓存
-        try:
-            cache_key = self._build_cache_key(params)
-            if self.cache_time:
-                result = self._get_cache(cache_key)
-                if result is not None:
-                    # 有缓存时返回
-                    return DataResponse(result, self.request_id)
-        except (TypeError, AttributeError):
-            pass
+        # 缓存：只有开启缓存的接口才需要计算缓存key
+        cache_key = None
+        if self.cache_time:
+            try:
+                cache_key = self._build_cache_key(params)
+            except (TypeError, AttributeError):
+                pass
+
+        if not cache_key:
+            return self._request_upstream(params, headers, use_admin=use_admin, timeout=timeout)
+
+        response_result = response_cache.fetch(
+            api_name=self.url,
+            cache_key=cache_key,
+            cache_time=self.cache_time,
+            fetch_func=lambda: self._request_upstream(params, headers, use_admin=use_admin, timeout=timeout).response,
+        )
+        return DataResponse(response_result, response_result.get("request_id"))
 
+    def _request_upstream(self, params, headers, use_admin=False, timeout=None):
+        """实际请求接口，并记录请求流水"""
+        request_id = None
+        timeout = timeout or self.default_timeout
         response = None
         error_message = ""
 
@@ -262,7 +329,7 @@ class DataAPI(object):
         # 开始时记录请求时间
         start_time = time.time()
         try:
-            raw_response = self._send(params, headers, use_admin=use_admin)
+            raw_response = self._send(params, headers, use_admin=use_admin, timeout=timeout, request_id=request_id)
 
             # http层面的处理结果
             if raw_response.status_code != self.HTTP_STATUS_OK:
@@ -271,7 +338,7 @@ class DataAPI(object):
                     "message": f"[{raw_response.status_code}]" + (raw_response.text or raw_response.reason),
                     "code": raw_response.status_code,
                 }
-                response = DataResponse(request_response, self.request_id)
+                response = DataResponse(request_response, request_id)
                 raise DataAPIException(self.get_error_message(request_response["message"]), response=raw_response)
 
             # 结果层面的处理结果
@@ -288,8 +355,8 @@ class DataAPI(object):
                 raise DataAPIException(_("返回数据格式不正确，结果格式非json."), response=raw_response)
             else:
                 # 防止第三方接口不规范，补充返回数据
-                response_result = self.safe_response(response_result)
-                self.request_id = response_result["request_id"]
+                response_result = self.safe_response(response_result, request_id)
+                request_id = response_result["request_id"]
 
                 # 只有正常返回才会调用 after_request 进行处理
                 if response_result["result"]:
@@ -298,10 +365,7 @@ class DataAPI(object):
                     if self.after_request is not None:
                         response_result = self.after_request(response_result)
 
-                if self.cache_time and "cache_key" in locals():
-                    self._set_cache(locals()["cache_key"], response_result)
-
-                response = DataResponse(response_result, self.request_id)
+                response = DataResponse(response_result, request_id)
                 return response
         finally:
             # 最后记录时间
@@ -352,7 +416,7 @@ class DataAPI(object):
                 "response_message": response_message[:1023],
                 "response_errors": response_errors,
                 "cost_time": (end_time - start_time),
-                "request_id": self.request_id,
+                "request_id": request_id,
                 "request_user": bk_username,
             }
 
@@ -377,27 +441,37 @@ class DataAPI(object):
         cache_key = hash_md5.hexdigest()
         return cache_key
 
-    def _set_cache(self, cache_key, data):
-        """
-        获取缓存
-        :param cache_key:
-        :return:
-        """
-        cache.set(cache_key, data, self.cache_time)
+    def _get_adapter(self, url: str) -> adapters.HTTPAdapter:
+        """获取当前接口所属 host 的共享连接池"""
+        return get_pooled_adapter(
+            url,
+            pool_maxsize=self.pool_maxsize or settings.DATA_API_POOL_MAXSIZE,
+            connect_retries=(
+                settings.DATA_API_CONNECT_RETRIES if self.connect_retries is None else self.connect_retries
+            ),
+            backoff_factor=(
+                settings.DATA_API_RETRY_BACKOFF_FACTOR
+                if self.retry_backoff_factor is None
+                else self.retry_backoff_factor
+            ),
+        )
 
-    def _send(self, params: Any, headers: Dict, use_admin: bool = False):
+    def _send(self, params: Any, headers: Dict, use_admin: bool = False, timeout: int = None, request_id: str = None):
         """
         发送和接受返回请求的包装
         @param params: 请求的参数,预期是一个字典
+        @param timeout: 本次请求的读超时时间
+        @param request_id: 本次请求的request id
         @return: requests response
         """
 
-        # 增加request id
+        # session 仅承载本次请求的 header/cookie，底层连接复用按 host 共享的连接池
         session = requests.session()
         session.headers.update(headers)
+        # 增加request id
         session.headers.update(
             {
-                "X-Bkapi-Request-Id": self.request_id,
+                "X-Bkapi-Request-Id": request_id,
                 "blueking-language": translation.get_language(),
             }
         )
@@ -429,6 +503,13 @@ class DataAPI(object):
             session.headers.update({"X-METHOD-OVERRIDE": self.method_override})
 
         url = self.build_actual_url(params)
+        parsed_url = parse.urlparse(url)
+        session.mount(f"{parsed_url.scheme}://{parsed_url.netloc}", self._get_adapter(url))
+
+        timeout = timeout or self.default_timeout
+        if self.connect_timeout:
+            timeout = (self.connect_timeout, timeout)
+
         # 发出请求并返回结果
         non_file_data, file_data = self._split_file_data(params)
         request_method = self.method.upper()
@@ -439,11 +520,11 @@ class DataAPI(object):
             session.cert = (client_crt, client_key)
 
         if request_method == "GET":
-            result = session.request(method=self.method, url=url, params=params, verify=False, timeout=self.timeout)
+            result = session.request(method=self.method, url=url, params=params, verify=False, timeout=timeout)
         elif request_method == "DELETE":
             session.headers.update({"Content-Type": "application/json; charset=utf-8"})
             result = session.request(
-                method=self.method, url=url, data=json.dumps(non_file_data), verify=False, timeout=self.timeout
+                method=self.method, url=url, data=json.dumps(non_file_data), verify=False, timeout=timeout
             )
         elif request_method in ["PUT", "PATCH", "POST"]:
             if not file_data:
@@ -455,10 +536,10 @@ class DataAPI(object):
             # PUT 方法上传文件时，data需作为
             if request_method == "PUT" and file_data:
                 data = list(file_data.values())[0]
-                result = session.request(method=self.method, url=url, data=data, verify=False, timeout=self.timeout)
+                result = session.request(method=self.method, url=url, data=data, verify=False, timeout=timeout)
             else:
                 result = session.request(
-                    method=self.method, url=url, data=params, files=file_data, verify=False, timeout=self.timeout
+                    method=self.method, url=url, data=params, files=file_data, verify=False, timeout=timeout
                 )
         else:
             raise ApiRequestError(_("异常请求方式，{method}").format(method=self.method))
@@ -493,7 +574,7 @@ class DataAPI(object):
             return self.url.format(**params)
         return self.url
 
-    def safe_response(self, response_result):
+    def safe_response(self, response_result, request_id=None):
         if "result" not in response_result:
             response_result["result"] = response_result.get("code") == 0 or False
         if "message" not in response_result:
@@ -501,7 +582,7 @@ class DataAPI(object):
         if "data" not in response_result:
             response_result["data"] = None
         if "request_id" not in response_result:
-            response_result["request_id"] = self.request_id
+            response_result["request_id"] = request_id
         return response_result
 
     @staticmethod
@@ -520,12 +601,51 @@ class DataAPI(object):
                 non_file_data[key] = value
         return non_file_data, file_data
 
-    @staticmethod
-    def _get_cache(cache_key):
+
+# AsyncDataAPI 共享的阻塞请求执行器，以及按事件循环隔离的 upstream 信号量(asyncio 原语与事件循环绑定)
+_async_executor = None
+_async_executor_lock = threading.Lock()
+_async_semaphores = weakref.WeakKeyDictionary()
+
+
+def get_async_executor() -> ThreadPoolExecutor:
+    global _async_executor
+    if _async_executor is None:
+        with _async_executor_lock:
+            if _async_executor is None:
+                _async_executor = ThreadPoolExecutor(max_workers=settings.DATA_API_POOL_MAXSIZE)
+    return _async_executor
+
+
+class AsyncDataAPI(object):
+    """
+    DataAPI 的 asyncio 版本，调用方式与 DataAPI 一致，但需要 await
+    项目中没有异步 HTTP 客户端依赖，因此底层复用 DataAPI 按 host 共享的连接池，阻塞请求派发到固定大小的执行器中，
+    并通过信号量限制单个 upstream 的并发数，大量分页请求只会占用协程而不是线程
+    """
+
+    def __init__(self, api: DataAPI, max_concurrency: int = None):
         """
-        获取缓存
-        :param cache_key:
-        :return:
+        @param api: 被包装的 DataAPI
+        @param max_concurrency: 单个 upstream 的最大并发请求数，为空时取 settings.CONCURRENT_NUMBER
         """
-        if cache.get(cache_key):
-            return cache.get(cache_key)
+        self.api = api
+        self.max_concurrency = max_concurrency or settings.CONCURRENT_NUMBER
+
+    @property
+    def upstream(self):
+        return parse.urlparse(self.api.base).netloc
+
+    def _get_semaphore(self, loop) -> asyncio.Semaphore:
+        semaphores = _async_semaphores.setdefault(loop, {})
+        semaphore_key = (self.upstream, self.max_concurrency)
+        if semaphore_key not in semaphores:
+            semaphores[semaphore_key] = asyncio.Semaphore(self.max_concurrency)
+        return semaphores[semaphore_key]
+
+    async def __call__(self, params=None, **kwargs):
+        loop = asyncio.get_running_loop()
+        # 执行器线程中没有当前请求的上下文，这里透传 request 和语言
+        func = RespectsLanguage(language=translation.get_language())(inject_request(self.api))
+        async with self._get_semaphore(loop):
+            return await loop.run_in_executor(get_async_executor(), functools.partial(func, params, **kwargs))
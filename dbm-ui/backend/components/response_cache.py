@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from django.core.cache import cache
+
+from backend.utils.local import inject_request
+
+logger = logging.getLogger("root")
+
+# 进程内 LRU 缓存的最大条目数
+LOCAL_CACHE_MAXSIZE = 1024
+# 缓存过期后仍可返回旧数据的时间(相对 cache_time 的倍数)，期间由一个 worker 在后台刷新
+STALE_TIME_RATIO = 1
+# 后台刷新锁的超时时间，防止刷新线程异常退出后锁无法释放
+REFRESH_LOCK_TIMEOUT = 60
+# 等待其他线程完成同一请求的最长时间
+SINGLE_FLIGHT_WAIT_TIMEOUT = 120
+
+
+class LocalLRUCache(object):
+    """进程内的 LRU 缓存，线程安全，条目超过 stale_at 后自动淘汰，是否过期由调用方根据 expire_at 判断"""
+
+    def __init__(self, maxsize: int = LOCAL_CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry["stale_at"] <= time.time():
+                self._data.pop(key, None)
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: Dict):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class _Call(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """相同 key 的并发调用只有一个会真正执行，其余调用等待并共享其结果"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            # 等待超时则自行请求，避免被异常阻塞的请求拖住
+            if not call.event.wait(SINGLE_FLIGHT_WAIT_TIMEOUT):
+                return func()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as err:  # pylint: disable=broad-except
+            call.error = err
+            raise
+        finally:
+            call.event.set()
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class CacheMetrics(object):
+    """按接口统计缓存命中情况"""
+
+    LOCAL_HIT = "local_hit"
+    REMOTE_HIT = "remote_hit"
+    STALE_HIT = "stale_hit"
+    MISS = "miss"
+
+    def __init__(self):
+        self._counters = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def incr(self, api_name: str, metric: str):
+        with self._lock:
+            self._counters[api_name][metric] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {api_name: dict(counter) for api_name, counter in self._counters.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class ResponseCache(object):
+    """
+    DataAPI 的响应缓存：进程内 LRU -> django cache -> 请求接口
+    - 同一进程内相同 key 的并发未命中请求会合并为一次请求
+    - 缓存过期后的一段时间内继续返回旧数据，并由抢到刷新锁的 worker 在后台刷新，避免缓存失效时请求集中打到上游
+    """
+
+    def __init__(self):
+        self.local_cache = LocalLRUCache()
+        self.single_flight = SingleFlight()
+        self.metrics = CacheMetrics()
+        self._refresh_executor = None
+        self._refresh_executor_lock = threading.Lock()
+
+    @property
+    def refresh_executor(self) -> ThreadPoolExecutor:
+        if self._refresh_executor is None:
+            with self._refresh_executor_lock:
+                if self._refresh_executor is None:
+                    self._refresh_executor = ThreadPoolExecutor(max_workers=2)
+        return self._refresh_executor
+
+    def get_remote_entry(self, cache_key: str) -> Optional[Dict]:
+        entry = cache.get(cache_key)
+        if not isinstance(entry, dict) or "expire_at" not in entry:
+            return None
+        self.local_cache.set(cache_key, entry)
+        return entry
+
+    def set_entry(self, cache_key: str, data: Dict, cache_time: int):
+        now = time.time()
+        stale_time = cache_time * STALE_TIME_RATIO
+        entry = {"expire_at": now + cache_time, "stale_at": now + cache_time + stale_time, "data": data}
+        cache.set(cache_key, entry, cache_time + stale_time)
+        self.local_cache.set(cache_key, entry)
+
+    def load(self, cache_key: str, cache_time: int, fetch_func: Callable[[], Dict]) -> Dict:
+        data = fetch_func()
+        # 只缓存成功的请求结果
+        if data.get("result"):
+            self.set_entry(cache_key, data, cache_time)
+        return data
+
+    def refresh(self, cache_key: str, cache_time: int, fetch_func: Callable[[], Dict]):
+        refresh_lock_key = f"{cache_key}_refresh_lock"
+        if not cache.add(refresh_lock_key, 1, REFRESH_LOCK_TIMEOUT):
+            return
+
+        def _refresh():
+            try:
+                self.single_flight.do(cache_key, lambda: self.load(cache_key, cache_time, fetch_func))
+            except Exception as err:  # pylint: disable=broad-except
+                logger.warning("refresh data api cache failed, cache_key => %s, error => %s", cache_key, err)
+            finally:
+                cache.delete(refresh_lock_key)
+
+        self.refresh_executor.submit(inject_request(_refresh))
+
+    def fetch(self, api_name: str, cache_key: str, cache_time: int, fetch_func: Callable[[], Dict]) -> Dict:
+        """
+        获取缓存的请求结果，返回的是缓存数据的副本，调用方可以随意修改
+        :param api_name: 接口名，用于统计命中情况
+        :param cache_key: 缓存key
+        :param cache_time: 缓存时间
+        :param fetch_func: 实际请求接口的函数，返回完整的响应内容
+        """
+        return copy.deepcopy(self._fetch(api_name, cache_key, cache_time, fetch_func))
+
+    def _fetch(self, api_name: str, cache_key: str, cache_time: int, fetch_func: Callable[[], Dict]) -> Dict:
+        entry = self.local_cache.get(cache_key)
+        if entry is not None and entry["expire_at"] > time.time():
+            self.metrics.incr(api_name, CacheMetrics.LOCAL_HIT)
+            return entry["data"]
+
+        # 本地缓存缺失或已过期，其他进程可能已经刷新了共享缓存
+        entry = self.get_remote_entry(cache_key) or entry
+        if entry is not None:
+            if entry["expire_at"] > time.time():
+                self.metrics.incr(api_name, CacheMetrics.REMOTE_HIT)
+                return entry["data"]
+            if entry["stale_at"] > time.time():
+                self.metrics.incr(api_name, CacheMetrics.STALE_HIT)
+                self.refresh(cache_key, cache_time, fetch_func)
+                return entry["data"]
+
+        self.metrics.incr(api_name, CacheMetrics.MISS)
+        return self.single_flight.do(cache_key, lambda: self.load(cache_key, cache_time, fetch_func))
+
+
+response_cache = ResponseCache()
+
+
+def get_cache_metrics() -> Dict[str, Dict[str, int]]:
+    """获取各接口的缓存命中统计"""
+    return response_cache.metrics.snapshot()
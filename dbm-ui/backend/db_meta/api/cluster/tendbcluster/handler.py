@@ -16,6 +16,7 @@ from django.utils.translation import ugettext as _
 from backend.configuration.constants import DBType
 from backend.db_meta import api
 from backend.db_meta.api.cluster.base.handler import ClusterHandler
+from backend.db_meta.change_feed import InstanceKind, record_instance_id_changes
 from backend.db_meta.enums import (
     ClusterEntryRole,
     ClusterEntryType,
@@ -285,6 +286,8 @@ class TenDBClusterClusterHandler(ClusterHandler):
             master_objs = cluster.storageinstance_set.filter(machine__ip=switch_tuple["master"]["ip"])
             slave_objs.update(instance_role=InstanceRole.REMOTE_MASTER, instance_inner_role=InstanceInnerRole.MASTER)
             master_objs.update(instance_role=InstanceRole.REMOTE_SLAVE, instance_inner_role=InstanceInnerRole.SLAVE)
+            # 批量更新不会触发信号，需要主动记录元数据变更
+            record_instance_id_changes(InstanceKind.STORAGE, [obj.id for obj in [*slave_objs, *master_objs]])
 
             # 修改主从的映射关系
             for obj in master_objs:
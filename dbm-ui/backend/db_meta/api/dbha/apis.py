@@ -10,16 +10,17 @@ specific language governing permissions and limitations under the License.
 """
 import logging
 from collections import defaultdict
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 import validators
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Prefetch, Q, QuerySet
 from django.utils.translation import ugettext_lazy as _
 
 from backend.constants import DEFAULT_BK_CLOUD_ID, IP_PORT_DIVIDER
-from backend.db_meta import flatten, meta_validator, request_validator
+from backend.db_meta import change_feed, flatten, meta_validator, request_validator
+from backend.db_meta.change_feed import InstanceKind, record_instance_changes
 from backend.db_meta.enums import (
     ClusterEntryType,
     ClusterStatus,
@@ -35,97 +36,147 @@ from backend.db_meta.exceptions import (
     InstanceNotExistException,
     TendisClusterNotExistException,
 )
-from backend.db_meta.models import BKCity, Cluster, ProxyInstance, StorageInstance, StorageInstanceTuple
+from backend.db_meta.models import BKCity, Cluster, ClusterEntry, ProxyInstance, StorageInstance, StorageInstanceTuple
 from backend.db_meta.request_validator import DBHASwapRequestSerializer, DBHAUpdateStatusRequestSerializer
 from backend.flow.utils.cc_manage import CcManage
 
 logger = logging.getLogger("root")
 
+# 精简格式下返回的实例字段，与 DBHA 探测所需的实例信息保持一致
+DBHA_INSTANCE_COMPACT_FIELDS = {
+    "ip",
+    "port",
+    "admin_port",
+    "bk_idc_city_id",
+    "instance_role",
+    "spider_role",
+    "status",
+    "cluster",
+    "bk_biz_id",
+    "cluster_type",
+    "machine_type",
+    "receiver",
+    "proxyinstance_set",
+    "bind_entry",
+    "cluster_id",
+}
+
 
 def cities():
     return flatten.cities(BKCity.objects.all())
 
 
+def _single_entry_detail(cluster_entry_obj: ClusterEntry) -> Union[Dict, str]:
+    """所有关联对象均已预查询，这里只读取缓存"""
+    if cluster_entry_obj.cluster_entry_type == ClusterEntryType.DNS:
+        bind_instances = list(cluster_entry_obj.storageinstance_set.all()) or list(
+            cluster_entry_obj.proxyinstance_set.all()
+        )
+        return {
+            "domain": cluster_entry_obj.entry,
+            "entry_role": cluster_entry_obj.role,
+            "forward_entry_id": cluster_entry_obj.forward_to_id,
+            "bind_ips": list(set([ele.machine.ip for ele in bind_instances])),
+            "bind_port": bind_instances[0].port if bind_instances else 0,
+        }
+
+    if cluster_entry_obj.cluster_entry_type == ClusterEntryType.CLB:
+        de = cluster_entry_obj.clbentrydetail_set.all()[0]
+        return {
+            "clb_ip": de.clb_ip,
+            "clb_id": de.clb_id,
+            "listener_id": de.listener_id,
+            "clb_region": de.clb_region,
+        }
+
+    if cluster_entry_obj.cluster_entry_type == ClusterEntryType.POLARIS:
+        de = cluster_entry_obj.polarisentrydetail_set.all()[0]
+        return {
+            "polaris_name": de.polaris_name,
+            "polaris_l5": de.polaris_l5,
+            "polaris_token": de.polaris_token,
+            "alias_token": de.alias_token,
+        }
+
+    return cluster_entry_obj.entry
+
+
 def entry_detail(domains: List[str]) -> Dict[str, Dict[Any, list]]:
-    entries = {}
+    """批量查询集群的访问入口详情，查询次数与域名数量无关"""
+    domain_cluster_map = {
+        cluster.immute_domain: cluster
+        for cluster in Cluster.objects.filter(immute_domain__in=domains).prefetch_related(
+            Prefetch(
+                "clusterentry_set",
+                queryset=ClusterEntry.objects.prefetch_related(
+                    # 与 first() 保持一致，按主键排序取第一个实例的端口
+                    Prefetch(
+                        "storageinstance_set",
+                        queryset=StorageInstance.objects.select_related("machine").order_by("id"),
+                    ),
+                    Prefetch(
+                        "proxyinstance_set", queryset=ProxyInstance.objects.select_related("machine").order_by("id")
+                    ),
+                    "clbentrydetail_set",
+                    "polarisentrydetail_set",
+                ),
+            )
+        )
+    }
     for domain in domains:
-        clusterentry_set = defaultdict(list)
-        try:
-            cluster_obj = Cluster.objects.get(immute_domain=domain)
-        except ObjectDoesNotExist:
+        if domain not in domain_cluster_map:
             raise ClusterNotExistException(cluster=domain)
 
-        for cluster_entry_obj in cluster_obj.clusterentry_set.all():
-            if cluster_entry_obj.cluster_entry_type == ClusterEntryType.DNS:
-
-                if cluster_entry_obj.storageinstance_set.exists():
-                    bind_ips = list(set([ele.machine.ip for ele in list(cluster_entry_obj.storageinstance_set.all())]))
-                    bind_port = cluster_entry_obj.storageinstance_set.first().port
-                elif cluster_entry_obj.proxyinstance_set.exists():
-                    bind_ips = list(set([ele.machine.ip for ele in list(cluster_entry_obj.proxyinstance_set.all())]))
-                    bind_port = cluster_entry_obj.proxyinstance_set.first().port
-                else:
-                    bind_ips = []
-                    bind_port = 0
-
-                clusterentry_set[cluster_entry_obj.cluster_entry_type].append(
-                    {
-                        "domain": cluster_entry_obj.entry,
-                        "entry_role": cluster_entry_obj.role,
-                        "forward_entry_id": cluster_entry_obj.forward_to_id,
-                        "bind_ips": bind_ips,
-                        "bind_port": bind_port,
-                    }
-                )
-            elif cluster_entry_obj.cluster_entry_type == ClusterEntryType.CLB:
-                de = cluster_entry_obj.clbentrydetail_set.get()
-                clusterentry_set[cluster_entry_obj.cluster_entry_type].append(
-                    {
-                        "clb_ip": de.clb_ip,
-                        "clb_id": de.clb_id,
-                        "listener_id": de.listener_id,
-                        "clb_region": de.clb_region,
-                    }
-                )
-            elif cluster_entry_obj.cluster_entry_type == ClusterEntryType.POLARIS:
-                de = cluster_entry_obj.polarisentrydetail_set.get()
-                clusterentry_set[cluster_entry_obj.cluster_entry_type].append(
-                    {
-                        "polaris_name": de.polaris_name,
-                        "polaris_l5": de.polaris_l5,
-                        "polaris_token": de.polaris_token,
-                        "alias_token": de.alias_token,
-                    }
-                )
-            else:
-                clusterentry_set[cluster_entry_obj.cluster_entry_type].append(cluster_entry_obj.entry)
+    entries = {}
+    for domain in domains:
+        clusterentry_set = defaultdict(list)
+        for cluster_entry_obj in domain_cluster_map[domain].clusterentry_set.all():
+            clusterentry_set[cluster_entry_obj.cluster_entry_type].append(_single_entry_detail(cluster_entry_obj))
+        if clusterentry_set:
             entries[domain] = clusterentry_set
     return entries
 
 
-def instances(
-    logical_city_ids: Optional[List[int]] = None,
-    addresses: Optional[List[str]] = None,
-    statuses: Optional[List[str]] = None,
-    bk_cloud_id: int = DEFAULT_BK_CLOUD_ID,
-):
-
+def _address_filters(addresses: List[str], bk_cloud_id: int) -> Tuple[Q, Q]:
+    """
+    将地址列表转为存储实例和接入层实例的过滤条件
+    ip 和域名使用 IN 查询，ip:port 先按 ip 和端口粗筛再在内存中精确匹配，避免拼接大量 OR 条件
+    """
+    ips, domains, ip_ports = set(), set(), set()
+    for ad in [ad.strip() for ad in addresses if len(ad.strip()) > 0]:
+        if validators.ipv4(ad):
+            ips.add(ad)
+        elif meta_validator.instance(ad):
+            ip, port = ad.split(IP_PORT_DIVIDER)
+            ip_ports.add((ip, int(port)))
+        elif validators.domain(ad):
+            domains.add(ad)
+        else:
+            logger.warning("{} is not a valid ip, instance or domain".format(ad))
+
+    def _model_filter(model) -> Q:
+        queries = Q()
+        if ips:
+            queries |= Q(machine__ip__in=ips)
+        if domains:
+            queries |= Q(cluster__clusterentry__entry__in=domains)
+        if ip_ports:
+            candidates = model.objects.filter(
+                machine__ip__in={ip for ip, _port in ip_ports},
+                port__in={port for _ip, port in ip_ports},
+                machine__bk_cloud_id=bk_cloud_id,
+            ).values_list("id", "machine__ip", "port")
+            queries |= Q(id__in=[inst_id for inst_id, ip, port in candidates if (ip, port) in ip_ports])
+        return queries
+
+    return _model_filter(StorageInstance), _model_filter(ProxyInstance)
+
+
+def _instance_filter(logical_city_ids: Optional[List[int]], statuses: Optional[List[str]], bk_cloud_id: int) -> Q:
     logical_city_ids = request_validator.validated_integer_list(logical_city_ids)
-    addresses = request_validator.validated_str_list(addresses)
     statuses = request_validator.validated_str_list(statuses)
 
     queries = Q()
-    if addresses:
-        for ad in [ad for ad in addresses if len(ad.strip()) > 0]:
-            if validators.ipv4(ad):
-                queries |= Q(**{"machine__ip": ad})
-            elif meta_validator.instance(ad):
-                queries |= Q(**{"machine__ip": ad.split(IP_PORT_DIVIDER)[0], "port": ad.split(IP_PORT_DIVIDER)[1]})
-            elif validators.domain(ad):
-                queries |= Q(**{"cluster__clusterentry__entry": ad})
-            else:
-                logger.warning("{} is not a valid ip, instance or domain".format(ad))
-
     if logical_city_ids:
         queries &= Q(**{"machine__bk_city__logical_city_id__in": logical_city_ids})
 
@@ -135,109 +186,312 @@ def instances(
     queries &= Q(**{"machine__bk_cloud_id": bk_cloud_id})
 
     queries &= ~Q(**{"phase": InstancePhase.TRANS_STAGE})  # 排除 scr/gcs 迁移状态实例
+    return queries
 
-    return flatten.storage_instance(StorageInstance.objects.filter(queries)) + flatten.proxy_instance(
-        ProxyInstance.objects.filter(queries)
-    )
+
+def _flatten_instances(storages: QuerySet, proxies: QuerySet, compact: bool) -> List[Dict]:
+    if not compact:
+        return flatten.storage_instance(storages) + flatten.proxy_instance(proxies)
+
+    return flatten.storage_instance(storages, fields=DBHA_INSTANCE_COMPACT_FIELDS) + [
+        {key: value for key, value in info.items() if key in DBHA_INSTANCE_COMPACT_FIELDS}
+        for info in flatten.proxy_instance(proxies)
+    ]
+
+
+def instances(
+    logical_city_ids: Optional[List[int]] = None,
+    addresses: Optional[List[str]] = None,
+    statuses: Optional[List[str]] = None,
+    bk_cloud_id: int = DEFAULT_BK_CLOUD_ID,
+    compact: bool = False,
+):
+    """
+    查询 DBHA 需要探测的实例
+    @param logical_city_ids: 逻辑城市ID列表
+    @param addresses: 地址列表，支持 ip、ip:port 和域名
+    @param statuses: 实例状态列表
+    @param bk_cloud_id: 云区域ID
+    @param compact: 是否只返回 DBHA 需要的字段
+    """
+    addresses = request_validator.validated_str_list(addresses)
+    queries = _instance_filter(logical_city_ids, statuses, bk_cloud_id)
+
+    storage_queries, proxy_queries = _address_filters(addresses, bk_cloud_id) if addresses else (Q(), Q())
+    # 按域名过滤时同一实例可能关联多个匹配的入口，需要去重
+    storages = StorageInstance.objects.filter(queries & storage_queries).distinct()
+    proxies = ProxyInstance.objects.filter(queries & proxy_queries).distinct()
+    return _flatten_instances(storages, proxies, compact)
+
+
+def instance_changes(
+    since_version: int = 0,
+    logical_city_ids: Optional[List[int]] = None,
+    statuses: Optional[List[str]] = None,
+    bk_cloud_id: int = DEFAULT_BK_CLOUD_ID,
+    compact: bool = False,
+) -> Dict[str, Any]:
+    """
+    查询某个版本之后发生变化的实例
+    客户端首次请求、版本号已被裁剪或版本号异常时返回全量实例(full=True)，之后以返回的 version 作为下次请求的 since_version
+    changes 为仍满足过滤条件的变化实例，deleted 为已删除或不再满足过滤条件的实例地址
+    @param since_version: 客户端上次拉取的版本号
+    @param logical_city_ids: 逻辑城市ID列表
+    @param statuses: 实例状态列表
+    @param bk_cloud_id: 云区域ID
+    @param compact: 是否只返回 DBHA 需要的字段
+    """
+    version, trimmed_version = change_feed.get_version_range()
+    if since_version <= 0 or since_version < trimmed_version or since_version > version:
+        return {
+            "version": version,
+            "full": True,
+            "changes": instances(logical_city_ids, None, statuses, bk_cloud_id, compact),
+            "deleted": [],
+        }
+
+    changes = change_feed.get_changes(since_version, version)
+    storage_changes = changes.get(InstanceKind.STORAGE, {})
+    proxy_changes = changes.get(InstanceKind.PROXY, {})
+    queries = _instance_filter(logical_city_ids, statuses, bk_cloud_id)
+    storages = StorageInstance.objects.filter(queries & Q(id__in=list(storage_changes.keys())))
+    proxies = ProxyInstance.objects.filter(queries & Q(id__in=list(proxy_changes.keys())))
+
+    # 变化后仍满足过滤条件的实例在 changes 中返回，其余的实例客户端需要移除
+    exist_storage_ids = set(storages.values_list("id", flat=True))
+    exist_proxy_ids = set(proxies.values_list("id", flat=True))
+    deleted = [address for inst_id, address in storage_changes.items() if inst_id not in exist_storage_ids] + [
+        address for inst_id, address in proxy_changes.items() if inst_id not in exist_proxy_ids
+    ]
+    return {
+        "version": version,
+        "full": False,
+        "changes": _flatten_instances(storages, proxies, compact),
+        "deleted": deleted,
+    }
+
+
+def _match_instances(querysets: List[QuerySet], addresses: Iterable[Tuple[str, int]], bk_cloud_id: int) -> Dict:
+    """
+    一次性查询出地址对应的实例，先按 ip 和端口粗筛再在内存中精确匹配
+    多个查询集中存在相同地址时，靠前的查询集优先
+    @param querysets: 实例查询集列表
+    @param addresses: (ip, port) 列表
+    @param bk_cloud_id: 云区域ID
+    """
+    addresses = set(addresses)
+    address_instances = {}
+    if not addresses:
+        return address_instances
+
+    ips, ports = {ip for ip, _port in addresses}, {port for _ip, port in addresses}
+    for queryset in reversed(querysets):
+        for inst in queryset.select_related("machine").filter(
+            machine__ip__in=ips, port__in=ports, machine__bk_cloud_id=bk_cloud_id
+        ):
+            if (inst.machine.ip, inst.port) in addresses:
+                address_instances[(inst.machine.ip, inst.port)] = inst
+    return address_instances
+
+
+def _refresh_cluster_status(clusters: Iterable[Cluster], abnormal_cluster_ids: Set[int]):
+    """
+    bulk_update 不会触发信号，按 update_cluster_status 的规则批量刷新集群状态
+    @param clusters: 实例变化涉及的集群
+    @param abnormal_cluster_ids: 直接置为异常的集群
+    """
+    clusters = Cluster.attach_status_flags(list({cluster.id: cluster for cluster in clusters}.values()))
+    changed_clusters = []
+    for cluster in clusters:
+        if cluster.id in abnormal_cluster_ids:
+            target_status = ClusterStatus.ABNORMAL.value
+        elif cluster.status == ClusterStatus.TEMPORARY.value:
+            # 忽略临时集群
+            continue
+        else:
+            target_status = ClusterStatus.ABNORMAL.value if cluster.status_flag else ClusterStatus.NORMAL.value
+
+        if cluster.status != target_status:
+            cluster.status = target_status
+            changed_clusters.append(cluster)
+
+    Cluster.objects.bulk_update(changed_clusters, fields=["status"])
+
+
+def _record_updated_instances(instances: Iterable[Union[StorageInstance, ProxyInstance]]):
+    for model, kind in [(StorageInstance, InstanceKind.STORAGE), (ProxyInstance, InstanceKind.PROXY)]:
+        record_instance_changes(kind, [inst for inst in instances if isinstance(inst, model)])
 
 
 @transaction.atomic
-def update_status(payloads: List, bk_cloud_id: int):
+def update_status(payloads: List, bk_cloud_id: int, bulk: bool = False) -> Optional[List[Dict]]:
     """
-    ToDo 验证 status
+    批量更新实例状态，所有实例一次查出，状态通过 bulk_update 一次写入
+    @param payloads: [{"ip": "", "port": 0, "status": ""}]
+    @param bk_cloud_id: 云区域ID
+    @param bulk: 批量模式下跳过不存在的实例并返回每个实例的处理结果，否则任一实例不存在则整体回滚
     """
-    DBHAUpdateStatusRequestSerializer(data={"payloads": payloads}).is_valid(raise_exception=True)
+    slz = DBHAUpdateStatusRequestSerializer(data={"payloads": payloads})
+    slz.is_valid(raise_exception=True)
+    payloads = slz.validated_data["payloads"]
+
+    # 同一地址优先匹配存储实例
+    address_instances = _match_instances(
+        [StorageInstance.objects.prefetch_related("cluster"), ProxyInstance.objects.prefetch_related("cluster")],
+        [(pl["ip"], pl["port"]) for pl in payloads],
+        bk_cloud_id,
+    )
+
+    results, updated_instances, abnormal_cluster_ids = [], {}, set()
     for pl in payloads:
-        ip = pl["ip"]
-        port = pl["port"]
-
-        try:
-            storage_obj = StorageInstance.objects.get(machine__ip=ip, port=port, machine__bk_cloud_id=bk_cloud_id)
-            cluster = storage_obj.cluster.first()
-
-            storage_obj.status = pl["status"]
-            storage_obj.save(update_fields=["status"])
-        except ObjectDoesNotExist:
-            try:
-                proxy_obj = ProxyInstance.objects.get(machine__ip=ip, port=port, machine__bk_cloud_id=bk_cloud_id)
-                cluster = proxy_obj.cluster.first()
-
-                proxy_obj.status = pl["status"]
-                proxy_obj.save(update_fields=["status"])
-            except ObjectDoesNotExist:
-                raise InstanceNotExistException(_("实例ip={}, port={}不存在，请检查输入参数或相关数据").format(ip, port))
-            except Exception as e:
-                raise e
-        except Exception as e:
-            raise e
-
-        if cluster and pl["status"] == InstanceStatus.UNAVAILABLE.value:
-            cluster.status = ClusterStatus.ABNORMAL.value
-            cluster.save(update_fields=["status"])
+        ip, port = pl["ip"], pl["port"]
+        inst = address_instances.get((ip, port))
+        if inst is None:
+            message = _("实例ip={}, port={}不存在，请检查输入参数或相关数据").format(ip, port)
+            if not bulk:
+                raise InstanceNotExistException(message)
+            results.append({"ip": ip, "port": port, "status": pl["status"], "result": False, "message": str(message)})
+            continue
+
+        inst.status = pl["status"]
+        updated_instances[(type(inst), inst.id)] = inst
+        # 实例不可用时，所属集群(第一个)直接置为异常
+        clusters = sorted(inst.cluster.all(), key=lambda cluster: cluster.id)
+        if clusters and pl["status"] == InstanceStatus.UNAVAILABLE.value:
+            abnormal_cluster_ids.add(clusters[0].id)
+        results.append({"ip": ip, "port": port, "status": pl["status"], "result": True, "message": ""})
+
+    updated_instances = list(updated_instances.values())
+    for model in [StorageInstance, ProxyInstance]:
+        model.objects.bulk_update([inst for inst in updated_instances if isinstance(inst, model)], fields=["status"])
+    _refresh_cluster_status(
+        [cluster for inst in updated_instances for cluster in inst.cluster.all()], abnormal_cluster_ids
+    )
+    _record_updated_instances(updated_instances)
+
+    return results if bulk else None
 
 
 @transaction.atomic
-def swap_role(payloads: List, bk_cloud_id: int):
+def swap_role(payloads: List, bk_cloud_id: int, bulk: bool = False) -> Optional[List[Dict]]:
     """
     可以用来操作 tendbha 和 tendbcluster 的存储层
+    所有实例和同步关系一次查出，角色、同步关系和 proxy 后端均批量写入
+    @param payloads: [{"instance1": {"ip": "", "port": 0}, "instance2": {"ip": "", "port": 0}}]
+    @param bk_cloud_id: 云区域ID
+    @param bulk: 批量模式下跳过无法切换的实例对并返回每一对的处理结果，否则任一实例对无法切换则整体回滚
     """
-    DBHASwapRequestSerializer(data={"payloads": payloads}).is_valid(raise_exception=True)
-    for pl in payloads:
-        ins1 = pl["instance1"]
-        ins2 = pl["instance2"]
-
-        ins1_obj = StorageInstance.objects.get(
-            machine__ip=ins1["ip"], port=ins1["port"], machine__bk_cloud_id=bk_cloud_id
-        )
-        ins2_obj = StorageInstance.objects.get(
-            machine__ip=ins2["ip"], port=ins2["port"], machine__bk_cloud_id=bk_cloud_id
+    slz = DBHASwapRequestSerializer(data={"payloads": payloads})
+    slz.is_valid(raise_exception=True)
+    payloads = slz.validated_data["payloads"]
+
+    address_instances = _match_instances(
+        [
+            StorageInstance.objects.prefetch_related(
+                "cluster", Prefetch("proxyinstance_set", queryset=ProxyInstance.objects.select_related("machine"))
+            )
+        ],
+        [(ins["ip"], ins["port"]) for pl in payloads for ins in [pl["instance1"], pl["instance2"]]],
+        bk_cloud_id,
+    )
+    instance_ids = [inst.id for inst in address_instances.values()]
+    instance_tuples = {
+        (st.ejector_id, st.receiver_id): st
+        for st in StorageInstanceTuple.objects.filter(ejector_id__in=instance_ids, receiver_id__in=instance_ids)
+    }
+
+    results, swapped_instances, swapped_tuples, proxy_bindings = [], {}, [], {}
+
+    def _check_pair(ins1: Dict, ins2: Dict) -> Tuple[Optional[Exception], Optional[StorageInstanceTuple]]:
+        for ins in [ins1, ins2]:
+            if (ins["ip"], ins["port"]) not in address_instances:
+                return InstanceNotExistException(bk_cloud_id=bk_cloud_id, ip=ins["ip"], port=ins["port"]), None
+
+        ins1_obj, ins2_obj = (
+            address_instances[(ins1["ip"], ins1["port"])],
+            address_instances[(ins2["ip"], ins2["port"])],
         )
+        if ins1_obj.id in swapped_instances or ins2_obj.id in swapped_instances:
+            return (
+                Exception(
+                    "{}:{} {}:{} already swapped in this batch".format(
+                        ins1["ip"], ins1["port"], ins2["ip"], ins2["port"]
+                    )
+                ),
+                None,
+            )
 
-        if (
-            not StorageInstanceTuple.objects.filter(ejector=ins1_obj, receiver=ins2_obj).exists()
-            and not StorageInstanceTuple.objects.filter(ejector=ins2_obj, receiver=ins1_obj).exists()
-        ):
-            raise Exception(
-                "no replicate relate between {}:{} {}:{}".format(
-                    ins1_obj.machine.ip, ins1_obj.port, ins2_obj.machine.ip, ins2_obj.port
-                )
+        # 只支持 instance1 为 ejector 的同步关系
+        st = instance_tuples.get((ins1_obj.id, ins2_obj.id))
+        if st is None:
+            return (
+                Exception(
+                    "no replicate relate between {}:{} {}:{}".format(
+                        ins1_obj.machine.ip, ins1_obj.port, ins2_obj.machine.ip, ins2_obj.port
+                    )
+                ),
+                None,
             )
 
         if (
             ins1_obj.instance_inner_role == InstanceInnerRole.REPEATER
             or ins2_obj.instance_role == InstanceInnerRole.REPEATER
         ):
-            raise Exception("repeater found, may be not prod cluster")
-
-        __swap(ins1_obj, ins2_obj)
-
-
-def __swap(ins1: StorageInstance, ins2: StorageInstance):
-    # 修改 proxy backend
-    temp_proxy_set = list(ins1.proxyinstance_set.all())
+            return Exception("repeater found, may be not prod cluster"), None
 
-    ins1.proxyinstance_set.clear()
-    ins1.proxyinstance_set.add(*ins2.proxyinstance_set.all())
+        return None, st
 
-    ins2.proxyinstance_set.clear()
-    ins2.proxyinstance_set.add(*temp_proxy_set)
-
-    st = StorageInstanceTuple.objects.get(ejector=ins1, receiver=ins2)
-    st.ejector = ins2
-    st.receiver = ins1
-    st.save(update_fields=["ejector", "receiver"])
-
-    temp_instance_role = ins1.instance_role
-    tmep_instance_inner_role = ins1.instance_inner_role
-
-    ins1.instance_role = ins2.instance_role
-    ins1.instance_inner_role = ins2.instance_inner_role
+    for pl in payloads:
+        ins1, ins2 = pl["instance1"], pl["instance2"]
+        err, st = _check_pair(ins1, ins2)
+        if err is not None:
+            if not bulk:
+                raise err
+            results.append({"instance1": ins1, "instance2": ins2, "result": False, "message": str(err)})
+            continue
+
+        ins1_obj, ins2_obj = (
+            address_instances[(ins1["ip"], ins1["port"])],
+            address_instances[(ins2["ip"], ins2["port"])],
+        )
+        # 交换 proxy 后端
+        proxy_bindings[ins1_obj.id] = list(ins2_obj.proxyinstance_set.all())
+        proxy_bindings[ins2_obj.id] = list(ins1_obj.proxyinstance_set.all())
+        # 交换同步关系
+        st.ejector, st.receiver = ins2_obj, ins1_obj
+        swapped_tuples.append(st)
+        # 交换角色
+        ins1_obj.instance_role, ins2_obj.instance_role = ins2_obj.instance_role, ins1_obj.instance_role
+        ins1_obj.instance_inner_role, ins2_obj.instance_inner_role = (
+            ins2_obj.instance_inner_role,
+            ins1_obj.instance_inner_role,
+        )
+        swapped_instances.update({ins1_obj.id: ins1_obj, ins2_obj.id: ins2_obj})
+        results.append({"instance1": ins1, "instance2": ins2, "result": True, "message": ""})
+
+    if swapped_instances:
+        proxy_backend_relation = ProxyInstance.storageinstance.through
+        proxy_backend_relation.objects.filter(storageinstance_id__in=proxy_bindings.keys()).delete()
+        proxy_backend_relation.objects.bulk_create(
+            [
+                proxy_backend_relation(proxyinstance_id=proxy.id, storageinstance_id=storage_id)
+                for storage_id, proxies in proxy_bindings.items()
+                for proxy in proxies
+            ]
+        )
+        StorageInstanceTuple.objects.bulk_update(swapped_tuples, fields=["ejector", "receiver"])
+        StorageInstance.objects.bulk_update(
+            swapped_instances.values(), fields=["instance_role", "instance_inner_role"]
+        )
 
-    ins2.instance_role = temp_instance_role
-    ins2.instance_inner_role = tmep_instance_inner_role
+        _refresh_cluster_status(
+            [cluster for inst in swapped_instances.values() for cluster in inst.cluster.all()], set()
+        )
+        _record_updated_instances(
+            [*swapped_instances.values(), *[proxy for proxies in proxy_bindings.values() for proxy in proxies]]
+        )
 
-    ins1.save(update_fields=["instance_role", "instance_inner_role"])
-    ins2.save(update_fields=["instance_role", "instance_inner_role"])
+    return results if bulk else None
 
 
 @transaction.atomic
@@ -12,7 +12,7 @@ import logging
 
 from django.apps import AppConfig
 from django.db import IntegrityError
-from django.db.models.signals import post_delete, post_migrate, post_save
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
 
 logger = logging.getLogger("root")
 
@@ -43,8 +43,14 @@ class DBMeta(AppConfig):
     name = "backend.db_meta"
 
     def ready(self):
-        from backend.db_meta.models import ProxyInstance, StorageInstance
-        from backend.db_meta.signals import update_cluster_status
+        from backend.db_meta.models import ClusterEntry, ProxyInstance, StorageInstance, StorageInstanceTuple
+        from backend.db_meta.signals import (
+            record_cluster_entry_change,
+            record_instance_change,
+            record_instance_tuple_change,
+            record_m2m_instance_change,
+            update_cluster_status,
+        )
 
         post_migrate.connect(init_db_meta, sender=self)
         # 当实例进行修改或者删除时，更新集群状态
@@ -52,3 +58,20 @@ class DBMeta(AppConfig):
         post_save.connect(update_cluster_status, sender=ProxyInstance)
         post_delete.connect(update_cluster_status, sender=StorageInstance)
         post_delete.connect(update_cluster_status, sender=ProxyInstance)
+
+        # 记录 DBHA 元数据变更流
+        for model in [StorageInstance, ProxyInstance]:
+            post_save.connect(record_instance_change, sender=model)
+            post_delete.connect(record_instance_change, sender=model)
+        post_save.connect(record_instance_tuple_change, sender=StorageInstanceTuple)
+        post_delete.connect(record_instance_tuple_change, sender=StorageInstanceTuple)
+        post_save.connect(record_cluster_entry_change, sender=ClusterEntry)
+        pre_delete.connect(record_cluster_entry_change, sender=ClusterEntry)
+        for through in [
+            StorageInstance.cluster.through,
+            StorageInstance.bind_entry.through,
+            ProxyInstance.cluster.through,
+            ProxyInstance.bind_entry.through,
+            ProxyInstance.storageinstance.through,
+        ]:
+            m2m_changed.connect(record_m2m_instance_change, sender=through)
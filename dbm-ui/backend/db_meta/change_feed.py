@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+
+DBHA 元数据变更流：实例、同步关系、访问入口发生变化时，记录受影响的实例和单调递增的版本号，
+DBHA 可以只拉取某个版本之后发生变化的实例，而不必每个周期都全量拉取
+"""
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+
+from backend.constants import IP_PORT_DIVIDER
+from backend.utils.redis import RedisConn
+
+logger = logging.getLogger("root")
+
+# 当前版本号
+DBHA_META_CHANGE_VERSION_KEY = "dbha_meta_change_version"
+# 变更流，有序集合，member 为 {实例类型}:{实例ID}:{ip}:{port}，score 为实例最近一次变化的版本号
+DBHA_META_CHANGE_FEED_KEY = "dbha_meta_change_feed"
+# 变更流已裁剪掉的最大版本号，早于该版本的客户端需要全量拉取
+DBHA_META_CHANGE_TRIMMED_VERSION_KEY = "dbha_meta_change_trimmed_version"
+# 变更流保留的最大实例数
+DBHA_META_CHANGE_FEED_MAX_LENGTH = 100000
+
+# 原子地分配版本号并记录变更，保证读到的版本号之前的变更都已写入变更流
+# 版本号不存在(如 redis 数据丢失)时以毫秒时间戳初始化，保证版本号不会回退，且旧版本的客户端会全量拉取
+RECORD_CHANGES_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('SET', KEYS[1], ARGV[1])
+    redis.call('SET', KEYS[3], ARGV[1])
+end
+local version = redis.call('INCR', KEYS[1])
+for i = 3, #ARGV do
+    redis.call('ZADD', KEYS[2], version, ARGV[i])
+end
+local overflow = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[2])
+if overflow > 0 then
+    local trimmed = redis.call('ZRANGE', KEYS[2], overflow - 1, overflow - 1, 'WITHSCORES')
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, overflow - 1)
+    redis.call('SET', KEYS[3], trimmed[2])
+end
+return version
+"""
+_record_changes_script = RedisConn.register_script(RECORD_CHANGES_SCRIPT)
+
+
+class InstanceKind(object):
+    STORAGE = "storage"
+    PROXY = "proxy"
+
+
+def _record_changes(members: Iterable[str]):
+    members = list(set(members))
+    if not members:
+        return
+    try:
+        _record_changes_script(
+            keys=[DBHA_META_CHANGE_VERSION_KEY, DBHA_META_CHANGE_FEED_KEY, DBHA_META_CHANGE_TRIMMED_VERSION_KEY],
+            args=[int(time.time() * 1000), DBHA_META_CHANGE_FEED_MAX_LENGTH, *members],
+        )
+    except Exception as err:  # pylint: disable=broad-except
+        # 变更流记录失败不影响元数据的修改，客户端可以通过全量拉取兜底
+        logger.warning("record dbha meta changes failed, error: %s", err)
+
+
+def record_instance_changes(kind: str, instances: Iterable):
+    """
+    记录实例的变化，在事务提交后才写入变更流，避免客户端在提交前读到旧数据后错过本次变更
+    @param kind: 实例类型，InstanceKind
+    @param instances: 实例对象列表
+    """
+    members = [f"{kind}:{inst.id}:{inst.machine.ip}{IP_PORT_DIVIDER}{inst.port}" for inst in instances]
+    if members:
+        transaction.on_commit(lambda: _record_changes(members))
+
+
+def record_instance_id_changes(kind: str, instance_ids: Iterable[int]):
+    """根据实例ID记录实例的变化，适用于批量修改(如 queryset.update)等不会触发信号的场景"""
+    from backend.db_meta.models import ProxyInstance, StorageInstance
+
+    instance_ids = list(instance_ids)
+    if not instance_ids:
+        return
+
+    model = StorageInstance if kind == InstanceKind.STORAGE else ProxyInstance
+    members = [
+        f"{kind}:{inst_id}:{ip}{IP_PORT_DIVIDER}{port}"
+        for inst_id, ip, port in model.objects.filter(id__in=instance_ids).values_list("id", "machine__ip", "port")
+    ]
+    if members:
+        transaction.on_commit(lambda: _record_changes(members))
+
+
+def get_version_range() -> Tuple[int, int]:
+    """获取(当前版本号, 已裁剪的版本号)"""
+    version, trimmed_version = RedisConn.mget(DBHA_META_CHANGE_VERSION_KEY, DBHA_META_CHANGE_TRIMMED_VERSION_KEY)
+    return int(version or 0), int(trimmed_version or 0)
+
+
+def get_changes(since_version: int, version: Optional[int] = None) -> Dict[str, Dict[int, str]]:
+    """
+    获取版本号在 (since_version, version] 之间发生变化的实例
+    返回 {实例类型: {实例ID: 实例地址}}
+    """
+    max_score = version if version is not None else "+inf"
+    changes: Dict[str, Dict[int, str]] = defaultdict(dict)
+    for member in RedisConn.zrangebyscore(DBHA_META_CHANGE_FEED_KEY, f"({since_version}", max_score):
+        kind, inst_id, address = member.split(":", 2)
+        changes[kind][int(inst_id)] = address
+    return changes
@@ -32,7 +32,8 @@ def proxy_instance(proxies: QuerySet) -> List[Dict]:
             "bind_entry__polarisentrydetail_set",
             "bind_entry__proxyinstance_set",
             "bind_entry__proxyinstance_set__machine",
-            "cluster"
+            "cluster",
+            "tendbclusterspiderext",
         )
     )
     res = []
@@ -80,7 +81,7 @@ def proxy_instance(proxies: QuerySet) -> List[Dict]:
                     }
                 )
             elif be.cluster_entry_type == ClusterEntryType.CLB:
-                dt = be.clbentrydetail_set.get()
+                dt = be.clbentrydetail_set.all()[0]
                 bind_entry[be.cluster_entry_type].append(
                     {
                         "clb_ip": dt.clb_ip,
@@ -92,7 +93,7 @@ def proxy_instance(proxies: QuerySet) -> List[Dict]:
                     }
                 )
             elif be.cluster_entry_type == ClusterEntryType.POLARIS:
-                dt = be.polarisentrydetail_set.get()
+                dt = be.polarisentrydetail_set.all()[0]
                 bind_entry[be.cluster_entry_type].append(
                     {
                         "polaris_name": dt.polaris_name,
@@ -10,136 +10,173 @@ specific language governing permissions and limitations under the License.
 """
 import logging
 from collections import defaultdict
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Union
 
-from django.db.models import QuerySet
+from django.db.models import Prefetch, QuerySet
 
 from backend.db_meta.enums import ClusterEntryType, ClusterPhase
 from backend.db_meta.enums.extra_process_type import ExtraProcessType
 from backend.db_meta.flatten.machine import _machine_prefetch, _single_machine_cc_info, _single_machine_city_info
-from backend.db_meta.models import StorageInstance
+from backend.db_meta.models import ClusterEntry, ProxyInstance, StorageInstance, StorageInstanceTuple
 from backend.db_meta.models.extra_process import ExtraProcessInstance
 
 logger = logging.getLogger("root")
 
+# 生成器模式下每批处理的实例数量，每一批的查询次数是固定的
+STORAGE_INSTANCE_CHUNK_SIZE = 500
 
-def storage_instance(storages: QuerySet) -> List[Dict]:
-    storages_list: List[StorageInstance] = list(
-        storages.prefetch_related(
-            *_machine_prefetch(),
-            "as_ejector",
-            "as_ejector__receiver__machine",
-            "as_receiver",
-            "as_receiver__ejector__machine",
-            "proxyinstance_set",
-            "proxyinstance_set__machine",
-            "bind_entry",
-            "bind_entry__clbentrydetail_set",
-            "bind_entry__polarisentrydetail_set",
-            "bind_entry__storageinstance_set",
-            "bind_entry__storageinstance_set__machine",
-            "cluster"
+# 需要额外查询关联表的字段，未被投影选中时不会查询对应的关联表
+RECEIVER_FIELDS = {"receiver"}
+EJECTOR_FIELDS = {"ejector"}
+BIND_ENTRY_FIELDS = {"bind_entry"}
+PROXY_INSTANCE_FIELDS = {"proxyinstance_set"}
+CLUSTER_FIELDS = {"cluster", "cluster_id", "tbinlogdumpers"}
+DUMPER_FIELDS = {"tbinlogdumpers"}
+
+
+def _need(fields: Optional[Set[str]], relation_fields: Set[str]) -> bool:
+    return fields is None or bool(fields & relation_fields)
+
+
+def _storage_instance_prefetch(fields: Optional[Set[str]]) -> List:
+    """根据投影字段生成预查询，关联对象的 machine 通过 select_related 一并查出，避免逐条查询"""
+    prefetches = []
+    if _need(fields, RECEIVER_FIELDS):
+        prefetches.append(
+            Prefetch("as_ejector", queryset=StorageInstanceTuple.objects.select_related("receiver__machine"))
         )
-    )
-    # 提前查询出 dumper 的信息,目前只过滤出online状态的dumper实例信息
-    cluster_ids = [cluster.id for ins in storages_list for cluster in ins.cluster.all()]
-    dumper_infos: Dict[str, Dict[str, List]] = defaultdict(lambda: defaultdict(list))
+    if _need(fields, EJECTOR_FIELDS):
+        prefetches.append(
+            Prefetch("as_receiver", queryset=StorageInstanceTuple.objects.select_related("ejector__machine"))
+        )
+    if _need(fields, PROXY_INSTANCE_FIELDS):
+        prefetches.append(Prefetch("proxyinstance_set", queryset=ProxyInstance.objects.select_related("machine")))
+    if _need(fields, BIND_ENTRY_FIELDS):
+        prefetches.append(
+            Prefetch(
+                "bind_entry",
+                queryset=ClusterEntry.objects.prefetch_related(
+                    "clbentrydetail_set",
+                    "polarisentrydetail_set",
+                    Prefetch("storageinstance_set", queryset=StorageInstance.objects.select_related("machine")),
+                ),
+            )
+        )
+    if _need(fields, CLUSTER_FIELDS):
+        prefetches.append("cluster")
+    return prefetches
+
+
+def _dumper_infos(storages_list: List[StorageInstance]) -> Dict[int, Dict[str, List]]:
+    """批量查询出 dumper 的信息,目前只过滤出online状态的dumper实例信息"""
+    dumper_infos: Dict[int, Dict[str, List]] = defaultdict(lambda: defaultdict(list))
+    cluster_ids = {cluster.id for ins in storages_list for cluster in ins.cluster.all()}
+    if not cluster_ids:
+        return dumper_infos
+
     for dumper in ExtraProcessInstance.objects.filter(
         cluster_id__in=cluster_ids, proc_type=ExtraProcessType.TBINLOGDUMPER, phase=ClusterPhase.ONLINE.value
     ):
         dumper_infos[dumper.cluster_id][dumper.extra_config.get("source_data_ip", "")].append(dumper)
-    res = []
-    for ins in storages_list:
-        info = {
-            **_single_machine_city_info(ins.machine),
-            **_single_machine_cc_info(ins.machine),
-            "port": ins.port,
-            "ip": ins.machine.ip,
-            "db_module_id": ins.db_module_id,
-            "bk_biz_id": ins.bk_biz_id,
-            "cluster": "",
-            "access_layer": ins.access_layer,
-            "machine_type": ins.machine_type,
-            "instance_role": ins.instance_role,
-            "instance_inner_role": ins.instance_inner_role,
-            "cluster_type": ins.cluster_type,
-            "status": ins.status,
+    return dumper_infos
+
+
+def _single_bind_entry_info(be: ClusterEntry) -> Union[Dict, str]:
+    storage_instance_list = list(be.storageinstance_set.all())
+    bind_ips = list(set([ele.machine.ip for ele in storage_instance_list]))
+    try:
+        bind_port = storage_instance_list[0].port
+    except (IndexError, AttributeError):
+        bind_port = 0
+
+    if be.cluster_entry_type == ClusterEntryType.DNS:
+        return {
+            "domain": be.entry,
+            "entry_role": be.role,
+            "bind_ips": bind_ips,
+            "bind_port": bind_port,
+        }
+
+    # 使用 all() 读取预查询的结果，get() 会绕过预查询缓存重新查询
+    if be.cluster_entry_type == ClusterEntryType.CLB:
+        dt = be.clbentrydetail_set.all()[0]
+        return {
+            "clb_ip": dt.clb_ip,
+            "clb_id": dt.clb_id,
+            "listener_id": dt.listener_id,
+            "clb_region": dt.clb_region,
+            "bind_ips": bind_ips,
+            "bind_port": bind_port,
         }
 
-        receiver = []
-        for e in ins.as_ejector.all():
-            rinfo = {
+    if be.cluster_entry_type == ClusterEntryType.POLARIS:
+        dt = be.polarisentrydetail_set.all()[0]
+        return {
+            "polaris_name": dt.polaris_name,
+            "polaris_l5": dt.polaris_l5,
+            "polaris_token": dt.polaris_token,
+            "alias_token": dt.alias_token,
+            "bind_ips": bind_ips,
+            "bind_port": bind_port,
+        }
+
+    return be.entry
+
+
+def _single_storage_instance_info(
+    ins: StorageInstance, fields: Optional[Set[str]], dumper_infos: Dict[int, Dict[str, List]]
+) -> Dict:
+    info = {
+        **_single_machine_city_info(ins.machine),
+        **_single_machine_cc_info(ins.machine),
+        "port": ins.port,
+        "ip": ins.machine.ip,
+        "db_module_id": ins.db_module_id,
+        "bk_biz_id": ins.bk_biz_id,
+        "cluster": "",
+        "access_layer": ins.access_layer,
+        "machine_type": ins.machine_type,
+        "instance_role": ins.instance_role,
+        "instance_inner_role": ins.instance_inner_role,
+        "cluster_type": ins.cluster_type,
+        "status": ins.status,
+    }
+
+    if _need(fields, RECEIVER_FIELDS):
+        info["receiver"] = [
+            {
                 "ip": e.receiver.machine.ip,
                 "port": e.receiver.port,
                 "status": e.receiver.status,
                 "is_stand_by": e.receiver.is_stand_by,
             }
-            receiver.append(rinfo)
-        info["receiver"] = receiver
+            for e in ins.as_ejector.all()
+        ]
 
-        ejector = []
-        for r in ins.as_receiver.all():
-            einfo = {
+    if _need(fields, EJECTOR_FIELDS):
+        info["ejector"] = [
+            {
                 "ip": r.ejector.machine.ip,
                 "port": r.ejector.port,
                 "status": r.ejector.status,
                 "is_stand_by": r.ejector.is_stand_by,
             }
-            ejector.append(einfo)
-        info["ejector"] = ejector
+            for r in ins.as_receiver.all()
+        ]
 
+    if _need(fields, BIND_ENTRY_FIELDS):
         bind_entry = defaultdict(list)
         for be in ins.bind_entry.all():
-            storage_instance_list = list(be.storageinstance_set.all())
-            bind_ips = list(set([ele.machine.ip for ele in storage_instance_list]))
-            try:
-                bind_port = storage_instance_list[0].port
-            except (IndexError, AttributeError):
-                bind_port = 0
-            if be.cluster_entry_type == ClusterEntryType.DNS:
-                bind_entry[be.cluster_entry_type].append(
-                    {
-                        "domain": be.entry,
-                        "entry_role": be.role,
-                        "bind_ips": bind_ips,
-                        "bind_port": bind_port,
-                    }
-                )
-            elif be.cluster_entry_type == ClusterEntryType.CLB:
-                dt = be.clbentrydetail_set.get()
-                bind_entry[be.cluster_entry_type].append(
-                    {
-                        "clb_ip": dt.clb_ip,
-                        "clb_id": dt.clb_id,
-                        "listener_id": dt.listener_id,
-                        "clb_region": dt.clb_region,
-                        "bind_ips": bind_ips,
-                        "bind_port": bind_port,
-                    }
-                )
-            elif be.cluster_entry_type == ClusterEntryType.POLARIS:
-                dt = be.polarisentrydetail_set.get()
-                bind_entry[be.cluster_entry_type].append(
-                    {
-                        "polaris_name": dt.polaris_name,
-                        "polaris_l5": dt.polaris_l5,
-                        "polaris_token": dt.polaris_token,
-                        "alias_token": dt.alias_token,
-                        "bind_ips": bind_ips,
-                        "bind_port": bind_port,
-                    }
-                )
-            else:
-                bind_entry[be.cluster_entry_type].append(be.entry)
-
+            bind_entry[be.cluster_entry_type].append(_single_bind_entry_info(be))
         info["bind_entry"] = dict(bind_entry)
 
-        proxyinstance_set = []
-        for p in ins.proxyinstance_set.all():
-            pinfo = {"ip": p.machine.ip, "port": p.port, "admin_port": p.admin_port, "status": p.status}
-            proxyinstance_set.append(pinfo)
-        info["proxyinstance_set"] = proxyinstance_set
+    if _need(fields, PROXY_INSTANCE_FIELDS):
+        info["proxyinstance_set"] = [
+            {"ip": p.machine.ip, "port": p.port, "admin_port": p.admin_port, "status": p.status}
+            for p in ins.proxyinstance_set.all()
+        ]
 
+    if _need(fields, CLUSTER_FIELDS):
         for cluster in ins.cluster.all():
             info["cluster"] = cluster.immute_domain
             info["cluster_id"] = cluster.id
@@ -149,6 +186,49 @@ def storage_instance(storages: QuerySet) -> List[Dict]:
             ]
             # 只取第一个即可退出
             break
-        res.append(info)
 
-    return res
+    if fields is not None:
+        info = {key: value for key, value in info.items() if key in fields}
+    return info
+
+
+def _fetch_storage_instance(storages: QuerySet, fields: Optional[Set[str]]) -> List[StorageInstance]:
+    return list(storages.select_related(*_machine_prefetch()).prefetch_related(*_storage_instance_prefetch(fields)))
+
+
+def _flatten_storage_instance(storages_list: List[StorageInstance], fields: Optional[Set[str]]) -> Iterator[Dict]:
+    dumper_infos = _dumper_infos(storages_list) if _need(fields, DUMPER_FIELDS) else {}
+    for ins in storages_list:
+        yield _single_storage_instance_info(ins, fields, dumper_infos)
+
+
+def _iter_storage_instance(storages: QuerySet, fields: Optional[Set[str]], chunk_size: int) -> Iterator[Dict]:
+    # 先按原有顺序取出主键，再分批展开，内存占用只和批大小有关
+    pks = list(storages.values_list("pk", flat=True))
+    for i in range(0, len(pks), chunk_size):
+        chunk_pks = pks[i : i + chunk_size]
+        chunk_order = {pk: index for index, pk in enumerate(chunk_pks)}
+        storages_list = sorted(
+            _fetch_storage_instance(StorageInstance.objects.filter(pk__in=chunk_pks), fields),
+            key=lambda ins: chunk_order[ins.pk],
+        )
+        yield from _flatten_storage_instance(storages_list, fields)
+
+
+def storage_instance(
+    storages: QuerySet,
+    fields: Optional[Iterable[str]] = None,
+    iterator: bool = False,
+    chunk_size: int = STORAGE_INSTANCE_CHUNK_SIZE,
+) -> Union[List[Dict], Iterator[Dict]]:
+    """
+    展开存储实例的元数据，查询次数与实例数量无关
+    @param storages: 存储实例 queryset
+    @param fields: 需要返回的字段，为空时返回全部字段。未选中的关联字段不会查询对应的关联表
+    @param iterator: 是否以生成器的方式分批返回，适用于全业务等大批量的场景
+    @param chunk_size: 生成器模式下每批处理的实例数量
+    """
+    fields = set(fields) if fields is not None else None
+    if iterator:
+        return _iter_storage_instance(storages, fields, chunk_size)
+    return list(_flatten_storage_instance(_fetch_storage_instance(storages, fields), fields))
@@ -10,6 +10,7 @@ specific language governing permissions and limitations under the License.
 """
 import json
 import logging
+from collections import defaultdict
 from typing import Dict, List
 
 from django.core.cache import cache
@@ -122,8 +123,14 @@ class Cluster(AuditedModel):
         """
         处理当前的动作是否和集群正在运行的动作存在执行互斥
         """
+        if not ticket_type:
+            return
+
+        cluster_exclusive_infos = ClusterOperateRecord.objects.get_exclusive_operations(
+            ticket_type, cluster_ids, **kwargs
+        )
         for cluster_id in cluster_ids:
-            exclusive_infos = cls.is_exclusive(cluster_id, ticket_type, **kwargs)
+            exclusive_infos = cluster_exclusive_infos.get(cluster_id)
             if not exclusive_infos:
                 continue
 
@@ -166,40 +173,81 @@ class Cluster(AuditedModel):
             return TwemproxyVersion.TwemproxyLatest
         return LATEST
 
+    @classmethod
+    def get_status_flags(cls, clusters: List["Cluster"]) -> Dict[int, ClusterStatusFlags]:
+        """
+        批量计算集群的 status flag，与集群数量无关，最多两次聚合查询
+        @param clusters: 集群对象列表
+        """
+        proxy_cluster_types = [ClusterType.TenDBHA.value, ClusterType.TenDBCluster.value]
+        proxy_cluster_ids = [cluster.id for cluster in clusters if cluster.cluster_type in proxy_cluster_types]
+        flag_cluster_ids = proxy_cluster_ids + [
+            cluster.id for cluster in clusters if cluster.cluster_type == ClusterType.TenDBSingle.value
+        ]
+
+        # 存在不可用 proxy 的集群
+        proxy_unavailable_cluster_ids = set()
+        if proxy_cluster_ids:
+            proxy_unavailable_cluster_ids = set(
+                cls.objects.filter(id__in=proxy_cluster_ids, proxyinstance__status=InstanceStatus.UNAVAILABLE.value)
+                .values_list("id", flat=True)
+                .distinct()
+            )
+
+        # 集群中不可用存储实例的角色
+        storage_unavailable_roles: Dict[int, set] = defaultdict(set)
+        if flag_cluster_ids:
+            for cluster_id, instance_inner_role in (
+                cls.objects.filter(id__in=flag_cluster_ids, storageinstance__status=InstanceStatus.UNAVAILABLE.value)
+                .values_list("id", "storageinstance__instance_inner_role")
+                .distinct()
+            ):
+                storage_unavailable_roles[cluster_id].add(instance_inner_role)
+
+        status_flags = {}
+        for cluster in clusters:
+            unavailable_roles = storage_unavailable_roles.get(cluster.id, set())
+            if cluster.cluster_type == ClusterType.TenDBHA.value:
+                flag_obj = ClusterDBHAStatusFlags(0)
+                if cluster.id in proxy_unavailable_cluster_ids:
+                    flag_obj |= ClusterDBHAStatusFlags.ProxyUnavailable
+                if InstanceInnerRole.MASTER.value in unavailable_roles:
+                    flag_obj |= ClusterDBHAStatusFlags.BackendMasterUnavailable
+                if InstanceInnerRole.SLAVE.value in unavailable_roles:
+                    flag_obj |= ClusterDBHAStatusFlags.BackendSlaveUnavailable
+            elif cluster.cluster_type == ClusterType.TenDBCluster.value:
+                flag_obj = ClusterTenDBClusterStatusFlag(0)
+                if cluster.id in proxy_unavailable_cluster_ids:
+                    flag_obj |= ClusterTenDBClusterStatusFlag.SpiderUnavailable
+                if InstanceInnerRole.MASTER.value in unavailable_roles:
+                    flag_obj |= ClusterTenDBClusterStatusFlag.RemoteMasterUnavailable
+                if InstanceInnerRole.SLAVE.value in unavailable_roles:
+                    flag_obj |= ClusterTenDBClusterStatusFlag.RemoteSlaveUnavailable
+            elif cluster.cluster_type == ClusterType.TenDBSingle.value:
+                flag_obj = ClusterDBSingleStatusFlags(0)
+                if unavailable_roles:
+                    flag_obj |= ClusterDBSingleStatusFlags.SingleUnavailable
+            else:
+                logger.debug(_("{} 未实现 status flag,".format(cluster.cluster_type)))
+                flag_obj = ClusterStatusFlags(0)
+            status_flags[cluster.id] = flag_obj
+
+        return status_flags
+
+    @classmethod
+    def attach_status_flags(cls, clusters: List["Cluster"]) -> List["Cluster"]:
+        """批量计算集群的 status flag 并挂载到集群对象上，之后读取 status_flag/status_flag_text 不再查询"""
+        status_flags = cls.get_status_flags(clusters)
+        for cluster in clusters:
+            cluster._status_flag = status_flags[cluster.id]
+        return clusters
+
     @property
     def __status_flag(self):
-        if self.cluster_type == ClusterType.TenDBHA.value:
-            flag_obj = ClusterDBHAStatusFlags(0)
-            if self.proxyinstance_set.filter(status=InstanceStatus.UNAVAILABLE.value).exists():
-                flag_obj |= ClusterDBHAStatusFlags.ProxyUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.MASTER.value
-            ).exists():
-                flag_obj |= ClusterDBHAStatusFlags.BackendMasterUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.SLAVE.value
-            ).exists():
-                flag_obj |= ClusterDBHAStatusFlags.BackendSlaveUnavailable
-        elif self.cluster_type == ClusterType.TenDBCluster.value:
-            flag_obj = ClusterTenDBClusterStatusFlag(0)
-            if self.proxyinstance_set.filter(status=InstanceStatus.UNAVAILABLE.value).exists():
-                flag_obj |= ClusterTenDBClusterStatusFlag.SpiderUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.MASTER.value
-            ).exists():
-                flag_obj |= ClusterTenDBClusterStatusFlag.RemoteMasterUnavailable
-            if self.storageinstance_set.filter(
-                status=InstanceStatus.UNAVAILABLE.value, instance_inner_role=InstanceInnerRole.SLAVE.value
-            ).exists():
-                flag_obj |= ClusterTenDBClusterStatusFlag.RemoteSlaveUnavailable
-        elif self.cluster_type == ClusterType.TenDBSingle.value:
-            flag_obj = ClusterDBSingleStatusFlags(0)
-            if self.storageinstance_set.filter(status=InstanceStatus.UNAVAILABLE.value).exists():
-                flag_obj |= ClusterDBSingleStatusFlags.SingleUnavailable
-        else:
-            logger.debug(_("{} 未实现 status flag,".format(self.cluster_type)))
-            flag_obj = ClusterStatusFlags(0)
-
+        # 优先使用批量挂载的结果
+        flag_obj = getattr(self, "_status_flag", None)
+        if flag_obj is None:
+            flag_obj = self.get_status_flags([self])[self.id]
         return flag_obj
 
     @property
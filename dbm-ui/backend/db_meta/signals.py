@@ -10,8 +10,11 @@ specific language governing permissions and limitations under the License.
 """
 from typing import Union
 
+from backend.db_meta.change_feed import InstanceKind, record_instance_changes, record_instance_id_changes
 from backend.db_meta.enums import ClusterStatus
-from backend.db_meta.models import ProxyInstance, StorageInstance
+from backend.db_meta.models import Cluster, ClusterEntry, ProxyInstance, StorageInstance, StorageInstanceTuple
+
+INSTANCE_KINDS = {StorageInstance: InstanceKind.STORAGE, ProxyInstance: InstanceKind.PROXY}
 
 
 def update_cluster_status(sender, instance: Union[StorageInstance, ProxyInstance], **kwargs):
@@ -21,7 +24,8 @@ def update_cluster_status(sender, instance: Union[StorageInstance, ProxyInstance
     if kwargs.get("created"):
         return
     # 仅在实例状态变更时，同步更新集群状态
-    for cluster in instance.cluster.all():
+    clusters = Cluster.attach_status_flags(list(instance.cluster.all()))
+    for cluster in clusters:
         # 忽略临时集群
         if cluster.status == ClusterStatus.TEMPORARY.value:
             return
@@ -33,3 +37,38 @@ def update_cluster_status(sender, instance: Union[StorageInstance, ProxyInstance
         if origin_status != target_status:
             cluster.status = target_status
             cluster.save(update_fields=["status"])
+
+
+def record_instance_change(sender, instance: Union[StorageInstance, ProxyInstance], **kwargs):
+    """实例新增、修改或删除时记录到变更流"""
+    record_instance_changes(INSTANCE_KINDS[sender], [instance])
+
+
+def record_instance_tuple_change(sender, instance: StorageInstanceTuple, **kwargs):
+    """同步关系变化时，主从两端的实例都受影响"""
+    record_instance_id_changes(InstanceKind.STORAGE, [instance.ejector_id, instance.receiver_id])
+
+
+def record_cluster_entry_change(sender, instance: ClusterEntry, **kwargs):
+    """访问入口变化时，绑定在入口上的实例都受影响。删除时需要在 pre_delete 阶段获取绑定关系"""
+    record_instance_changes(InstanceKind.STORAGE, instance.storageinstance_set.select_related("machine"))
+    record_instance_changes(InstanceKind.PROXY, instance.proxyinstance_set.select_related("machine"))
+
+
+def record_m2m_instance_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """实例的多对多关系(集群、访问入口、proxy 后端)变化时，记录关系两端的实例"""
+    if action not in ["post_add", "post_remove", "pre_clear"]:
+        return
+
+    if action == "pre_clear":
+        # clear 时 pk_set 为空，需要在清理前通过中间表查出关联对象
+        source_field = next(f for f in sender._meta.fields if f.related_model is type(instance) and not f.primary_key)
+        target_field = next(f for f in sender._meta.fields if f.related_model is model and f is not source_field)
+        pk_set = sender.objects.filter(**{source_field.attname: instance.pk}).values_list(
+            target_field.attname, flat=True
+        )
+
+    if type(instance) in INSTANCE_KINDS:
+        record_instance_changes(INSTANCE_KINDS[type(instance)], [instance])
+    if model in INSTANCE_KINDS:
+        record_instance_id_changes(INSTANCE_KINDS[model], pk_set or [])
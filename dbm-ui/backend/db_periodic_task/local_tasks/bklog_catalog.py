@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+
+备份巡检的备份记录拉取：
+- 整天的时间范围切分为多个分片并发查询日志平台，每个分片内分页拉取
+- 分片的结果超过 ES 的分页窗口时继续二分时间范围，避免结果被截断
+- 调用方对拉取结果做一次遍历即可按集群分组，不再需要逐集群查询日志平台
+"""
+import datetime
+import itertools
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.utils import timezone
+
+from backend import env
+from backend.components.bklog.client import BKLogApi
+from backend.utils.batch_request import request_multi_thread
+from backend.utils.string import pascal_to_snake
+from backend.utils.time import datetime2str
+
+logger = logging.getLogger("root")
+
+# 单页拉取的日志条数
+BKLOG_QUERY_PAGE_SIZE = 2000
+# ES 的分页窗口(index.max_result_window)，from + size 不能超过该值
+BKLOG_MAX_RESULT_WINDOW = 10000
+# 并发查询的时间分片长度
+BKLOG_QUERY_SLICE = datetime.timedelta(hours=1)
+BKLOG_QUERY_SORT_LIST = [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]]
+# 巡检报告批量写入的大小
+BACKUP_CHECK_REPORT_BATCH_SIZE = 500
+
+
+def yesterday_time_range() -> Tuple[datetime.datetime, datetime.datetime]:
+    """巡检的时间范围：前一天的 00:00:00 ~ 23:59:59"""
+    yesterday = timezone.localtime() - datetime.timedelta(days=1)
+    start_time = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_time = start_time + datetime.timedelta(days=1, seconds=-1)
+    return start_time, end_time
+
+
+def _search(
+    collector: str,
+    start_time: datetime.datetime,
+    end_time: datetime.datetime,
+    query_string: str,
+    start: int,
+    size: int,
+) -> Dict:
+    return BKLogApi.esquery_search(
+        {
+            "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.{collector}",
+            "start_time": datetime2str(start_time),
+            "end_time": datetime2str(end_time),
+            "query_string": query_string,
+            "start": start,
+            "size": size,
+            "sort_list": BKLOG_QUERY_SORT_LIST,
+        },
+        use_admin=True,
+    )
+
+
+def _hits_total(resp: Dict) -> int:
+    total = resp["hits"]["total"]
+    # ES 7 之后 total 为 {"value": xx, "relation": "eq"} 的格式
+    return total["value"] if isinstance(total, dict) else total
+
+
+def _parse_hits(resp: Dict) -> List[Dict]:
+    logs = []
+    for hit in resp["hits"]["hits"]:
+        raw_log = json.loads(hit["_source"]["log"])
+        logs.append({pascal_to_snake(key): value for key, value in raw_log.items()})
+    return logs
+
+
+def _query_slice(
+    collector: str, start_time: datetime.datetime, end_time: datetime.datetime, query_string: str
+) -> List[Dict]:
+    """分页拉取一个时间分片内的全部日志"""
+    resp = _search(collector, start_time, end_time, query_string, 0, BKLOG_QUERY_PAGE_SIZE)
+    total = _hits_total(resp)
+
+    # 超过分页窗口时二分时间范围分别拉取(时间精度为秒)
+    if total > BKLOG_MAX_RESULT_WINDOW and end_time > start_time:
+        middle = (start_time + (end_time - start_time) / 2).replace(microsecond=0)
+        return _query_slice(collector, start_time, middle, query_string) + _query_slice(
+            collector, middle + datetime.timedelta(seconds=1), end_time, query_string
+        )
+    if total > BKLOG_MAX_RESULT_WINDOW:
+        logger.warning(
+            "bklog collector %s has %s logs in %s, only %s are fetched",
+            collector,
+            total,
+            start_time,
+            BKLOG_MAX_RESULT_WINDOW,
+        )
+
+    logs = _parse_hits(resp)
+    for start in range(BKLOG_QUERY_PAGE_SIZE, min(total, BKLOG_MAX_RESULT_WINDOW), BKLOG_QUERY_PAGE_SIZE):
+        size = min(BKLOG_QUERY_PAGE_SIZE, BKLOG_MAX_RESULT_WINDOW - start)
+        logs.extend(_parse_hits(_search(collector, start_time, end_time, query_string, start, size)))
+    return logs
+
+
+def query_bklog_logs(
+    collector: str,
+    start_time: datetime.datetime,
+    end_time: datetime.datetime,
+    query_string: str = "*",
+    slice_interval: datetime.timedelta = BKLOG_QUERY_SLICE,
+) -> List[Dict]:
+    """
+    从日志平台拉取采集项在时间范围内的全部日志，按时间分片并发查询，返回结果保持时间顺序
+    @param collector: 采集项名称
+    @param start_time: 开始时间
+    @param end_time: 结束时间
+    @param query_string: 过滤条件
+    @param slice_interval: 时间分片长度
+    """
+    params_list = []
+    slice_start = start_time
+    while slice_start <= end_time:
+        slice_end = min(slice_start + slice_interval - datetime.timedelta(seconds=1), end_time)
+        params_list.append(
+            {"collector": collector, "start_time": slice_start, "end_time": slice_end, "query_string": query_string}
+        )
+        slice_start = slice_end + datetime.timedelta(seconds=1)
+
+    slice_logs = request_multi_thread(_query_slice, params_list, get_data=lambda x: x[1], in_order=True)
+    return list(itertools.chain.from_iterable(slice_logs))
+
+
+def group_logs(
+    logs: List[Dict], key_func: Callable[[Dict], Any], convert_func: Optional[Callable[[Dict], Dict]] = None
+) -> Dict[Any, List[Dict]]:
+    """
+    一次遍历将日志按 key 分组，key_func 返回 None 的日志会被忽略
+    @param logs: 日志列表
+    @param key_func: 分组 key 的获取函数
+    @param convert_func: 日志的转换函数
+    """
+    groups = defaultdict(list)
+    for log in logs:
+        key = key_func(log)
+        if key is None:
+            continue
+        groups[key].append(convert_func(log) if convert_func else log)
+    return groups
@@ -12,7 +12,10 @@ import copy
 import datetime
 import json
 import logging
+import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Optional, Set
 
 from celery.schedules import crontab
 from django.core.cache import cache
@@ -29,6 +32,9 @@ from .constants import QUERY_TEMPLATE, UNIFY_QUERY_PARAMS
 
 logger = logging.getLogger("celery")
 
+# 并发查询的集群类型数
+SYNC_CLUSTER_STAT_CONCURRENCY = 5
+
 
 def query_cap(cluster_type, cap_key="used"):
     """查询某类集群的某种容量: used/total"""
@@ -67,62 +73,90 @@ def query_cap(cluster_type, cap_key="used"):
     return cluster_bytes
 
 
-def query_cluster_capacity(cluster_type):
-    """查询集群容量"""
-
-    cluster_cap_bytes = defaultdict(dict)
-
-    domains = list(
-        Cluster.objects.filter(cluster_type=cluster_type).values_list("immute_domain", flat=True).distinct()
+def get_valid_domains() -> Dict[str, Set[str]]:
+    """一次性查询出各类集群的有效域名，influxdb 以主机 ip 作为维度，对所有集群类型都有效"""
+    influxdb_hosts = set(
+        StorageInstance.objects.filter(instance_role=InstanceRole.INFLUXDB).values_list("machine__ip", flat=True)
     )
+    valid_domains = defaultdict(lambda: set(influxdb_hosts))
+    for cluster_type, domain in Cluster.objects.values_list("cluster_type", "immute_domain").distinct():
+        valid_domains[cluster_type].add(domain)
+    return valid_domains
 
-    influxdb_hosts = StorageInstance.objects.filter(instance_role=InstanceRole.INFLUXDB).values_list(
-        "machine__ip", flat=True
-    )
-    domains.extend(influxdb_hosts)
 
-    used_data = query_cap(cluster_type, "used")
-    for cluster, used in used_data.items():
-        # 排除无效集群
-        if cluster not in domains:
-            continue
-        cluster_cap_bytes[cluster]["used"] = used
+def query_cluster_capacity(cluster_type, valid_domains: Optional[Set[str]] = None):
+    """
+    查询集群容量
+    @param cluster_type: 集群类型
+    @param valid_domains: 该类集群的有效域名集合，为空时实时查询
+    """
+    if valid_domains is None:
+        valid_domains = get_valid_domains()[cluster_type]
 
-    total_data = query_cap(cluster_type, "total")
-    for cluster, used in total_data.items():
-        # 排除无效集群
-        if cluster not in domains:
-            continue
-        cluster_cap_bytes[cluster]["total"] = used
+    cluster_cap_bytes = defaultdict(dict)
+    for cap_key in ["used", "total"]:
+        for cluster, cap in query_cap(cluster_type, cap_key).items():
+            # 排除无效集群
+            if cluster not in valid_domains:
+                continue
+            cluster_cap_bytes[cluster][cap_key] = cap
 
-    # print(cluster_type, cluster_cap_bytes)
     return cluster_cap_bytes
 
 
+def calc_in_use(cluster_stats: Dict[str, Dict]):
+    """计算使用率"""
+    for cluster, cap in cluster_stats.items():
+        # 兼容查不到数据的情况
+        if not ("used" in cap and "total" in cap):
+            continue
+        cap["in_use"] = round(cap["used"] * 100.0 / cap["total"], 2)
+
+
 @register_periodic_task(run_every=crontab(minute="*/3"))
 def sync_cluster_stat_from_monitor():
     """
     同步各集群容量状态
+    各类集群并发查询，每完成一类就写入缓存，返回每类集群的耗时统计
     """
 
     logger.info("sync_cluster_stat_from_monitor started")
-    cluster_types = list(Cluster.objects.values_list("cluster_type", flat=True).distinct())
+    begin = time.perf_counter()
+    valid_domains = get_valid_domains()
+    cluster_types = list(valid_domains.keys())
     cluster_types.append(ClusterType.Influxdb.value)
 
-    cluster_stats = {}
-    for cluster_type in cluster_types:
-        try:
-            cluster_capacity = query_cluster_capacity(cluster_type)
+    # 未完成的集群类型先沿用上一轮的结果，避免读到不完整的数据
+    cached_stats = json.loads(cache.get(CACHE_CLUSTER_STATS, "{}"))
+    cluster_stats, metrics = {}, {}
+
+    def _query(cluster_type, domains):
+        start = time.perf_counter()
+        return query_cluster_capacity(cluster_type, domains), time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=SYNC_CLUSTER_STAT_CONCURRENCY) as executor:
+        futures = {
+            executor.submit(_query, cluster_type, valid_domains[cluster_type]): cluster_type
+            for cluster_type in set(cluster_types)
+        }
+        for future in as_completed(futures):
+            cluster_type = futures[future]
+            try:
+                cluster_capacity, cost = future.result()
+            except Exception as e:
+                logger.error("query_cluster_capacity error: %s -> %s", cluster_type, e)
+                metrics[cluster_type] = {"cost": None, "clusters": 0, "error": str(e)}
+                continue
+
+            calc_in_use(cluster_capacity)
             cluster_stats.update(cluster_capacity)
-        except Exception as e:
-            logger.error("query_cluster_capacity error: %s -> %s", cluster_type, e)
-
-    # 计算使用率
-    for cluster, cap in cluster_stats.items():
-        # 兼容查不到数据的情况
-        if not ("used" in cap and "total" in cap):
-            continue
-        cap["in_use"] = round(cap["used"] * 100.0 / cap["total"], 2)
+            cached_stats.update(cluster_capacity)
+            cache.set(CACHE_CLUSTER_STATS, json.dumps(cached_stats))
+            metrics[cluster_type] = {"cost": round(cost, 3), "clusters": len(cluster_capacity), "error": ""}
 
-    # print(cluster_stats)
+    # 全部完成后只保留本轮的结果，清理已下架的集群
     cache.set(CACHE_CLUSTER_STATS, json.dumps(cluster_stats))
+    logger.info(
+        "sync_cluster_stat_from_monitor finished, cost: %.3fs, metrics: %s", time.perf_counter() - begin, metrics
+    )
+    return metrics
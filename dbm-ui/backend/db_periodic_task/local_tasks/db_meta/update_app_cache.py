@@ -20,6 +20,7 @@ from backend.components import CCApi
 from backend.db_meta.models import AppCache
 from backend.db_periodic_task.local_tasks.register import register_periodic_task
 from backend.dbm_init.constants import CC_APP_ABBR_ATTR
+from backend.utils.batch_request import iter_batch_request
 
 logger = logging.getLogger("celery")
 
@@ -114,17 +115,15 @@ def bulk_update_app_cache():
 
     # 批量同步准备
     LIMIT = 1000
-    start = 0
-    total = CCApi.search_business({"page": {"start": 0, "limit": 1}}).get("count", 0)
 
     begin_at = datetime.datetime.now(timezone.utc)
-    logger.warning("bulk_update_app_cache: start update app cache total: %s", total)
+    logger.warning("bulk_update_app_cache: start update app cache")
 
-    # 批量创建和更新
+    # 批量创建和更新，业务分页流式拉取，逐页处理后即可释放
     create_cnt, update_cnt = 0, 0
     update_fields = [CC_APP_ABBR_ATTR, "bk_biz_name", "time_zone", "bk_biz_maintainer"]
-    while start < total:
-        info = CCApi.search_business({"page": {"start": start, "limit": LIMIT}}).get("info", [])
+    pages = iter_batch_request(CCApi.search_business, {}, limit=LIMIT, get_data=lambda x: x.get("info", []))
+    for page, info in enumerate(pages):
         biz_map = {i["bk_biz_id"]: i for i in info}
 
         bk_biz_ids = list(biz_map.keys())
@@ -176,9 +175,7 @@ def bulk_update_app_cache():
         AppCache.objects.bulk_update(update_apps, fields=update_fields)
         create_cnt += len(new_apps)
         update_cnt += len(update_apps)
-        logger.info("bulk_update_app_cache[%s]: new: %s, update: %s", start, len(new_apps), len(update_apps))
-
-        start += LIMIT
+        logger.info("bulk_update_app_cache[%s]: new: %s, update: %s", page * LIMIT, len(new_apps), len(update_apps))
 
     logger.warning(
         "bulk_update_app_cache [%s] finish update app cache end, create_cnt: %s, update_cnt: %s",
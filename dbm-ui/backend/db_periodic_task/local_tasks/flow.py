@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+from backend.db_periodic_task.local_tasks import register_periodic_task
+from backend.flow.utils.job_status import poll_pending_job_instance_status
+
+
+@register_periodic_task(run_every=2)
+def poll_job_instance_status():
+    """批量刷新已到轮询时间的 Job 任务状态，每个任务的轮询间隔由 job_status 按退避计算"""
+    poll_pending_job_instance_status()
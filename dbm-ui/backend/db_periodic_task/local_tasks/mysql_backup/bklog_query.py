@@ -9,13 +9,12 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import datetime
-import json
-from typing import Dict, List
+from typing import Dict, List, Optional
 
-from backend import env
-from backend.components.bklog.client import BKLogApi
-from backend.utils.string import pascal_to_snake
-from backend.utils.time import datetime2str
+from ..bklog_catalog import group_logs, query_bklog_logs
+
+BACKUP_RESULT_COLLECTOR = "mysql_backup_result"
+BINLOG_RESULT_COLLECTOR = "mysql_binlog_result"
 
 
 def _get_log_from_bklog(collector, start_time, end_time, query_string="*") -> List[Dict]:
@@ -26,25 +25,72 @@ def _get_log_from_bklog(collector, start_time, end_time, query_string="*") -> Li
     @param end_time: 结束时间
     @param query_string: 过滤条件
     """
-    resp = BKLogApi.esquery_search(
-        {
-            "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.{collector}",
-            "start_time": datetime2str(start_time),
-            "end_time": datetime2str(end_time),
-            # 这里需要精确查询集群域名，所以可以通过log: "key: \"value\""的格式查询
-            "query_string": query_string,
-            "start": 0,
-            "size": 6000,
-            "sort_list": [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]],
-        },
-        use_admin=True,
-    )
-    backup_logs = []
-    for hit in resp["hits"]["hits"]:
-        raw_log = json.loads(hit["_source"]["log"])
-        backup_logs.append({pascal_to_snake(key): value for key, value in raw_log.items()})
-
-    return backup_logs
+    return query_bklog_logs(collector, start_time, end_time, query_string)
+
+
+def _log_cluster_id(log: Dict) -> Optional[int]:
+    try:
+        return int(log["cluster_id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _to_backup_file(log: Dict) -> Dict:
+    return {
+        "backup_id": log["backup_id"],
+        "cluster_domain": log["cluster_address"],
+        "cluster_id": log["cluster_id"],
+        "task_id": log["task_id"],
+        "file_name": log["file_name"],
+        "file_size": log["file_size"],
+        "file_type": log["file_type"],
+        "mysql_host": log["mysql_host"],
+        "mysql_port": log["mysql_port"],
+        "mysql_role": log["mysql_role"],
+        "backup_type": log["backup_type"],
+        "data_schema_grant": log["data_schema_grant"],
+        "backup_begin_time": log["backup_begin_time"],
+        "backup_end_time": log["backup_end_time"],
+        "consistent_backup_time": log["consistent_backup_time"],
+        "shard_value": log["shard_value"],
+    }
+
+
+def _to_binlog(log: Dict) -> Dict:
+    return {
+        "cluster_domain": log["cluster_domain"],
+        "cluster_id": log["cluster_id"],
+        "task_id": log["task_id"],
+        "file_name": log["filename"],  # file_name
+        "file_size": log["size"],
+        "file_mtime": log["file_mtime"],
+        "file_type": "binlog",
+        "mysql_host": log["host"],
+        "mysql_port": log["port"],
+        "mysql_role": log["db_role"],
+        "backup_status": log["backup_status"],
+        "backup_status_info": log["backup_status_info"],
+    }
+
+
+def query_backup_log_by_cluster(start_time: datetime.datetime, end_time: datetime.datetime) -> Dict[int, List[Dict]]:
+    """
+    拉取时间范围内所有集群的全备备份记录，按集群ID分组
+    :param start_time: 开始时间
+    :param end_time: 结束时间
+    """
+    logs = query_bklog_logs(BACKUP_RESULT_COLLECTOR, start_time, end_time)
+    return group_logs(logs, _log_cluster_id, _to_backup_file)
+
+
+def query_binlog_by_cluster(start_time: datetime.datetime, end_time: datetime.datetime) -> Dict[int, List[Dict]]:
+    """
+    拉取时间范围内所有集群的binlog备份记录，按集群ID分组
+    :param start_time: 开始时间
+    :param end_time: 结束时间
+    """
+    logs = query_bklog_logs(BINLOG_RESULT_COLLECTOR, start_time, end_time)
+    return group_logs(logs, _log_cluster_id, _to_binlog)
 
 
 class ClusterBackup:
@@ -64,35 +110,14 @@ class ClusterBackup:
         :param start_time: 开始时间
         :param end_time: 结束时间
         """
-        backup_files = []
         backup_logs = _get_log_from_bklog(
-            collector="mysql_backup_result",
+            collector=BACKUP_RESULT_COLLECTOR,
             start_time=start_time,
             end_time=end_time,
             query_string=f'log: "cluster_id: {self.cluster_id}"',
             # query_string=f'log: "cluster_address: \\"{self.cluster_domain}\\""',
         )
-        for log in backup_logs:
-            bf = {
-                "backup_id": log["backup_id"],
-                "cluster_domain": log["cluster_address"],
-                "cluster_id": log["cluster_id"],
-                "task_id": log["task_id"],
-                "file_name": log["file_name"],
-                "file_size": log["file_size"],
-                "file_type": log["file_type"],
-                "mysql_host": log["mysql_host"],
-                "mysql_port": log["mysql_port"],
-                "mysql_role": log["mysql_role"],
-                "backup_type": log["backup_type"],
-                "data_schema_grant": log["data_schema_grant"],
-                "backup_begin_time": log["backup_begin_time"],
-                "backup_end_time": log["backup_end_time"],
-                "consistent_backup_time": log["consistent_backup_time"],
-                "shard_value": log["shard_value"],
-            }
-            backup_files.append(bf)
-        return backup_files
+        return [_to_backup_file(log) for log in backup_logs]
 
     def query_binlog_from_bklog(self, start_time: datetime.datetime, end_time: datetime.datetime) -> List[Dict]:
         """
@@ -101,28 +126,11 @@ class ClusterBackup:
         :param start_time: 开始时间
         :param end_time: 结束时间
         """
-        binlogs = []
-        backup_logs = _get_log_from_bklog(
-            collector="mysql_binlog_result",
+        binlogs = _get_log_from_bklog(
+            collector=BINLOG_RESULT_COLLECTOR,
             start_time=start_time,
             end_time=end_time,
             query_string=f'log: "cluster_id: {self.cluster_id}"',
             # query_string=f'log: "cluster_address: \\"{self.cluster_domain}\\""',
         )
-        for log in backup_logs:
-            bl = {
-                "cluster_domain": log["cluster_domain"],
-                "cluster_id": log["cluster_id"],
-                "task_id": log["task_id"],
-                "file_name": log["filename"],  # file_name
-                "file_size": log["size"],
-                "file_mtime": log["file_mtime"],
-                "file_type": "binlog",
-                "mysql_host": log["host"],
-                "mysql_port": log["port"],
-                "mysql_role": log["db_role"],
-                "backup_status": log["backup_status"],
-                "backup_status_info": log["backup_status_info"],
-            }
-            binlogs.append(bl)
-        return binlogs
+        return [_to_binlog(log) for log in binlogs]
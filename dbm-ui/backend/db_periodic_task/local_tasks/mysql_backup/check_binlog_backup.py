@@ -9,52 +9,54 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 from collections import defaultdict
-from datetime import datetime, timedelta
-
-from django.utils import timezone
+from typing import Dict, List
 
 from backend.db_meta.enums import ClusterType
 from backend.db_meta.models import Cluster
 from backend.db_report.enums import MysqlBackupCheckSubType
 from backend.db_report.models import MysqlBackupCheckReport
 
-from .bklog_query import ClusterBackup
+from ..bklog_catalog import BACKUP_CHECK_REPORT_BATCH_SIZE, yesterday_time_range
+from .bklog_query import ClusterBackup, query_binlog_by_cluster
 
 
 def check_binlog_backup():
-    _check_tendbha_binlog_backup()
-    _check_tendbcluster_binlog_backup()
+    # 一次拉取前一天所有集群的binlog备份记录，按集群分组后再逐个集群校验
+    start_time, end_time = yesterday_time_range()
+    cluster_binlogs = query_binlog_by_cluster(start_time, end_time)
+
+    reports = _check_tendbha_binlog_backup(cluster_binlogs)
+    reports.extend(_check_tendbcluster_binlog_backup(cluster_binlogs))
+    MysqlBackupCheckReport.objects.bulk_create(reports, batch_size=BACKUP_CHECK_REPORT_BATCH_SIZE)
 
 
-def _check_tendbha_binlog_backup():
+def _check_tendbha_binlog_backup(cluster_binlogs: Dict[int, List[Dict]]) -> List[MysqlBackupCheckReport]:
     """
     master 实例必须要有备份binlog
     且binlog序号要连续
     """
-    return _check_binlog_backup(ClusterType.TenDBHA)
+    return _check_binlog_backup(ClusterType.TenDBHA, cluster_binlogs)
 
 
-def _check_tendbcluster_binlog_backup():
+def _check_tendbcluster_binlog_backup(cluster_binlogs: Dict[int, List[Dict]]) -> List[MysqlBackupCheckReport]:
     """
     master 实例必须要有备份binlog
     且binlog序号要连续
     """
-    return _check_binlog_backup(ClusterType.TenDBCluster)
+    return _check_binlog_backup(ClusterType.TenDBCluster, cluster_binlogs)
 
 
-def _check_binlog_backup(cluster_type):
+def _check_binlog_backup(cluster_type, cluster_binlogs: Dict[int, List[Dict]]) -> List[MysqlBackupCheckReport]:
     """
     master 实例必须要有备份binlog
     且binlog序号要连续
+    @param cluster_type: 集群类型
+    @param cluster_binlogs: 按集群ID分组的binlog备份记录
     """
+    reports = []
     for c in Cluster.objects.filter(cluster_type=cluster_type):
         backup = ClusterBackup(c.id, c.immute_domain)
-        now = datetime.now(timezone.utc)
-        yesterday = now - timedelta(days=1)
-        start_time = datetime(yesterday.year, yesterday.month, yesterday.day)
-        end_time = datetime(yesterday.year, yesterday.month, yesterday.day, 23, 59, 59)
-
-        items = backup.query_binlog_from_bklog(start_time, end_time)
+        items = cluster_binlogs.get(c.id, [])
         instance_binlogs = defaultdict(list)
         shard_binlog_stat = {}
         for i in items:
@@ -69,15 +71,18 @@ def _check_binlog_backup(cluster_type):
             if not shard_binlog_stat[inst]:
                 backup.success = False
         if not backup.success:
-            MysqlBackupCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=ClusterType.TenDBCluster,
-                status=False,
-                msg="binlog is not consecutive:{}".format(shard_binlog_stat),
-                subtype=MysqlBackupCheckSubType.BinlogSeq.value,
+            reports.append(
+                MysqlBackupCheckReport(
+                    bk_biz_id=c.bk_biz_id,
+                    bk_cloud_id=c.bk_cloud_id,
+                    cluster=c.immute_domain,
+                    cluster_type=cluster_type,
+                    status=False,
+                    msg="binlog is not consecutive:{}".format(shard_binlog_stat),
+                    subtype=MysqlBackupCheckSubType.BinlogSeq.value,
+                )
             )
+    return reports
 
 
 def is_consecutive_strings(str_list: list):
@@ -9,21 +9,25 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 from collections import defaultdict
-from datetime import datetime, timedelta
-
-from django.utils import timezone
+from typing import Dict, List
 
 from backend.db_meta.enums import ClusterType
 from backend.db_meta.models import Cluster
 from backend.db_report.enums import MysqlBackupCheckSubType
 from backend.db_report.models import MysqlBackupCheckReport
 
-from .bklog_query import ClusterBackup
+from ..bklog_catalog import BACKUP_CHECK_REPORT_BATCH_SIZE, yesterday_time_range
+from .bklog_query import ClusterBackup, query_backup_log_by_cluster
 
 
 def check_full_backup():
-    _check_tendbha_full_backup()
-    _check_tendbcluster_full_backup()
+    # 一次拉取前一天所有集群的备份记录，按集群分组后再逐个集群校验
+    start_time, end_time = yesterday_time_range()
+    cluster_backup_logs = query_backup_log_by_cluster(start_time, end_time)
+
+    reports = _check_tendbha_full_backup(cluster_backup_logs)
+    reports.extend(_check_tendbcluster_full_backup(cluster_backup_logs))
+    MysqlBackupCheckReport.objects.bulk_create(reports, batch_size=BACKUP_CHECK_REPORT_BATCH_SIZE)
 
 
 class BackupFile:
@@ -43,23 +47,20 @@ class MysqlBackup:
         self.data_schema_grant = ""
         self.consistent_backup_time = ""
         self.shard_value = -1
-        # self.file_index = BackupFile()
-        # self.file_priv = BackupFile()
+        self.file_index = None
+        self.file_priv = None
         self.file_tar = []
 
 
-def _check_tendbha_full_backup():
+def _check_tendbha_full_backup(cluster_backup_logs: Dict[int, List[Dict]]) -> List[MysqlBackupCheckReport]:
     """
     tendbha 必须有一份完整的备份
+    @param cluster_backup_logs: 按集群ID分组的全备备份记录
     """
+    reports = []
     for c in Cluster.objects.filter(cluster_type=ClusterType.TenDBHA):
         backup = ClusterBackup(c.id, c.immute_domain)
-        now = datetime.now(timezone.utc)
-        yesterday = now - timedelta(days=1)
-        start_time = datetime(yesterday.year, yesterday.month, yesterday.day).astimezone(timezone.utc)
-        end_time = datetime(yesterday.year, yesterday.month, yesterday.day, 23, 59, 59).astimezone(timezone.utc)
-
-        items = backup.query_backup_log_from_bklog(start_time, end_time)
+        items = cluster_backup_logs.get(c.id, [])
         # print("cluster={} backup_items:{}".format(c.immute_domain, items))
         for i in items:
             if i.get("data_schema_grant", "") == "all":
@@ -83,29 +84,29 @@ def _check_tendbha_full_backup():
                     backup.success = True
                     break
         if not backup.success:
-            MysqlBackupCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=ClusterType.TenDBHA,
-                status=False,
-                msg="no success full backup found",
-                subtype=MysqlBackupCheckSubType.FullBackup.value,
+            reports.append(
+                MysqlBackupCheckReport(
+                    bk_biz_id=c.bk_biz_id,
+                    bk_cloud_id=c.bk_cloud_id,
+                    cluster=c.immute_domain,
+                    cluster_type=ClusterType.TenDBHA,
+                    status=False,
+                    msg="no success full backup found",
+                    subtype=MysqlBackupCheckSubType.FullBackup.value,
+                )
             )
+    return reports
 
 
-def _check_tendbcluster_full_backup():
+def _check_tendbcluster_full_backup(cluster_backup_logs: Dict[int, List[Dict]]) -> List[MysqlBackupCheckReport]:
     """
     tendbcluster 集群必须有完整的备份
+    @param cluster_backup_logs: 按集群ID分组的全备备份记录
     """
+    reports = []
     for c in Cluster.objects.filter(cluster_type=ClusterType.TenDBCluster):
         backup = ClusterBackup(c.id, c.immute_domain)
-        now = datetime.now(timezone.utc)
-        yesterday = now - timedelta(days=1)
-        start_time = datetime(yesterday.year, yesterday.month, yesterday.day).astimezone(timezone.utc)
-        end_time = datetime(yesterday.year, yesterday.month, yesterday.day, 23, 59, 59).astimezone(timezone.utc)
-
-        items = backup.query_backup_log_from_bklog(start_time, end_time)
+        items = cluster_backup_logs.get(c.id, [])
         # print("cluster={} backup_items:{}".format(c.immute_domain, items))
         for i in items:
             if i.get("data_schema_grant", "") == "all":
@@ -143,12 +144,15 @@ def _check_tendbcluster_full_backup():
                 break
 
         if not backup.success:
-            MysqlBackupCheckReport.objects.create(
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=ClusterType.TenDBCluster,
-                status=False,
-                msg="no success full backup found:{}".format(message),
-                subtype=MysqlBackupCheckSubType.FullBackup.value,
+            reports.append(
+                MysqlBackupCheckReport(
+                    bk_biz_id=c.bk_biz_id,
+                    bk_cloud_id=c.bk_cloud_id,
+                    cluster=c.immute_domain,
+                    cluster_type=ClusterType.TenDBCluster,
+                    status=False,
+                    msg="no success full backup found:{}".format(message),
+                    subtype=MysqlBackupCheckSubType.FullBackup.value,
+                )
             )
+    return reports
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import logging
+from datetime import timedelta
+
+from celery.schedules import crontab
+from django.core.cache import cache
+from django.utils import timezone
+
+from backend.db_periodic_task.local_tasks.bklog_catalog import query_bklog_logs
+from backend.db_periodic_task.local_tasks.register import register_periodic_task
+from backend.db_services.mysql.fixpoint_rollback.catalog import (
+    get_synced_range,
+    ingest_backup_logs,
+    ingest_binlog_logs,
+    purge_expired_catalog,
+    set_synced_range,
+)
+from backend.db_services.mysql.fixpoint_rollback.constants import (
+    BACKUP_CATALOG_RETENTION_DAYS,
+    BACKUP_CATALOG_SYNC_DELAY_MINUTES,
+    BACKUP_CATALOG_SYNC_LOCK_KEY,
+    BACKUP_CATALOG_SYNC_LOCK_TIMEOUT,
+    MYSQL_BACKUP_COLLECTOR,
+    MYSQL_BINLOG_COLLECTOR,
+)
+
+logger = logging.getLogger("celery")
+
+
+@register_periodic_task(run_every=crontab(minute="*/5"))
+def sync_mysql_backup_catalog():
+    """增量同步日志平台的 mysql 全备和 binlog 记录到本地索引，供定点回档查询"""
+    if not cache.add(BACKUP_CATALOG_SYNC_LOCK_KEY, 1, BACKUP_CATALOG_SYNC_LOCK_TIMEOUT):
+        logger.info("sync mysql backup catalog is running, skip")
+        return
+
+    try:
+        _sync_mysql_backup_catalog()
+    finally:
+        cache.delete(BACKUP_CATALOG_SYNC_LOCK_KEY)
+
+
+def _sync_mysql_backup_catalog():
+    now = timezone.now()
+    retention_start = now - timedelta(days=BACKUP_CATALOG_RETENTION_DAYS)
+    synced_range = get_synced_range()
+    if not synced_range or synced_range[1] < retention_start:
+        # 索引未就绪或中断太久，重新同步整个保留周期
+        since = start_time = retention_start
+    else:
+        since, start_time = max(synced_range[0], retention_start), synced_range[1]
+
+    backup_count = ingest_backup_logs(query_bklog_logs(MYSQL_BACKUP_COLLECTOR, start_time, now))
+    binlog_count = ingest_binlog_logs(query_bklog_logs(MYSQL_BINLOG_COLLECTOR, start_time, now))
+    purge_expired_catalog(since)
+    # 日志平台入库有延迟，截止时间往前预留一段，下次同步从这里开始
+    set_synced_range(since, now - timedelta(minutes=BACKUP_CATALOG_SYNC_DELAY_MINUTES))
+    logger.info("sync mysql backup catalog from %s, backups: %s, binlogs: %s", start_time, backup_count, binlog_count)
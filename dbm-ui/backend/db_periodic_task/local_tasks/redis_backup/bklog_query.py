@@ -9,19 +9,20 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import datetime
-import json
 import logging
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 from django.utils.translation import ugettext as _
 
-from backend import env
-from backend.components.bklog.client import BKLogApi
-from backend.utils.string import pascal_to_snake
-from backend.utils.time import datetime2str
+from backend.constants import IP_PORT_DIVIDER
+
+from ..bklog_catalog import group_logs, query_bklog_logs
 
 logger = logging.getLogger("root")
 
+FULL_BACKUP_RESULT_COLLECTOR = "redis_fullbackup_result"
+BINLOG_BACKUP_RESULT_COLLECTOR = "redis_binlog_backup_result"
+
 
 def _get_log_from_bklog(
     collector: str, start_time: datetime.datetime, end_time: datetime.datetime, query_string: str = "*"
@@ -33,25 +34,33 @@ def _get_log_from_bklog(
     @param end_time: 结束时间
     @param query_string: 过滤条件
     """
-    resp = BKLogApi.esquery_search(
-        {
-            "indices": f"{env.DBA_APP_BK_BIZ_ID}_bklog.{collector}",
-            "start_time": datetime2str(start_time),
-            "end_time": datetime2str(end_time),
-            # 这里需要精确查询集群域名，所以可以通过log: "key: \"value\""的格式查询
-            "query_string": query_string,
-            "start": 0,
-            "size": 6000,
-            "sort_list": [["dtEventTimeStamp", "asc"], ["gseIndex", "asc"], ["iterationIndex", "asc"]],
-        },
-        use_admin=True,
-    )
-    backup_logs = []
-    for hit in resp["hits"]["hits"]:
-        raw_log = json.loads(hit["_source"]["log"])
-        backup_logs.append({pascal_to_snake(key): value for key, value in raw_log.items()})
+    return query_bklog_logs(collector, start_time, end_time, query_string)
 
-    return backup_logs
+
+def query_full_log_by_cluster(start_time: datetime.datetime, end_time: datetime.datetime) -> Dict[str, List[Dict]]:
+    """
+    拉取时间范围内所有集群的全备备份记录，按集群域名分组(redis备份没有上报cluster_id)
+    :param start_time: 开始时间
+    :param end_time: 结束时间
+    """
+    logs = query_bklog_logs(FULL_BACKUP_RESULT_COLLECTOR, start_time, end_time)
+    return group_logs(logs, lambda log: log.get("domain"), ClusterBackup.convert_to_backup_system_format)
+
+
+def query_binlog_by_instance(
+    start_time: datetime.datetime, end_time: datetime.datetime
+) -> Dict[Tuple[str, str], List[Dict]]:
+    """
+    拉取时间范围内所有集群的binlog备份记录，按(集群域名, 实例)分组
+    :param start_time: 开始时间
+    :param end_time: 结束时间
+    """
+    logs = query_bklog_logs(BINLOG_BACKUP_RESULT_COLLECTOR, start_time, end_time)
+    return group_logs(
+        logs,
+        lambda log: (log.get("domain"), f"{log.get('server_ip')}{IP_PORT_DIVIDER}{log.get('server_port')}"),
+        ClusterBackup.convert_to_backup_system_format,
+    )
 
 
 class ClusterBackup:
@@ -74,7 +83,7 @@ class ClusterBackup:
         backup_files = []
         # status = "to_backup_system_success"
         backup_logs = _get_log_from_bklog(
-            collector="redis_fullbackup_result",
+            collector=FULL_BACKUP_RESULT_COLLECTOR,
             start_time=start_time,
             end_time=end_time,
             query_string=f"domain: {self.cluster_domain}",
@@ -104,7 +113,7 @@ class ClusterBackup:
         """
         binlogs = []
         backup_logs = _get_log_from_bklog(
-            collector="redis_binlog_backup_result",
+            collector=BINLOG_BACKUP_RESULT_COLLECTOR,
             start_time=start_time,
             end_time=end_time,
             # query_string=f'log: "cluster_id: {self.cluster_id}"',
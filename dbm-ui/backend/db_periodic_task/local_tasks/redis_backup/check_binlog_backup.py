@@ -8,8 +8,8 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import logging
-from datetime import datetime, timedelta
-from typing import Any, List
+from datetime import timedelta
+from typing import Any, Dict, List, Tuple
 
 from django.db.models import Q
 from django.utils import timezone
@@ -24,16 +24,25 @@ from backend.db_report.enums import RedisBackupCheckSubType
 from backend.db_report.models import RedisBackupCheckReport
 from backend.flow.consts import DEFAULT_DB_MODULE_ID, ConfigTypeEnum
 
-from .bklog_query import ClusterBackup
+from ..bklog_catalog import BACKUP_CHECK_REPORT_BATCH_SIZE, yesterday_time_range
+from .bklog_query import query_binlog_by_instance
 
 logger = logging.getLogger("root")
 
 
 def check_binlog_backup():
-    _check_tendis_binlog_backup()
+    # 一次拉取前一天所有集群的binlog备份记录，按实例分组后再逐个节点校验
+    start_time, end_time = yesterday_time_range()
+    logger.info("+===+++++=== start_time is: {} ,end_time is :{} +++++===++++ ".format(start_time, end_time))
+    instance_binlogs = query_binlog_by_instance(start_time, end_time)
 
+    reports = _check_tendis_binlog_backup(instance_binlogs, start_time, end_time)
+    RedisBackupCheckReport.objects.bulk_create(reports, batch_size=BACKUP_CHECK_REPORT_BATCH_SIZE)
 
-def _check_tendis_binlog_backup():
+
+def _check_tendis_binlog_backup(
+    instance_binlogs: Dict[Tuple[str, str], List[Dict]], start_time, end_time
+) -> List[RedisBackupCheckReport]:
     """
     tendisplus,ssd 2种架构：
     tendisplus 一个集群40节点，每个节点10 个kvstore，一般20分钟上传一次binlog，一小时3次，一天的备份文件数：
@@ -42,7 +51,11 @@ def _check_tendis_binlog_backup():
     tendisplus,tendis ssd slave 实例必须要有备份binlog
     且binlog序号要连续
 
+    @param instance_binlogs: 按(集群域名, 实例)分组的binlog备份记录
+    @param start_time: 开始时间
+    @param end_time: 结束时间
     """
+    reports = []
     # 构建查询条件:tendisplus,ssd,cache,集群创建时间大于1天，巡检0点发起
     query = (
         Q(cluster_type=ClusterType.TendisPredixyTendisplusCluster)
@@ -74,37 +87,28 @@ def _check_tendis_binlog_backup():
                 cluster_slave_instance.append("{}{}{}".format(slave_obj.machine.ip, IP_PORT_DIVIDER, slave_obj.port))
 
         logger.info("+===+++++===  cluster slave instance  is: {} +++++===++++ ".format(cluster_slave_instance))
-        backup = ClusterBackup(c.id, c.immute_domain)
-        # 集群纬度的，假设一开始是备份完整的，后面会去校验对这个值进行赋值，如果有存在异常会赋值为False
-        # 不管是全备份还是binlog,只要有异常，这个就是False
-
-        now = datetime.now(timezone.utc)
-        yesterday = now - timedelta(days=1)
-        start_time = datetime(yesterday.year, yesterday.month, yesterday.day)
-        end_time = datetime(yesterday.year, yesterday.month, yesterday.day, 23, 59, 59)
-        #  	 +===+++++=== start_time is: 2023-10-25 00:00:00 ,end_time is :2023-10-25 23:59:59 +++++===++++
-        logger.info("+===+++++=== start_time is: {} ,end_time is :{} +++++===++++ ".format(start_time, end_time))
         # 对slave 进行统计
         for instance in cluster_slave_instance:
             # 单个节点的成功的binlog备份文件
             suceess_binlog_file_list = []
             ip, port = instance.split(":")
-            bklogs = backup.query_binlog_from_bklog(start_time, end_time, ip, port)
+            bklogs = instance_binlogs.get((c.immute_domain, instance), [])
             # 如果节点维度没有数据，就不用在进行下面的了
-            # 这里如果提升为集群维度的话，一般会有40*10*24*3=28800个文件，所以按节点维度来查
             if not bklogs:
                 msg = _("无法查找到在时间范围内{}-{}，集群{}：{}的binlog备份日志").format(start_time, end_time, c.immute_domain, instance)
                 logger.error(msg)
-                RedisBackupCheckReport.objects.create(
-                    creator=c.creator,
-                    bk_biz_id=c.bk_biz_id,
-                    bk_cloud_id=c.bk_cloud_id,
-                    cluster=c.immute_domain,
-                    cluster_type=c.cluster_type,
-                    instance=instance,
-                    status=False,
-                    msg=msg,
-                    subtype=RedisBackupCheckSubType.BinlogBackup.value,
+                reports.append(
+                    RedisBackupCheckReport(
+                        creator=c.creator,
+                        bk_biz_id=c.bk_biz_id,
+                        bk_cloud_id=c.bk_cloud_id,
+                        cluster=c.immute_domain,
+                        cluster_type=c.cluster_type,
+                        instance=instance,
+                        status=False,
+                        msg=msg,
+                        subtype=RedisBackupCheckSubType.BinlogBackup.value,
+                    )
                 )
 
             else:
@@ -112,16 +116,18 @@ def _check_tendis_binlog_backup():
                     # 失败的记录，直接记录:同一条记录，不可能又存在失败的，又存在成功的，所以有失败的直接入库了
                     if bklog.get("backup_status", "") == "to_backup_system_failed":
                         logger.error("+===+++++=== to_backup_system_failed bklog: {} +++++===++++ ".format(bklog))
-                        RedisBackupCheckReport.objects.create(
-                            creator=c.creator,
-                            bk_biz_id=c.bk_biz_id,
-                            bk_cloud_id=c.bk_cloud_id,
-                            cluster=c.immute_domain,
-                            cluster_type=c.cluster_type,
-                            instance=instance,
-                            status=False,
-                            msg=bklog["backup_status_info"],
-                            subtype=RedisBackupCheckSubType.BinlogBackup.value,
+                        reports.append(
+                            RedisBackupCheckReport(
+                                creator=c.creator,
+                                bk_biz_id=c.bk_biz_id,
+                                bk_cloud_id=c.bk_cloud_id,
+                                cluster=c.immute_domain,
+                                cluster_type=c.cluster_type,
+                                instance=instance,
+                                status=False,
+                                msg=bklog["backup_status_info"],
+                                subtype=RedisBackupCheckSubType.BinlogBackup.value,
+                            )
                         )
 
                     # 对成功的进行处理，判断文件序号的完备性
@@ -145,16 +151,18 @@ def _check_tendis_binlog_backup():
                                 len(bin_index_list), bin_index_list
                             )
                             logger.error("+===+++++=== {}+++++===++++ ".format(msg))
-                            RedisBackupCheckReport.objects.create(
-                                creator=c.creator,
-                                bk_biz_id=c.bk_biz_id,
-                                bk_cloud_id=c.bk_cloud_id,
-                                cluster=c.immute_domain,
-                                cluster_type=c.cluster_type,
-                                instance=instance,
-                                status=False,
-                                msg=msg,
-                                subtype=RedisBackupCheckSubType.BinlogBackup.value,
+                            reports.append(
+                                RedisBackupCheckReport(
+                                    creator=c.creator,
+                                    bk_biz_id=c.bk_biz_id,
+                                    bk_cloud_id=c.bk_cloud_id,
+                                    cluster=c.immute_domain,
+                                    cluster_type=c.cluster_type,
+                                    instance=instance,
+                                    status=False,
+                                    msg=msg,
+                                    subtype=RedisBackupCheckSubType.BinlogBackup.value,
+                                )
                             )
 
                         # else:
@@ -170,19 +178,22 @@ def _check_tendis_binlog_backup():
                             len(bin_index_list), bin_index_list
                         )
                         logger.error("+===+++++=== {}+++++===++++ ".format(msg))
-                        RedisBackupCheckReport.objects.create(
-                            creator=c.creator,
-                            bk_biz_id=c.bk_biz_id,
-                            bk_cloud_id=c.bk_cloud_id,
-                            cluster=c.immute_domain,
-                            cluster_type=c.cluster_type,
-                            instance=instance,
-                            status=False,
-                            msg=msg,
-                            subtype=RedisBackupCheckSubType.BinlogBackup.value,
+                        reports.append(
+                            RedisBackupCheckReport(
+                                creator=c.creator,
+                                bk_biz_id=c.bk_biz_id,
+                                bk_cloud_id=c.bk_cloud_id,
+                                cluster=c.immute_domain,
+                                cluster_type=c.cluster_type,
+                                instance=instance,
+                                status=False,
+                                msg=msg,
+                                subtype=RedisBackupCheckSubType.BinlogBackup.value,
+                            )
                         )
                     else:
                         logger.info(_("+===+++++=== {} binlog 序号连续 +++++===++++ ".format(instance)))
+    return reports
 
 
 def is_get_all_binlog(binlogs_list: List, tendis_type: str):
@@ -10,7 +10,8 @@ specific language governing permissions and limitations under the License.
 """
 import logging
 from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import timedelta
+from typing import Dict, List
 
 from django.db.models import Q
 from django.utils import timezone
@@ -22,13 +23,20 @@ from backend.db_meta.models import Cluster
 from backend.db_report.enums import RedisBackupCheckSubType
 from backend.db_report.models import RedisBackupCheckReport
 
-from .bklog_query import ClusterBackup
+from ..bklog_catalog import BACKUP_CHECK_REPORT_BATCH_SIZE, yesterday_time_range
+from .bklog_query import query_full_log_by_cluster
 
 logger = logging.getLogger("root")
 
 
 def check_full_backup():
-    _check_tendis_full_backup()
+    # 一次拉取前一天所有集群的全备记录，按集群分组后再逐个集群校验
+    start_time, end_time = yesterday_time_range()
+    logger.info("+===+++++=== start_time is: {} ,end_time is :{} +++++===++++ ".format(start_time, end_time))
+    cluster_full_logs = query_full_log_by_cluster(start_time, end_time)
+
+    reports = _check_tendis_full_backup(cluster_full_logs, start_time, end_time)
+    RedisBackupCheckReport.objects.bulk_create(reports, batch_size=BACKUP_CHECK_REPORT_BATCH_SIZE)
 
 
 class BackupFile:
@@ -38,7 +46,9 @@ class BackupFile:
         self.file_type = file_type
 
 
-def _check_tendis_full_backup():
+def _check_tendis_full_backup(
+    cluster_full_logs: Dict[str, List[Dict]], start_time, end_time
+) -> List[RedisBackupCheckReport]:
     """
     tendisplus,ssd,cache 三种架构：
     1、针对集群全部查询出来：
@@ -54,7 +64,12 @@ def _check_tendis_full_backup():
     备份规则：
     redis 全备份每天三次，一般的时间点如下：
     cron: 0 5,13,21 * * *
+
+    @param cluster_full_logs: 按集群域名分组的全备记录
+    @param start_time: 开始时间
+    @param end_time: 结束时间
     """
+    reports = []
     # 构建查询条件:tendisplus,ssd,cache,集群创建时间大于1天，巡检0点发起
     query = (
         Q(cluster_type=ClusterType.TendisPredixyTendisplusCluster)
@@ -96,31 +111,24 @@ def _check_tendis_full_backup():
         for instance in cluster_all_instance:
             bklog_success_instance_count[instance] = 0
 
-        now = datetime.now(timezone.utc)
-        yesterday = now - timedelta(days=1)
-        start_time = datetime(yesterday.year, yesterday.month, yesterday.day).astimezone(timezone.utc)
-        end_time = datetime(yesterday.year, yesterday.month, yesterday.day, 23, 59, 59).astimezone(timezone.utc)
-        #  	 +===+++++=== start_time is: 2023-10-25 00:00:00 ,end_time is :2023-10-25 23:59:59 +++++===++++
-        logger.info("+===+++++=== start_time is: {} ,end_time is :{} +++++===++++ ".format(start_time, end_time))
         # 集群前一天对应的集群备份记录
-        backup = ClusterBackup(c.id, c.immute_domain)
-        # 集群纬度的，假设一开始是备份完整的，后面会去校验对这个值进行赋值，如果有存在异常会赋值为False
-
-        bklogs = backup.query_full_log_from_bklog(start_time, end_time)
+        bklogs = cluster_full_logs.get(c.immute_domain, [])
         # 如果集群维度没有数据，就不用在看节点维度了
         if not bklogs:
             msg = _("无法查找到在时间范围内{}-{}，集群{}的全备份日志").format(start_time, end_time, c.immute_domain)
             logger.error(msg)
-            RedisBackupCheckReport.objects.create(
-                creator=c.creator,
-                bk_biz_id=c.bk_biz_id,
-                bk_cloud_id=c.bk_cloud_id,
-                cluster=c.immute_domain,
-                cluster_type=c.cluster_type,
-                instance="all instance",
-                status=False,
-                msg=msg,
-                subtype=RedisBackupCheckSubType.FullBackup.value,
+            reports.append(
+                RedisBackupCheckReport(
+                    creator=c.creator,
+                    bk_biz_id=c.bk_biz_id,
+                    bk_cloud_id=c.bk_cloud_id,
+                    cluster=c.immute_domain,
+                    cluster_type=c.cluster_type,
+                    instance="all instance",
+                    status=False,
+                    msg=msg,
+                    subtype=RedisBackupCheckSubType.FullBackup.value,
+                )
             )
 
         else:
@@ -128,16 +136,18 @@ def _check_tendis_full_backup():
                 # 失败的记录，直接记录:同一条记录，不可能又存在失败的，又存在成功的，所以有失败的直接入库了
                 if bklog.get("backup_status", "") == "to_backup_system_failed":
                     logger.error("+===+++++=== to_backup_system_failed bklog: {} +++++===++++ ".format(bklog))
-                    RedisBackupCheckReport.objects.create(
-                        creator=c.creator,
-                        bk_biz_id=c.bk_biz_id,
-                        bk_cloud_id=c.bk_cloud_id,
-                        cluster=c.immute_domain,
-                        cluster_type=c.cluster_type,
-                        instance=bklog["redis_ip"] + IP_PORT_DIVIDER + str(bklog["redis_port"]),
-                        status=False,
-                        msg=bklog["backup_status_info"],
-                        subtype=RedisBackupCheckSubType.FullBackup.value,
+                    reports.append(
+                        RedisBackupCheckReport(
+                            creator=c.creator,
+                            bk_biz_id=c.bk_biz_id,
+                            bk_cloud_id=c.bk_cloud_id,
+                            cluster=c.immute_domain,
+                            cluster_type=c.cluster_type,
+                            instance=bklog["redis_ip"] + IP_PORT_DIVIDER + str(bklog["redis_port"]),
+                            status=False,
+                            msg=bklog["backup_status_info"],
+                            subtype=RedisBackupCheckSubType.FullBackup.value,
+                        )
                     )
 
                 # 对成功的进行处理
@@ -160,18 +170,21 @@ def _check_tendis_full_backup():
                         master_backup_count = bklog_success_instance_count[master_instance]
                         # 如果master也不足3次备份，则记录备份异常
                         if master_backup_count < 3:
-                            RedisBackupCheckReport.objects.create(
-                                creator=c.creator,
-                                bk_biz_id=c.bk_biz_id,
-                                bk_cloud_id=c.bk_cloud_id,
-                                cluster=c.immute_domain,
-                                cluster_type=c.cluster_type,
-                                instance=instance,
-                                status=False,
-                                msg="slave:{} the number of files successfully backed is:{},"
-                                "master:{} the number of files successfully backed is:{}："
-                                "There are no backup files 3 times，please check! ".format(
-                                    instance, count, master_instance, master_backup_count
-                                ),
-                                subtype=RedisBackupCheckSubType.FullBackup.value,
+                            reports.append(
+                                RedisBackupCheckReport(
+                                    creator=c.creator,
+                                    bk_biz_id=c.bk_biz_id,
+                                    bk_cloud_id=c.bk_cloud_id,
+                                    cluster=c.immute_domain,
+                                    cluster_type=c.cluster_type,
+                                    instance=instance,
+                                    status=False,
+                                    msg="slave:{} the number of files successfully backed is:{},"
+                                    "master:{} the number of files successfully backed is:{}："
+                                    "There are no backup files 3 times，please check! ".format(
+                                        instance, count, master_instance, master_backup_count
+                                    ),
+                                    subtype=RedisBackupCheckSubType.FullBackup.value,
+                                )
                             )
+    return reports
@@ -26,6 +26,19 @@ class InstancesSerializer(BaseProxyPassSerializer):
         help_text=_("状态列表"), child=serializers.CharField(), allow_null=True, allow_empty=True, required=False
     )
     bk_cloud_id = serializers.IntegerField()
+    compact = serializers.BooleanField(help_text=_("是否只返回DBHA需要的字段"), required=False, default=False)
+
+
+class InstanceChangesSerializer(BaseProxyPassSerializer):
+    since_version = serializers.IntegerField(help_text=_("上次拉取的版本号，为0时全量拉取"), required=False, default=0)
+    logical_city_ids = serializers.ListField(
+        help_text=_("逻辑城市ID列表"), child=serializers.IntegerField(), allow_null=True, allow_empty=True, required=False
+    )
+    statuses = serializers.ListField(
+        help_text=_("状态列表"), child=serializers.CharField(), allow_null=True, allow_empty=True, required=False
+    )
+    bk_cloud_id = serializers.IntegerField()
+    compact = serializers.BooleanField(help_text=_("是否只返回DBHA需要的字段"), required=False, default=False)
 
 
 class InstancesResponseSerializer(serializers.Serializer):
@@ -44,6 +57,7 @@ class SwapRoleSerializer(BaseProxyPassSerializer):
 
     payloads = serializers.ListSerializer(help_text=_("角色交换信息列表"), child=SwapEleSerializer())
     bk_cloud_id = serializers.IntegerField()
+    bulk = serializers.BooleanField(help_text=_("是否批量模式，返回每一对实例的处理结果"), required=False, default=False)
 
 
 class TendisClusterSwapSerializer(BaseProxyPassSerializer):
@@ -70,6 +84,7 @@ class UpdateStatusSerializer(BaseProxyPassSerializer):
         help_text=_("更新状态的信息列表"), child=UpdateStatusEleSerializer(), allow_null=True, allow_empty=True
     )
     bk_cloud_id = serializers.IntegerField()
+    bulk = serializers.BooleanField(help_text=_("是否批量模式，返回每个实例的处理结果"), required=False, default=False)
 
 
 class EntryDetailSerializer(BaseProxyPassSerializer):
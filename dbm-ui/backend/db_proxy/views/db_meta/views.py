@@ -28,6 +28,7 @@ from backend.db_proxy.views.db_meta.serializers import (
     FakeResetTendbHACluster,
     FakeTendbHACreateCluster,
     FakeTendbSingleCreateCluster,
+    InstanceChangesSerializer,
     InstanceDetailSLZ,
     InstancesResponseSerializer,
     InstancesSerializer,
@@ -56,6 +57,21 @@ class DBMetaApiProxyPassViewSet(BaseProxyPassViewSet):
         validated_data = self.params_validate(self.get_serializer_class())
         return Response(DBHA.instances(**validated_data))
 
+    @common_swagger_auto_schema(
+        operation_summary=_("[dbmeta]查询某个版本之后变化的实例"),
+        request_body=InstanceChangesSerializer(),
+        tags=[SWAGGER_TAG],
+    )
+    @action(
+        methods=["POST"],
+        detail=False,
+        serializer_class=InstanceChangesSerializer,
+        url_path="dbmeta/dbha/instance_changes",
+    )
+    def instance_changes(self, request):
+        validated_data = self.params_validate(self.get_serializer_class())
+        return Response(DBHA.instance_changes(**validated_data))
+
     @common_swagger_auto_schema(
         operation_summary=_("[dbmeta]实例角色交换"),
         request_body=SwapRoleSerializer(),
@@ -64,7 +80,9 @@ class DBMetaApiProxyPassViewSet(BaseProxyPassViewSet):
     @action(methods=["POST"], detail=False, serializer_class=SwapRoleSerializer, url_path="dbmeta/dbha/swap_role")
     def swap_role(self, request):
         validated_data = self.params_validate(self.get_serializer_class())
-        return Response(DBHA.swap_role(validated_data["payloads"], validated_data["bk_cloud_id"]))
+        return Response(
+            DBHA.swap_role(validated_data["payloads"], validated_data["bk_cloud_id"], validated_data["bulk"])
+        )
 
     @common_swagger_auto_schema(
         operation_summary=_("[dbmeta]tendis集群交换"),
@@ -91,7 +109,9 @@ class DBMetaApiProxyPassViewSet(BaseProxyPassViewSet):
     )
     def update_status(self, request):
         validated_data = self.params_validate(self.get_serializer_class())
-        return Response(DBHA.update_status(validated_data["payloads"], validated_data["bk_cloud_id"]))
+        return Response(
+            DBHA.update_status(validated_data["payloads"], validated_data["bk_cloud_id"], validated_data["bulk"])
+        )
 
     @common_swagger_auto_schema(
         operation_summary=_("[dbmeta]查询entry信息"),
@@ -34,6 +34,15 @@ class DtsDistributeLockSerializer(BaseProxyPassSerializer):
     lockkey = serializers.CharField(help_text=_("锁key名"), required=True)
     holder = serializers.CharField(help_text=_("锁持有者"), required=True)
     ttl_sec = serializers.IntegerField(help_text=_("锁ttl时间(seconds)"), required=False)
+    with_token = serializers.BooleanField(help_text=_("是否返回fencing token"), required=False, default=False)
+
+
+class DtsDistributeRenewSerializer(BaseProxyPassSerializer):
+    lockkeys = serializers.ListField(
+        help_text=_("锁key名列表"), child=serializers.CharField(), allow_empty=False, required=True
+    )
+    holder = serializers.CharField(help_text=_("锁持有者"), required=True)
+    ttl_sec = serializers.IntegerField(help_text=_("锁ttl时间(seconds)"), required=False)
 
 
 class DtsServerMigatingTasksSerializer(BaseProxyPassSerializer):
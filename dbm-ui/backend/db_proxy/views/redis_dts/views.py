@@ -16,6 +16,7 @@ from backend.bk_web.swagger import common_swagger_auto_schema
 from backend.db_proxy.constants import SWAGGER_TAG
 from backend.db_proxy.views.redis_dts.serializers import (
     DtsDistributeLockSerializer,
+    DtsDistributeRenewSerializer,
     DtsJobSrcIPRunningTasksSerializer,
     DtsJobTasksSerializer,
     DtsJobToScheduleTasksSerializer,
@@ -30,6 +31,7 @@ from backend.db_proxy.views.redis_dts.serializers import (
 )
 from backend.db_proxy.views.views import BaseProxyPassViewSet
 from backend.db_services.redis.redis_dts.apis import (
+    dts_distribute_renew,
     dts_distribute_trylock,
     dts_distribute_unlock,
     dts_tasks_updates,
@@ -102,6 +104,21 @@ class DtsApiProxyPassViewSet(BaseProxyPassViewSet):
         validated_data = self.params_validate(self.get_serializer_class())
         return Response(dts_distribute_trylock(validated_data))
 
+    @common_swagger_auto_schema(
+        operation_summary=_("dts 分布式锁,批量续约"),
+        request_body=DtsDistributeRenewSerializer,
+        tags=[SWAGGER_TAG],
+    )
+    @action(
+        methods=["POST"],
+        detail=False,
+        serializer_class=DtsDistributeRenewSerializer,
+        url_path="redis_dts/distribute_renew",
+    )
+    def dts_distribute_renew(self, request):
+        validated_data = self.params_validate(self.get_serializer_class())
+        return Response(dts_distribute_renew(validated_data))
+
     @common_swagger_auto_schema(
         operation_summary=_("dts 分布式锁,unlock"),
         request_body=DtsDistributeLockSerializer,
@@ -115,7 +132,7 @@ class DtsApiProxyPassViewSet(BaseProxyPassViewSet):
     )
     def dts_distribute_unlock(self, request):
         validated_data = self.params_validate(self.get_serializer_class())
-        return dts_distribute_unlock(validated_data)
+        return Response(dts_distribute_unlock(validated_data))
 
     @common_swagger_auto_schema(
         operation_summary=_("获取dts server迁移中的任务"),
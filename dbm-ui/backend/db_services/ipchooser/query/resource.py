@@ -20,8 +20,9 @@ from django.utils.translation import ugettext as _
 from backend import env
 from backend.bk_web.constants import CACHE_1D
 from backend.components import CCApi
+from backend.components.base import AsyncDataAPI
 from backend.components.gse.client import GseApi
-from backend.utils.batch_request import batch_request
+from backend.utils.batch_request import async_batch_request, iter_batch_request
 from backend.utils.cache import func_cache_decorator
 
 from .. import constants, exceptions, types
@@ -123,8 +124,9 @@ class ResourceQueryHelper:
 
     @staticmethod
     def fetch_host_topo_relations(bk_biz_id: int) -> typing.List[typing.Dict]:
-        host_topo_relations: typing.List[typing.Dict] = batch_request(
-            func=CCApi.find_host_topo_relation,
+        # 大业务的主机拓扑关系有上万条，分页请求以协程并发，总数直接取自第一页
+        host_topo_relations: typing.List[typing.Dict] = async_batch_request(
+            func=AsyncDataAPI(CCApi.find_host_topo_relation),
             params={"bk_biz_id": bk_biz_id, "no_request": True},
             get_data=lambda x: x["data"],
         )
@@ -498,14 +500,11 @@ class ResourceQueryHelper:
         查询云区域信息
         """
 
-        resp = batch_request(
-            func=CCApi.search_cloud_area,
-            params={},
-            get_data=lambda x: x["info"],
-        )
-        cloud_id__cloud_info = {
-            str(info["bk_cloud_id"]): {f: info[f] for f in fields} if fields else info for info in resp
-        }
+        cloud_id__cloud_info = {}
+        for page_data in iter_batch_request(func=CCApi.search_cloud_area, params={}, get_data=lambda x: x["info"]):
+            cloud_id__cloud_info.update(
+                {str(info["bk_cloud_id"]): {f: info[f] for f in fields} if fields else info for info in page_data}
+            )
         # 命名要求 default_area ---> Direct Mode
         cloud_id__cloud_info[str(0)]["bk_cloud_name"] = _("直连区域")
         return cloud_id__cloud_info
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+
+定点回档的备份记录本地索引：
+- 周期任务增量拉取日志平台的全备和 binlog 记录写入本地表，并记录已同步的时间范围
+- 查询时，已同步范围内的部分走本地索引的范围查询，尚未同步的尾部仍从日志平台补齐
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from backend.db_services.mysql.fixpoint_rollback.models import MysqlBackupCatalog, MysqlBinlogCatalog
+from backend.utils.time import str2datetime
+
+logger = logging.getLogger("root")
+
+# 本地索引已同步的时间范围
+BACKUP_CATALOG_SYNCED_RANGE_KEY = "mysql_backup_catalog_synced_range"
+BACKUP_CATALOG_BATCH_SIZE = 500
+# 写入索引必须的字段，缺失的记录会被跳过
+BACKUP_LOG_REQUIRED_FIELDS = ["cluster_id", "backup_id", "backup_host", "backup_port"]
+BINLOG_REQUIRED_FIELDS = ["cluster_id", "host", "port", "task_id", "filename"]
+
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        o_datetime = str2datetime(value, aware_check=False)
+    except (ValueError, OverflowError):
+        return None
+    # 不带时区的时间按服务器时区处理
+    return o_datetime if timezone.is_aware(o_datetime) else timezone.make_aware(o_datetime)
+
+
+def _has_required_fields(log: Dict, fields: List[str]) -> bool:
+    return all(log.get(field) not in (None, "") for field in fields)
+
+
+def get_synced_range() -> Optional[Tuple[datetime, datetime]]:
+    """获取本地索引已同步的时间范围，索引未就绪时返回None"""
+    synced_range = cache.get(BACKUP_CATALOG_SYNCED_RANGE_KEY)
+    if not synced_range:
+        return None
+    try:
+        return (
+            datetime.fromtimestamp(synced_range["since"], tz=timezone.utc),
+            datetime.fromtimestamp(synced_range["until"], tz=timezone.utc),
+        )
+    except (KeyError, TypeError, ValueError, OverflowError):
+        # 格式不正确时视为索引未就绪，由周期任务重新同步
+        logger.warning("invalid backup catalog synced range: %s", synced_range)
+        return None
+
+
+def set_synced_range(since: datetime, until: datetime):
+    # 缓存使用 JSON 序列化，以时间戳存储，读取时还原为带时区的时间
+    cache.set(BACKUP_CATALOG_SYNCED_RANGE_KEY, {"since": since.timestamp(), "until": until.timestamp()}, None)
+
+
+def ingest_backup_logs(backup_logs: List[Dict]) -> int:
+    """
+    写入全备记录，已存在的记录会被忽略
+    @param backup_logs: 日志平台 mysql_dbbackup_result 的记录
+    """
+    catalogs = []
+    for log in backup_logs:
+        backup_time = _parse_time(log.get("consistent_backup_time") or log.get("backup_consistent_time"))
+        if not backup_time or not _has_required_fields(log, BACKUP_LOG_REQUIRED_FIELDS):
+            logger.warning("skip invalid backup log: %s", log)
+            continue
+        catalogs.append(
+            MysqlBackupCatalog(
+                cluster_id=log["cluster_id"],
+                backup_id=log["backup_id"],
+                backup_host=log["backup_host"],
+                backup_port=log["backup_port"],
+                mysql_role=log.get("mysql_role") or "",
+                backup_time=backup_time,
+                log=log,
+            )
+        )
+    MysqlBackupCatalog.objects.bulk_create(catalogs, batch_size=BACKUP_CATALOG_BATCH_SIZE, ignore_conflicts=True)
+    return len(catalogs)
+
+
+def ingest_binlog_logs(binlogs: List[Dict]) -> int:
+    """
+    写入binlog备份记录，同一实例的同一个备份任务只保留首次写入的记录
+    @param binlogs: 日志平台 mysql_binlog_result 的记录
+    """
+    catalogs = []
+    for log in binlogs:
+        start_time, stop_time = _parse_time(log.get("start_time")), _parse_time(log.get("stop_time"))
+        if not start_time or not stop_time or not _has_required_fields(log, BINLOG_REQUIRED_FIELDS):
+            logger.warning("skip invalid binlog log: %s", log)
+            continue
+        catalogs.append(
+            MysqlBinlogCatalog(
+                cluster_id=log["cluster_id"],
+                host=log["host"],
+                port=log["port"],
+                task_id=str(log["task_id"]),
+                filename=log["filename"],
+                start_time=start_time,
+                stop_time=stop_time,
+                log=log,
+            )
+        )
+    MysqlBinlogCatalog.objects.bulk_create(catalogs, batch_size=BACKUP_CATALOG_BATCH_SIZE, ignore_conflicts=True)
+    return len(catalogs)
+
+
+def purge_expired_catalog(before: datetime):
+    """清理早于指定时间的索引记录"""
+    MysqlBackupCatalog.objects.filter(backup_time__lt=before).delete()
+    MysqlBinlogCatalog.objects.filter(stop_time__lt=before).delete()
+
+
+def query_catalog_backup_logs(cluster_id: int, start_time: datetime, end_time: datetime) -> List[Dict]:
+    """
+    查询集群在时间范围内的全备记录，同一个backup_id的记录会被完整返回，便于按backup_id聚合
+    @param cluster_id: 集群ID
+    @param start_time: 开始时间
+    @param end_time: 结束时间
+    """
+    backup_ids = MysqlBackupCatalog.objects.filter(
+        cluster_id=cluster_id, backup_time__range=(start_time, end_time)
+    ).values("backup_id")
+    catalogs = MysqlBackupCatalog.objects.filter(cluster_id=cluster_id, backup_id__in=backup_ids)
+    return list(catalogs.order_by("backup_time", "id").values_list("log", flat=True))
+
+
+def query_catalog_binlogs(host: str, port: int, start_time: datetime, end_time: datetime) -> List[Dict]:
+    """
+    查询实例覆盖时间范围的binlog备份记录
+    @param host: 实例IP
+    @param port: 实例端口
+    @param start_time: 开始时间
+    @param end_time: 结束时间
+    """
+    catalogs = MysqlBinlogCatalog.objects.filter(
+        host=host, port=port, stop_time__gte=start_time, start_time__lte=end_time
+    )
+    return list(catalogs.order_by("start_time", "id").values_list("log", flat=True))
@@ -14,3 +14,17 @@ BACKUP_LOG_RANGE_DAYS = 7
 
 # 查询某个特定时间点附近的日志时，默认在3天内
 BACKUP_LOG_ROLLBACK_TIME_RANGE_DAYS = 3
+
+# 日志平台的备份记录采集项
+MYSQL_BACKUP_COLLECTOR = "mysql_dbbackup_result"
+MYSQL_BINLOG_COLLECTOR = "mysql_binlog_result"
+
+# 本地备份索引保留的天数
+BACKUP_CATALOG_RETENTION_DAYS = 14
+
+# 日志平台入库存在延迟，本地备份索引的同步截止时间需要往前预留的时间
+BACKUP_CATALOG_SYNC_DELAY_MINUTES = 10
+
+# 本地备份索引同步任务的互斥锁，首次同步整个保留周期可能超过调度周期，避免任务重叠执行
+BACKUP_CATALOG_SYNC_LOCK_KEY = "mysql_backup_catalog_sync_lock"
+BACKUP_CATALOG_SYNC_LOCK_TIMEOUT = 60 * 60
@@ -28,7 +28,16 @@ from backend.components.bklog.client import BKLogApi
 from backend.db_meta.enums import ClusterType, InstanceInnerRole
 from backend.db_meta.models import StorageInstance
 from backend.db_meta.models.cluster import Cluster
-from backend.db_services.mysql.fixpoint_rollback.constants import BACKUP_LOG_ROLLBACK_TIME_RANGE_DAYS
+from backend.db_services.mysql.fixpoint_rollback.catalog import (
+    get_synced_range,
+    query_catalog_backup_logs,
+    query_catalog_binlogs,
+)
+from backend.db_services.mysql.fixpoint_rollback.constants import (
+    BACKUP_LOG_ROLLBACK_TIME_RANGE_DAYS,
+    MYSQL_BACKUP_COLLECTOR,
+    MYSQL_BINLOG_COLLECTOR,
+)
 from backend.exceptions import AppBaseException
 from backend.flow.consts import SUCCESS_LIST, DBActuatorActionEnum, DBActuatorTypeEnum, InstanceStatus, JobStatusEnum
 from backend.flow.utils.script_template import dba_toolkit_actuator_template, fast_execute_script_common_kwargs
@@ -159,6 +168,37 @@ class FixPointRollbackHandler:
 
         return backup_logs
 
+    def _get_log_from_catalog(
+        self,
+        collector: str,
+        start_time: datetime,
+        end_time: datetime,
+        query_string: str,
+        query_catalog: Callable[[datetime, datetime], List[Dict]],
+        dedupe_key: Callable[[Dict], Any],
+    ) -> List[Dict]:
+        """
+        优先从本地备份索引查询，索引尚未同步的尾部从日志平台补齐；索引未覆盖开始时间时直接查询日志平台
+        @param collector: 采集项名称
+        @param start_time: 开始时间
+        @param end_time: 结束时间
+        @param query_string: 日志平台的过滤条件
+        @param query_catalog: 本地索引的查询函数
+        @param dedupe_key: 合并日志平台记录时的去重key
+        """
+        synced_range = get_synced_range()
+        if not synced_range or synced_range[0] > start_time:
+            return self._get_log_from_bklog(collector, start_time, end_time, query_string)
+
+        logs = query_catalog(start_time, end_time)
+        synced_until = synced_range[1]
+        if synced_until < end_time:
+            exist_keys = {dedupe_key(log) for log in logs}
+            tail_logs = self._get_log_from_bklog(collector, max(start_time, synced_until), end_time, query_string)
+            logs.extend(log for log in tail_logs if dedupe_key(log) not in exist_keys)
+
+        return logs
+
     @staticmethod
     def _format_backup_for_tendb(raw_log: Dict[str, Any], backup_log: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -513,11 +553,13 @@ class FixPointRollbackHandler:
         :param end_time: 结束时间
         """
 
-        backup_logs = self._get_log_from_bklog(
-            collector="mysql_dbbackup_result",
+        backup_logs = self._get_log_from_catalog(
+            collector=MYSQL_BACKUP_COLLECTOR,
             start_time=start_time,
             end_time=end_time,
             query_string=f'log: "cluster_id: \\"{self.cluster.id}\\""',
+            query_catalog=lambda _start, _end: query_catalog_backup_logs(self.cluster.id, _start, _end),
+            dedupe_key=lambda log: (log["backup_id"], log["backup_host"], log["backup_port"]),
         )
 
         if self.cluster.cluster_type == ClusterType.TenDBCluster:
@@ -545,12 +587,14 @@ class FixPointRollbackHandler:
             master = self.cluster.storageinstance_set.get(instance_inner_role=InstanceInnerRole.MASTER)
             host_ip, port = master.machine.ip, master.port
 
-        binlogs = self._get_log_from_bklog(
-            collector="mysql_binlog_result",
+        binlogs = self._get_log_from_catalog(
+            collector=MYSQL_BINLOG_COLLECTOR,
             # 时间范围前后放大避免日志平台上传延迟
             start_time=start_time - timedelta(minutes=minute_range),
             end_time=end_time + timedelta(minutes=minute_range),
             query_string=f"host: {host_ip} AND port: {port}",
+            query_catalog=lambda _start, _end: query_catalog_binlogs(host_ip, port, _start, _end),
+            dedupe_key=lambda log: str(log["task_id"]),
         )
 
         if not binlogs:
@@ -566,14 +610,14 @@ class FixPointRollbackHandler:
         }
         collector_fields = ["file_mtime", "start_time", "stop_time", "size", "task_id", "filename"]
         # 记录file task id，用于去重
-        file_task_id_list = []
+        file_task_ids = set()
         for log in binlogs:
-            if log["task_id"] in file_task_id_list:
+            if log["task_id"] in file_task_ids:
                 continue
 
             detail = {field: log[field] for field in collector_fields}
             detail["file_name"] = detail.pop("filename")
-            file_task_id_list.append(detail["task_id"])
+            file_task_ids.add(detail["task_id"])
             binlog_record["file_list_details"].append(detail)
 
         return binlog_record
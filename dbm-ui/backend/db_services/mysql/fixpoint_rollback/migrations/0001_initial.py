@@ -0,0 +1,68 @@
+# Generated by Django 3.2.19 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="MysqlBackupCatalog",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("cluster_id", models.IntegerField(help_text="集群ID")),
+                ("backup_id", models.CharField(help_text="备份ID", max_length=64)),
+                ("backup_host", models.CharField(help_text="备份实例IP", max_length=64)),
+                ("backup_port", models.IntegerField(help_text="备份实例端口")),
+                ("mysql_role", models.CharField(default="", help_text="备份实例角色", max_length=32)),
+                ("backup_time", models.DateTimeField(help_text="备份一致性时间")),
+                ("log", models.JSONField(help_text="日志平台的原始备份记录")),
+                ("create_at", models.DateTimeField(auto_now_add=True, verbose_name="创建时间")),
+            ],
+            options={
+                "verbose_name": "mysql全备记录索引",
+                "verbose_name_plural": "mysql全备记录索引",
+                "unique_together": {("backup_id", "backup_host", "backup_port")},
+            },
+        ),
+        migrations.CreateModel(
+            name="MysqlBinlogCatalog",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("cluster_id", models.IntegerField(help_text="集群ID")),
+                ("host", models.CharField(help_text="实例IP", max_length=64)),
+                ("port", models.IntegerField(help_text="实例端口")),
+                ("task_id", models.CharField(help_text="备份系统的任务ID", max_length=64)),
+                ("filename", models.CharField(help_text="binlog文件名", max_length=255)),
+                ("start_time", models.DateTimeField(help_text="binlog开始时间")),
+                ("stop_time", models.DateTimeField(help_text="binlog结束时间")),
+                ("log", models.JSONField(help_text="日志平台的原始binlog记录")),
+                ("create_at", models.DateTimeField(auto_now_add=True, verbose_name="创建时间")),
+            ],
+            options={
+                "verbose_name": "mysql binlog备份记录索引",
+                "verbose_name_plural": "mysql binlog备份记录索引",
+                "unique_together": {("host", "port", "task_id")},
+            },
+        ),
+        migrations.AddIndex(
+            model_name="mysqlbackupcatalog",
+            index=models.Index(fields=["cluster_id", "backup_time"], name="idx_cluster_backup_time"),
+        ),
+        migrations.AddIndex(
+            model_name="mysqlbackupcatalog",
+            index=models.Index(fields=["backup_time"], name="idx_backup_time"),
+        ),
+        migrations.AddIndex(
+            model_name="mysqlbinlogcatalog",
+            index=models.Index(fields=["host", "port", "stop_time"], name="idx_host_port_stop_time"),
+        ),
+        migrations.AddIndex(
+            model_name="mysqlbinlogcatalog",
+            index=models.Index(fields=["stop_time"], name="idx_stop_time"),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+
+class MysqlBackupCatalog(models.Model):
+    """mysql 全备记录的本地索引，由周期任务从日志平台增量同步"""
+
+    cluster_id = models.IntegerField(help_text=_("集群ID"))
+    backup_id = models.CharField(max_length=64, help_text=_("备份ID"))
+    backup_host = models.CharField(max_length=64, help_text=_("备份实例IP"))
+    backup_port = models.IntegerField(help_text=_("备份实例端口"))
+    mysql_role = models.CharField(max_length=32, default="", help_text=_("备份实例角色"))
+    backup_time = models.DateTimeField(help_text=_("备份一致性时间"))
+    log = models.JSONField(help_text=_("日志平台的原始备份记录"))
+    create_at = models.DateTimeField(auto_now_add=True, verbose_name=_("创建时间"))
+
+    class Meta:
+        verbose_name = verbose_name_plural = _("mysql全备记录索引")
+        unique_together = (("backup_id", "backup_host", "backup_port"),)
+        indexes = [
+            models.Index(fields=["cluster_id", "backup_time"], name="idx_cluster_backup_time"),
+            models.Index(fields=["backup_time"], name="idx_backup_time"),
+        ]
+
+
+class MysqlBinlogCatalog(models.Model):
+    """mysql binlog 备份记录的本地索引，由周期任务从日志平台增量同步"""
+
+    cluster_id = models.IntegerField(help_text=_("集群ID"))
+    host = models.CharField(max_length=64, help_text=_("实例IP"))
+    port = models.IntegerField(help_text=_("实例端口"))
+    task_id = models.CharField(max_length=64, help_text=_("备份系统的任务ID"))
+    filename = models.CharField(max_length=255, help_text=_("binlog文件名"))
+    start_time = models.DateTimeField(help_text=_("binlog开始时间"))
+    stop_time = models.DateTimeField(help_text=_("binlog结束时间"))
+    log = models.JSONField(help_text=_("日志平台的原始binlog记录"))
+    create_at = models.DateTimeField(auto_now_add=True, verbose_name=_("创建时间"))
+
+    class Meta:
+        verbose_name = verbose_name_plural = _("mysql binlog备份记录索引")
+        unique_together = (("host", "port", "task_id"),)
+        indexes = [
+            models.Index(fields=["host", "port", "stop_time"], name="idx_host_port_stop_time"),
+            models.Index(fields=["stop_time"], name="idx_stop_time"),
+        ]
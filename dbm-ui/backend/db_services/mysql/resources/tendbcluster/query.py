@@ -107,6 +107,8 @@ class ListRetrieveResource(DBHAListRetrieveResource):
             "id": cluster.id,
             "phase": cluster.phase,
             "status": cluster.status,
+            "status_flag": cluster.status_flag,
+            "status_flag_text": cluster.status_flag_text,
             "operations": ClusterOperateRecord.objects.get_cluster_operations(cluster.id),
             "cluster_name": cluster.name,
             "cluster_type": cluster.cluster_type,
@@ -241,6 +241,8 @@ class ListRetrieveResource(query.ListRetrieveResource):
             "tag_set",
         )
         cluster_entry_map = ClusterEntry.get_cluster_entry_map_by_cluster_ids([cluster.id for cluster in cluster_qset])
+        # 批量计算当前页集群的 status flag，避免逐个集群查询实例状态
+        Cluster.attach_status_flags(list(cluster_qset))
 
         clusters = []
         for cluster in cluster_qset:
@@ -269,6 +271,8 @@ class ListRetrieveResource(query.ListRetrieveResource):
             "phase": cluster.phase,
             "phase_name": cluster.get_phase_display(),
             "status": cluster.status,
+            "status_flag": cluster.status_flag,
+            "status_flag_text": cluster.status_flag_text,
             "operations": ClusterOperateRecord.objects.get_cluster_operations(cluster.id),
             "cluster_name": cluster.name,
             "cluster_type": cluster.cluster_type,
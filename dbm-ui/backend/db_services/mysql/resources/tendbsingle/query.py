@@ -160,6 +160,9 @@ class ListRetrieveResource(query.ListRetrieveResource):
             Prefetch("storageinstance_set", queryset=storage_inst_qset.select_related("machine"), to_attr="masters")
         )
 
+        # 批量计算当前页集群的 status flag，避免逐个集群查询实例状态
+        Cluster.attach_status_flags(list(cluster_qset))
+
         clusters = []
         for cluster in cluster_qset:
             clusters.append(cls._to_cluster_representation(cluster, db_module_names))
@@ -178,6 +181,8 @@ class ListRetrieveResource(query.ListRetrieveResource):
             "id": cluster.id,
             "phase": cluster.phase,
             "status": cluster.status,
+            "status_flag": cluster.status_flag,
+            "status_flag_text": cluster.status_flag_text,
             "operations": ClusterOperateRecord.objects.get_cluster_operations(cluster.id),
             "cluster_name": cluster.name,
             "cluster_type": cluster.cluster_type,
@@ -12,7 +12,7 @@ import logging
 from datetime import datetime, timedelta, timezone
 from typing import Tuple
 
-from django.db import IntegrityError, transaction
+from django.db import transaction
 from django.db.models import Case, IntegerField, Q, Value, When
 from django.forms.models import model_to_dict
 
@@ -23,16 +23,16 @@ from backend.exceptions import ApiError
 from backend.utils.time import datetime2str, strptime
 
 from .constants import DtsOperateType, DtsTaskType
+from .distribute_lock import dts_distribute_lock
 from .enums import DtsCopyType
 from .models import (
     TbDtsServerBlacklist,
-    TbTendisDtsDistributeLock,
     TbTendisDTSJob,
     TbTendisDtsTask,
     dts_task_clean_pwd_and_fmt_time,
     dts_task_format_time,
 )
-from .util import dts_job_cnt_and_status, dts_task_status, is_in_incremental_sync
+from .util import dts_jobs_cnt_and_status, dts_task_status, is_in_incremental_sync
 
 logger = logging.getLogger("root")
 
@@ -57,22 +57,19 @@ def get_dts_history_jobs(payload: dict) -> dict:
     jobs = TbTendisDTSJob.objects.filter(where).order_by("-create_time")
 
     # 分页
-    start_idx = 0
-    end_idx = jobs.count()
+    total_cnt = jobs.count()
     if "page" in payload and "page_size" in payload and payload.get("page_size") > 0:
         page = payload.get("page")
         page_size = payload.get("page_size")
-        start_idx = (page - 1) * page_size
-        end_idx = page * page_size
-        if end_idx >= len(jobs):
-            end_idx = len(jobs)
+        jobs = jobs[(page - 1) * page_size : page * page_size]
+    jobs = list(jobs)
 
+    # 一次聚合查询获取当前页所有job的task计数和状态
+    job_key__status = dts_jobs_cnt_and_status(jobs)
     resp = []
-    for job in jobs[start_idx:end_idx]:
-        status_ret = dts_job_cnt_and_status(job)
-
+    for job in jobs:
         job_json = model_to_dict(job)
-        job_json.update(status_ret)
+        job_json.update(job_key__status[(job.bill_id, job.src_cluster, job.dst_cluster)])
 
         # fill dst_copy_type with bill type
         if job_json["dts_copy_type"] == "":
@@ -82,7 +79,7 @@ def get_dts_history_jobs(payload: dict) -> dict:
         job_json["update_time"] = datetime2str(job.update_time)
         resp.append(job_json)
 
-    return {"total_cnt": jobs.count(), "jobs": resp}
+    return {"total_cnt": total_cnt, "jobs": resp}
 
 
 def get_dts_job_detail(payload: dict) -> list:
@@ -216,52 +213,25 @@ def dts_job_tasks_failed_retry(payload: dict):
     return list(tasks.values_list("id", flat=True))
 
 
-def dts_distribute_trylock(payload: dict) -> bool:
-    """dts 分布式锁,trylock,成功返回True,失败返回False"""
-    lockkey = payload.get("lockkey")
-    holder = payload.get("holder")
-    ttl_sec = payload.get("ttl_sec")
-    current_time = datetime.now(timezone.utc).astimezone()
-    expire_time = current_time + timedelta(seconds=ttl_sec)
-    lock_row = TbTendisDtsDistributeLock(
-        lock_key=lockkey, holder=holder, creation_time=current_time, lock_expire_time=expire_time
-    )
-    err = None
-    try:
-        lock_row.save()
-    except Exception as e:
-        err = e
-    if not err:
-        return True
-
-    if not (isinstance(err, IntegrityError) and "Duplicate entry" in err.args[1]):
-        raise err
-
-    # 可重入锁,lock_expire_time>now()代表锁未过期,可以重入,更新过期时间
-    # update tb_tendis_dts_distribute_lock set lock_expire_time=?
-    # where lock_key=? and holder=? and lock_expire_time>now();
-    with transaction.atomic():
-        updated_rows = TbTendisDtsDistributeLock.objects.filter(
-            lock_key=lockkey, holder=holder, lock_expire_time__gt=current_time
-        ).update(lock_expire_time=expire_time)
-        if updated_rows == 1:
-            return True
-
-    # 锁存在,且已过期
-    # lock_expire_time<now()代表锁已经过期,可以被其他应用获取,更新其holder和过期时间
-    # update tb_tendis_dts_distribute_lock set holder=?,lock_expire_time=? where lock_key=? and lock_expire_time<now();
-    with transaction.atomic():
-        updated_rows = TbTendisDtsDistributeLock.objects.filter(
-            lock_key=lockkey, lock_expire_time__lt=current_time
-        ).update(holder=holder, lock_expire_time=expire_time)
-        if updated_rows == 1:
-            return True
-    return False
-
-
-def dts_distribute_unlock(payload: dict):
+def dts_distribute_trylock(payload: dict):
+    """
+    dts 分布式锁,trylock,成功返回True,失败返回False
+    指定 with_token 时返回 {"locked": bool, "token": int},token 为单调递增的 fencing token
+    """
+    token = dts_distribute_lock.trylock(payload.get("lockkey"), payload.get("holder"), payload.get("ttl_sec"))
+    if payload.get("with_token"):
+        return {"locked": bool(token), "token": token}
+    return bool(token)
+
+
+def dts_distribute_renew(payload: dict) -> dict:
+    """dts 分布式锁,批量续约同一持有者的多个锁,返回 {lockkey: token},已失去的锁 token 为 0"""
+    return dts_distribute_lock.renew(payload.get("lockkeys"), payload.get("holder"), payload.get("ttl_sec"))
+
+
+def dts_distribute_unlock(payload: dict) -> bool:
     """dts 分布式锁,unlock"""
-    TbTendisDtsDistributeLock.objects.filter(lock_key=payload.get("lockkey"), holder=payload.get("holder")).delete()
+    return dts_distribute_lock.unlock(payload.get("lockkey"), payload.get("holder"))
 
 
 def get_dts_server_migrating_tasks(payload: dict) -> list:
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+
+DTS 分布式锁：基于 redis 的租约锁
+- 加锁成功返回 fencing token，同一租约内(重入、续约)token 不变，新租约的 token 一定大于旧租约
+- fencing token 取 max(上一个 token + 1, 当前毫秒时间戳)，redis 数据丢失或切换存储后也不会回退
+- 同一个持有者可以一次续约多个锁，DTS server 每个调度周期只需要一次请求
+- 存储由 DTS_DISTRIBUTE_LOCK_BACKEND 决定，存储异常时拒绝加锁/续约，由 DTS server 下个周期重试，不会自动降级
+- 默认使用 MySQL 表 tb_tendis_dts_distribute_lock，与升级前的进程兼容。切换到 redis 需要分两次滚动发布：
+  mysql -> dual(同时在 redis 和 MySQL 上加锁) -> redis，每一步新旧进程都至少在一个共同的存储上互斥
+"""
+import logging
+import time
+from datetime import timedelta
+from typing import Dict, List
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from backend import env
+from backend.utils.redis import RedisConn
+
+from .models import TbTendisDtsDistributeLock
+
+logger = logging.getLogger("root")
+
+DTS_LOCK_KEY_PREFIX = "dts_distribute_lock"
+DTS_LOCK_FENCING_TOKEN_KEY = "dts_distribute_lock_fencing_token"
+# 未指定 ttl 时锁的租约时间
+DTS_LOCK_DEFAULT_TTL_SEC = 30
+
+# 锁不存在时分配新的 fencing token 并加锁，持有者相同时重入并续约，返回租约的 token，加锁失败返回 0
+TRYLOCK_SCRIPT = """
+local lock = redis.call('HMGET', KEYS[1], 'holder', 'token')
+if lock[1] == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return tonumber(lock[2])
+end
+if lock[1] then
+    return 0
+end
+local token = redis.call('INCR', KEYS[2])
+if token < tonumber(ARGV[3]) then
+    redis.call('SET', KEYS[2], ARGV[3])
+    token = tonumber(ARGV[3])
+end
+redis.call('HMSET', KEYS[1], 'holder', ARGV[1], 'token', token)
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return token
+"""
+# 批量续约持有者的锁，返回每个锁的 token，锁已丢失时为 0
+RENEW_SCRIPT = """
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local lock = redis.call('HMGET', key, 'holder', 'token')
+    if lock[1] == ARGV[1] then
+        redis.call('PEXPIRE', key, ARGV[2])
+        tokens[i] = tonumber(lock[2])
+    else
+        tokens[i] = 0
+    end
+end
+return tokens
+"""
+UNLOCK_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'holder') == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _now_token() -> int:
+    return int(time.time() * 1000)
+
+
+class RedisDtsLock(object):
+    """基于 redis 租约的锁"""
+
+    def __init__(self):
+        self._trylock_script = RedisConn.register_script(TRYLOCK_SCRIPT)
+        self._renew_script = RedisConn.register_script(RENEW_SCRIPT)
+        self._unlock_script = RedisConn.register_script(UNLOCK_SCRIPT)
+
+    @staticmethod
+    def _key(lock_key: str) -> str:
+        return f"{DTS_LOCK_KEY_PREFIX}:{lock_key}"
+
+    def trylock(self, lock_key: str, holder: str, ttl_sec: int) -> int:
+        return int(
+            self._trylock_script(
+                keys=[self._key(lock_key), DTS_LOCK_FENCING_TOKEN_KEY], args=[holder, ttl_sec * 1000, _now_token()]
+            )
+        )
+
+    def renew(self, lock_keys: List[str], holder: str, ttl_sec: int) -> Dict[str, int]:
+        if not lock_keys:
+            return {}
+        tokens = self._renew_script(
+            keys=[self._key(lock_key) for lock_key in lock_keys], args=[holder, ttl_sec * 1000]
+        )
+        return {lock_key: int(token) for lock_key, token in zip(lock_keys, tokens)}
+
+    def unlock(self, lock_key: str, holder: str) -> bool:
+        return bool(self._unlock_script(keys=[self._key(lock_key)], args=[holder]))
+
+
+class MysqlDtsLock(object):
+    """基于 MySQL 表的锁"""
+
+    def trylock(self, lock_key: str, holder: str, ttl_sec: int) -> int:
+        now = timezone.now()
+        expire_time = now + timedelta(seconds=ttl_sec)
+        if not TbTendisDtsDistributeLock.objects.filter(lock_key=lock_key).exists():
+            token = _now_token()
+            try:
+                with transaction.atomic():
+                    TbTendisDtsDistributeLock.objects.create(
+                        lock_key=lock_key,
+                        holder=holder,
+                        creation_time=now,
+                        lock_expire_time=expire_time,
+                        fencing_token=token,
+                    )
+                return token
+            except IntegrityError:
+                # 并发插入，由下面的行锁判断归属
+                pass
+
+        with transaction.atomic():
+            lock = TbTendisDtsDistributeLock.objects.select_for_update().filter(lock_key=lock_key).first()
+            if lock is None:
+                # 加锁期间被持有者释放，本轮视为加锁失败
+                return 0
+            if lock.lock_expire_time > now and lock.holder != holder:
+                return 0
+            if lock.lock_expire_time <= now:
+                # 接管过期的锁，开启新租约
+                lock.holder = holder
+                lock.fencing_token = max(lock.fencing_token + 1, _now_token())
+            lock.lock_expire_time = expire_time
+            lock.save(update_fields=["holder", "lock_expire_time", "fencing_token"])
+            return lock.fencing_token
+
+    def renew(self, lock_keys: List[str], holder: str, ttl_sec: int) -> Dict[str, int]:
+        if not lock_keys:
+            return {}
+        now = timezone.now()
+        expire_time = now + timedelta(seconds=ttl_sec)
+        with transaction.atomic():
+            tokens = dict(
+                TbTendisDtsDistributeLock.objects.select_for_update()
+                .filter(lock_key__in=lock_keys, holder=holder, lock_expire_time__gt=now)
+                .values_list("lock_key", "fencing_token")
+            )
+            TbTendisDtsDistributeLock.objects.filter(lock_key__in=tokens.keys()).update(lock_expire_time=expire_time)
+        return {lock_key: tokens.get(lock_key, 0) for lock_key in lock_keys}
+
+    def unlock(self, lock_key: str, holder: str) -> bool:
+        # 删除后重新加锁的 token 为当前毫秒时间戳，仍大于已释放租约的 token
+        deleted, __ = TbTendisDtsDistributeLock.objects.filter(lock_key=lock_key, holder=holder).delete()
+        return bool(deleted)
+
+
+class DualDtsLock(object):
+    """切换存储期间同时在 redis 和 MySQL 上加锁，与仍只使用其中一种存储的进程互斥，token 以 redis 为准"""
+
+    def __init__(self):
+        self.redis_lock = RedisDtsLock()
+        self.mysql_lock = MysqlDtsLock()
+
+    def trylock(self, lock_key: str, holder: str, ttl_sec: int) -> int:
+        token = self.redis_lock.trylock(lock_key, holder, ttl_sec)
+        if not token:
+            return 0
+        if not self.mysql_lock.trylock(lock_key, holder, ttl_sec):
+            # MySQL 上的锁仍被只使用 MySQL 的进程持有
+            self.redis_lock.unlock(lock_key, holder)
+            return 0
+        return token
+
+    def renew(self, lock_keys: List[str], holder: str, ttl_sec: int) -> Dict[str, int]:
+        tokens = self.redis_lock.renew(lock_keys, holder, ttl_sec)
+        mysql_tokens = self.mysql_lock.renew(
+            [lock_key for lock_key, token in tokens.items() if token], holder, ttl_sec
+        )
+        return {lock_key: token if mysql_tokens.get(lock_key) else 0 for lock_key, token in tokens.items()}
+
+    def unlock(self, lock_key: str, holder: str) -> bool:
+        mysql_unlocked = self.mysql_lock.unlock(lock_key, holder)
+        return self.redis_lock.unlock(lock_key, holder) or mysql_unlocked
+
+
+class DtsDistributeLock(object):
+    """DTS 分布式锁入口，存储由 DTS_DISTRIBUTE_LOCK_BACKEND 决定，存储异常时一律视为未持有锁"""
+
+    backends = {"redis": RedisDtsLock, "mysql": MysqlDtsLock, "dual": DualDtsLock}
+
+    def __init__(self, backend=None):
+        self.backend = backend or self.backends[env.DTS_DISTRIBUTE_LOCK_BACKEND]()
+
+    def trylock(self, lock_key: str, holder: str, ttl_sec: int = DTS_LOCK_DEFAULT_TTL_SEC) -> int:
+        """加锁，成功返回 fencing token，失败返回 0"""
+        try:
+            return self.backend.trylock(lock_key, holder, ttl_sec or DTS_LOCK_DEFAULT_TTL_SEC)
+        except RedisError as err:
+            logger.warning("dts distribute trylock %s failed, error: %s", lock_key, err)
+            return 0
+
+    def renew(self, lock_keys: List[str], holder: str, ttl_sec: int = DTS_LOCK_DEFAULT_TTL_SEC) -> Dict[str, int]:
+        """批量续约，返回 {lock_key: fencing token}，已丢失的锁 token 为 0"""
+        try:
+            return self.backend.renew(lock_keys, holder, ttl_sec or DTS_LOCK_DEFAULT_TTL_SEC)
+        except RedisError as err:
+            logger.warning("dts distribute renew %s failed, error: %s", lock_keys, err)
+            return {lock_key: 0 for lock_key in lock_keys}
+
+    def unlock(self, lock_key: str, holder: str) -> bool:
+        try:
+            return self.backend.unlock(lock_key, holder)
+        except RedisError as err:
+            logger.warning("dts distribute unlock %s failed, error: %s", lock_key, err)
+            return False
+
+
+dts_distribute_lock = DtsDistributeLock()
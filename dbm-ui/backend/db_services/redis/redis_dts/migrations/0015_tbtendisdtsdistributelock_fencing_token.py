@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("redis_dts", "0014_tbtendisdtstask_tb_tendis_d_bk_clou_49fdd5_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tbtendisdtsdistributelock",
+            name="fencing_token",
+            field=models.BigIntegerField(default=0, verbose_name="当前租约的fencing token"),
+        ),
+    ]
@@ -18,6 +18,7 @@ class TbTendisDtsDistributeLock(models.Model):
     holder = models.CharField(max_length=128, verbose_name=_("锁的持有者"))
     creation_time = models.DateTimeField(auto_now_add=True, verbose_name=_("创建时间"))
     lock_expire_time = models.DateTimeField(auto_now=False, verbose_name=_("锁的过期时间"))
+    fencing_token = models.BigIntegerField(default=0, verbose_name=_("当前租约的fencing token"))
 
     class Meta:
         db_table = "tb_tendis_dts_distribute_lock"
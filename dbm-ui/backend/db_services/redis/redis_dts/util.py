@@ -14,9 +14,9 @@ import base64
 import logging.config
 import re
 import traceback
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.utils.translation import ugettext as _
 
 from backend.components import DRSApi
@@ -38,12 +38,24 @@ from backend.flow.utils.base.payload_handler import PayloadHandler
 from backend.flow.utils.redis.redis_cluster_nodes import get_masters_with_slots
 from backend.flow.utils.redis.redis_context_dataclass import ActKwargs
 from backend.flow.utils.redis.redis_proxy_util import decode_twemproxy_backends
+from backend.utils.batch_request import request_multi_thread
 from backend.utils.time import datetime2str
 
 from .models import TendisDtsServer
 
 logger = logging.getLogger("flow")
 
+# 单次 DRS rpc 请求的最大实例数，超过后分片并发请求
+DRS_RPC_CHUNK_SIZE = 50
+# 单个分片请求的超时时间(秒)
+DRS_RPC_CHUNK_TIMEOUT = 60
+
+# 各类型实例计算数据量时需要的 info 字段
+REDIS_DATA_SIZE_INFO_FIELDS = {"used_memory"}
+TENDISPLUS_DATA_SIZE_INFO_FIELDS = {"rocksdb.total-sst-files-size"}
+TENDISSSD_LEVEL_INFO_REGEX = re.compile(r"^level-\d+$")
+TENDISSSD_LEVEL_DATA_REGEX = re.compile(r"^bytes=(\d+),num_entries=(\d+),num_deletions=(\d+)")
+
 
 def get_safe_regex_pattern(key_regex):
     """
@@ -156,6 +168,46 @@ def get_cluster_info_by_id(
         raise Exception(f"get cluster info by id failed {e}, cluster_id: {cluster_id}")
 
 
+def chunked_drs_rpc(
+    addresses: List[str],
+    password: str,
+    command: str,
+    bk_cloud_id: int,
+    rpc: Callable = DRSApi.redis_rpc,
+    chunk_size: int = DRS_RPC_CHUNK_SIZE,
+    timeout: int = DRS_RPC_CHUNK_TIMEOUT,
+) -> List[Dict]:
+    """
+    将实例地址分片后并发执行 DRS rpc，按地址顺序合并各分片的结果，耗时取决于最慢的分片而非实例总数
+    @param addresses: 实例地址列表
+    @param password: 实例密码
+    @param command: 执行的命令
+    @param bk_cloud_id: 云区域ID
+    @param rpc: DRSApi.redis_rpc 或 DRSApi.twemproxy_rpc
+    @param chunk_size: 单个分片的最大实例数
+    @param timeout: 单个分片请求的超时时间
+    """
+
+    def _rpc(chunk_addresses: List[str]) -> List[Dict]:
+        payload = {
+            "addresses": chunk_addresses,
+            "db_num": 0,
+            "password": password,
+            "command": command,
+            "bk_cloud_id": bk_cloud_id,
+        }
+        return rpc(payload, timeout=timeout)
+
+    if len(addresses) <= chunk_size:
+        return _rpc(addresses)
+
+    params_list = [{"chunk_addresses": addresses[i : i + chunk_size]} for i in range(0, len(addresses), chunk_size)]
+    results = []
+    for chunk_result in request_multi_thread(_rpc, params_list, get_data=lambda x: x[1], in_order=True):
+        results.extend(chunk_result)
+    return results
+
+
 def common_cluster_precheck(bk_biz_id: int, cluster_id: int):
     try:
         cluster = Cluster.objects.get(id=cluster_id)
@@ -177,29 +229,13 @@ def common_cluster_precheck(bk_biz_id: int, cluster_id: int):
     cluster_info = get_cluster_info_by_id(bk_biz_id=bk_biz_id, cluster_id=cluster_id)
     proxy_addrs = [r.ip_port for r in cluster.proxyinstance_set.all()]
     try:
-        DRSApi.redis_rpc(
-            {
-                "addresses": proxy_addrs,
-                "db_num": 0,
-                "password": cluster_info["cluster_password"],
-                "command": "ping",
-                "bk_cloud_id": cluster_info["bk_cloud_id"],
-            }
-        )
+        chunked_drs_rpc(proxy_addrs, cluster_info["cluster_password"], "ping", cluster_info["bk_cloud_id"])
     except Exception:
         raise Exception(_("redis集群:{} proxy:{} ping失败").format(cluster.immute_domain, proxy_addrs))
 
     redis_addrs = [r.ip_port for r in cluster.storageinstance_set.all()]
     try:
-        DRSApi.redis_rpc(
-            {
-                "addresses": redis_addrs,
-                "db_num": 0,
-                "password": cluster_info["redis_password"],
-                "command": "ping",
-                "bk_cloud_id": cluster_info["bk_cloud_id"],
-            }
-        )
+        chunked_drs_rpc(redis_addrs, cluster_info["redis_password"], "ping", cluster_info["bk_cloud_id"])
     except Exception:
         raise Exception(_("redis集群:{} redis:{} ping失败").format(cluster.immute_domain, redis_addrs))
     master_insts = cluster.storageinstance_set.filter(instance_role=InstanceRole.REDIS_MASTER.value)
@@ -401,7 +437,8 @@ def get_user_built_cluster_masters_data(
                 "password": password,
                 "command": "cluster nodes",
                 "bk_cloud_id": bk_cloud_id,
-            }
+            },
+            timeout=DRS_RPC_CHUNK_TIMEOUT,
         )
         masters_with_slots = get_masters_with_slots(resp[0]["result"])
         if len(masters_with_slots) == 0:
@@ -433,21 +470,29 @@ def get_user_built_cluster_masters_data(
     return master_instances, master_hosts
 
 
-def decode_info_cmd(info_str: str) -> Dict:
-    info_ret: Dict[str, dict] = {}
-    info_list: List = info_str.split("\n")
-    for info_item in info_list:
-        info_item = info_item.strip()
-        if info_item.startswith("#"):
+def decode_info_cmd(info_str: str, fields: Optional[Set[str]] = None, field_regex: re.Pattern = None) -> Dict:
+    """
+    解析 info 命令的输出
+    @param info_str: info 命令的输出
+    @param fields: 只提取的字段，与 field_regex 都为空时提取全部字段
+    @param field_regex: 只提取匹配该正则的字段
+    """
+    selective = fields is not None or field_regex is not None
+    fields = fields or set()
+    info_ret: Dict[str, str] = {}
+    for info_item in info_str.split("\n"):
+        key, divider, value = info_item.partition(IP_PORT_DIVIDER)
+        if not divider:
             continue
-        if len(info_item) == 0:
+        key = key.strip()
+        if not key or key.startswith("#"):
             continue
-        tmp_list = info_item.split(IP_PORT_DIVIDER, 1)
-        if len(tmp_list) < 2:
+        if selective and key not in fields and not (field_regex and field_regex.match(key)):
             continue
-        tmp_list[0] = tmp_list[0].strip()
-        tmp_list[1] = tmp_list[1].strip()
-        info_ret[tmp_list[0]] = tmp_list[1]
+        info_ret[key] = value.strip()
+        # 只需要固定字段时，全部找到后不再继续解析
+        if not field_regex and selective and len(info_ret) == len(fields):
+            break
     return info_ret
 
 
@@ -463,38 +508,28 @@ def get_redis_slaves_data_size(cluster_data: dict) -> list:
     elif is_tendisssd_instance_type(cluster_data["cluster_type"]):
         info_cmd = "info"
     slave_addrs = [slave["ip"] + IP_PORT_DIVIDER + str(slave["port"]) for slave in cluster_data["slave_instances"]]
-    resp = DRSApi.redis_rpc(
-        {
-            "addresses": slave_addrs,
-            "db_num": 0,
-            "password": cluster_data["redis_password"],
-            "command": info_cmd,
-            "bk_cloud_id": cluster_data["bk_cloud_id"],
-        }
-    )
-    info_ret: Dict[str, Dict] = {}
-    for item in resp:
-        info_ret[item["address"]] = decode_info_cmd(item["result"])
+    resp = chunked_drs_rpc(slave_addrs, cluster_data["redis_password"], info_cmd, cluster_data["bk_cloud_id"])
+    info_results: Dict[str, str] = {item["address"]: item["result"] for item in resp}
     new_slave_instances: List = []
     for slave in cluster_data["slave_instances"]:
         slave_addr = slave["ip"] + IP_PORT_DIVIDER + str(slave["port"])
         if slave["db_type"] == ClusterType.TendisRedisInstance.value:
-            slave["data_size"] = int(info_ret[slave_addr]["used_memory"])
+            info_ret = decode_info_cmd(info_results[slave_addr], fields=REDIS_DATA_SIZE_INFO_FIELDS)
+            slave["data_size"] = int(info_ret["used_memory"])
         elif slave["db_type"] == ClusterType.TendisTendisplusInsance.value:
-            slave["data_size"] = int(info_ret[slave_addr]["rocksdb.total-sst-files-size"])
+            info_ret = decode_info_cmd(info_results[slave_addr], fields=TENDISPLUS_DATA_SIZE_INFO_FIELDS)
+            slave["data_size"] = int(info_ret["rocksdb.total-sst-files-size"])
         elif slave["db_type"] == ClusterType.TendisTendisSSDInstance.value:
             rockdb_size = 0
-            level_head_reg = re.compile(r"^level-\d+$")
-            level_data_reg = re.compile(r"^bytes=(\d+),num_entries=(\d+),num_deletions=(\d+)")
-            for k, v in info_ret[slave_addr].items():
-                if level_head_reg.match(k):
-                    tmp_list = level_data_reg.findall(v)
-                    if len(tmp_list) != 1:
-                        err = f"redis:{slave_addr} info 'RocksDB Level stats' format not correct,{k}:{v}"
-                        logging.error(err)
-                        raise Exception(err)
-                    size01 = int(tmp_list[0][0])
-                    rockdb_size += size01
+            info_ret = decode_info_cmd(info_results[slave_addr], field_regex=TENDISSSD_LEVEL_INFO_REGEX)
+            for k, v in info_ret.items():
+                tmp_list = TENDISSSD_LEVEL_DATA_REGEX.findall(v)
+                if len(tmp_list) != 1:
+                    err = f"redis:{slave_addr} info 'RocksDB Level stats' format not correct,{k}:{v}"
+                    logging.error(err)
+                    raise Exception(err)
+                size01 = int(tmp_list[0][0])
+                rockdb_size += size01
             slave["data_size"] = rockdb_size
         new_slave_instances.append(slave)
     return new_slave_instances
@@ -742,16 +777,12 @@ def is_in_full_transfer(row: TbTendisDtsTask) -> bool:
     判断是否全量传输中
     """
     if row.src_dbtype == ClusterType.TendisTendisSSDInstance:
-        if (
-            row.task_type
-            in [
-                DtsTaskType.TENDISSSD_BACKUP,
-                DtsTaskType.TENDISSSD_BACKUPFILE_FETCH,
-                DtsTaskType.TENDISSSD_TREDISDUMP,
-                DtsTaskType.TENDISSSD_CMDSIMPOTER,
-            ]
-            and row.status in [0, 1]
-        ):
+        if row.task_type in [
+            DtsTaskType.TENDISSSD_BACKUP,
+            DtsTaskType.TENDISSSD_BACKUPFILE_FETCH,
+            DtsTaskType.TENDISSSD_TREDISDUMP,
+            DtsTaskType.TENDISSSD_CMDSIMPOTER,
+        ] and row.status in [0, 1]:
             return True
     if row.src_dbtype == ClusterType.TendisRedisInstance:
         if row.task_type == DtsTaskType.MAKE_CACHE_SYNC and "rdb" in row.message and row.status in [0, 1]:
@@ -878,67 +909,141 @@ def dts_task_status(task_row: TbTendisDtsTask) -> str:
     return DtsSyncStatus.UNKNOWN.value
 
 
-def dts_job_cnt_and_status(job: TbTendisDTSJob) -> dict:
-    """
-    获取job 任务状态
-    """
-    ret = {}
-    pending_exec_cnt = 0
-    running_cnt = 0
-    failed_cnt = 0
-    success_cnt = 0
-    transfer_completed_cnt = 0
-    transfer_terminated_cnt = 0
-    full_transfer_failed_cnt = 0
-    incremental_sync_failed_cnt = 0
-    full_transfer_running_cnt = 0
-    incremental_sync_running_cnt = 0
-    tasks = TbTendisDtsTask.objects.filter(
-        Q(bill_id=job.bill_id) & Q(src_cluster=job.src_cluster) & Q(dst_cluster=job.dst_cluster)
-    )
-    for task in tasks:
-        if is_pending_execution(task):
-            pending_exec_cnt += 1
-        elif task.task_type == DtsTaskType.TENDISSSD_BACKUP.value and task.status == 0:
-            pending_exec_cnt += 1
-        elif task.task_type == DtsTaskType.TENDISSSD_BACKUP.value and task.status == 1:
-            running_cnt += 1
-        elif task.task_type != DtsTaskType.TENDISSSD_BACKUP.value and (task.status == 0 or task.status == 1):
-            running_cnt += 1
-        elif task.status == -1:
-            failed_cnt += 1
-        elif task.status == 2:
-            success_cnt += 1
-
-        if is_transfer_competed(task):
-            transfer_completed_cnt += 1
-        elif is_transfer_terminated(task):
-            transfer_terminated_cnt += 1
-        elif is_full_transfer_failed(task):
-            full_transfer_failed_cnt += 1
-        elif is_incremental_sync_failed(task):
-            incremental_sync_failed_cnt += 1
-        elif is_in_full_transfer(task):
-            full_transfer_running_cnt += 1
-        elif is_in_incremental_sync(task):
-            incremental_sync_running_cnt += 1
-    ret["total_cnt"] = len(tasks)
-    ret["pending_exec_cnt"] = pending_exec_cnt
-    ret["running_cnt"] = running_cnt
-    ret["failed_cnt"] = failed_cnt
-    ret["success_cnt"] = success_cnt
-    if pending_exec_cnt == len(tasks):
+SSD_FULL_TRANSFER_TASK_TYPES = [
+    DtsTaskType.TENDISSSD_BACKUP.value,
+    DtsTaskType.TENDISSSD_BACKUPFILE_FETCH.value,
+    DtsTaskType.TENDISSSD_TREDISDUMP.value,
+    DtsTaskType.TENDISSSD_CMDSIMPOTER.value,
+]
+SSD_INCREMENTAL_SYNC_TASK_TYPES = [DtsTaskType.TENDISSSD_MAKESYNC.value, DtsTaskType.TENDISSSD_WATCHOLDSYNC.value]
+
+TENDISPLUS_FULL_TRANSFER_TASK_TYPES = [DtsTaskType.TENDISPLUS_MAKESYNC.value, DtsTaskType.TENDISPLUS_SENDBULK.value]
+TENDISPLUS_INCREMENTAL_SYNC_TASK_TYPES = [DtsTaskType.TENDISPLUS_SENDINCR.value]
+
+
+def _src_dbtype_task_q(dbtype_task_types: Dict[str, List[str]], **kwargs) -> Q:
+    """源实例类型及其对应的task类型组合的过滤条件"""
+    task_q = Q()
+    for src_dbtype, task_types in dbtype_task_types.items():
+        task_q |= Q(src_dbtype=src_dbtype, task_type__in=task_types, **kwargs)
+    return task_q
+
+
+FULL_TRANSFER_TASK_TYPES = {
+    ClusterType.TendisTendisSSDInstance.value: SSD_FULL_TRANSFER_TASK_TYPES,
+    ClusterType.TendisRedisInstance.value: [DtsTaskType.MAKE_CACHE_SYNC.value],
+    ClusterType.TendisTendisplusInsance.value: TENDISPLUS_FULL_TRANSFER_TASK_TYPES,
+}
+INCREMENTAL_SYNC_TASK_TYPES = {
+    ClusterType.TendisTendisSSDInstance.value: SSD_INCREMENTAL_SYNC_TASK_TYPES,
+    ClusterType.TendisRedisInstance.value: [DtsTaskType.MAKE_CACHE_SYNC.value, DtsTaskType.WATCH_CACHE_SYNC.value],
+    ClusterType.TendisTendisplusInsance.value: TENDISPLUS_INCREMENTAL_SYNC_TASK_TYPES,
+}
+INCREMENTAL_SYNC_FAILED_TASK_TYPES = {
+    **INCREMENTAL_SYNC_TASK_TYPES,
+    ClusterType.TendisRedisInstance.value: [DtsTaskType.WATCH_CACHE_SYNC.value],
+}
+
+# 与 is_pending_execution 等逐个task的判断保持一致，按判断顺序排列，每个task只会计入第一个满足的分类
+DTS_TASK_EXEC_CONDITIONS = [
+    ("pending_exec_cnt", Q(task_type="", status=0)),
+    ("pending_exec_cnt", Q(task_type=DtsTaskType.TENDISSSD_BACKUP.value, status=0)),
+    ("running_cnt", Q(task_type=DtsTaskType.TENDISSSD_BACKUP.value, status=1)),
+    ("running_cnt", ~Q(task_type=DtsTaskType.TENDISSSD_BACKUP.value) & Q(status__in=[0, 1])),
+    ("failed_cnt", Q(status=-1)),
+    ("success_cnt", Q(status=2)),
+]
+DTS_TASK_SYNC_CONDITIONS = [
+    ("transfer_completed_cnt", Q(status=2)),
+    ("transfer_terminated_cnt", Q(sync_operate=DtsOperateType.FORCE_KILL_SUCC.value, status__in=[-1, 2])),
+    ("full_transfer_failed_cnt", _src_dbtype_task_q(FULL_TRANSFER_TASK_TYPES, status=-1)),
+    ("incremental_sync_failed_cnt", _src_dbtype_task_q(INCREMENTAL_SYNC_FAILED_TASK_TYPES, status=-1)),
+    (
+        "full_transfer_running_cnt",
+        # redis 实例的全量传输阶段需要通过 message 中是否包含rdb来区分
+        _src_dbtype_task_q(FULL_TRANSFER_TASK_TYPES, status__in=[0, 1])
+        & (~Q(src_dbtype=ClusterType.TendisRedisInstance.value) | Q(message__contains="rdb")),
+    ),
+    ("incremental_sync_running_cnt", _src_dbtype_task_q(INCREMENTAL_SYNC_TASK_TYPES, status__in=[0, 1])),
+]
+
+
+def _exclusive_count_filters(conditions: List[Tuple[str, Q]]) -> Dict[str, Q]:
+    """将有先后顺序的判断条件转换为互斥的过滤条件，同名分类的条件取并集"""
+    filters: Dict[str, Q] = {}
+    previous = None
+    for name, condition in conditions:
+        exclusive = condition if previous is None else condition & ~previous
+        filters[name] = exclusive if name not in filters else filters[name] | exclusive
+        previous = condition if previous is None else previous | condition
+    return filters
+
+
+DTS_TASK_COUNT_FILTERS = {
+    **_exclusive_count_filters(DTS_TASK_EXEC_CONDITIONS),
+    **_exclusive_count_filters(DTS_TASK_SYNC_CONDITIONS),
+}
+
+
+def _dts_job_status(counter: Dict[str, int]) -> dict:
+    """根据task的分类计数获取job状态"""
+    total_cnt = counter["total_cnt"]
+    ret = {
+        "total_cnt": total_cnt,
+        "pending_exec_cnt": counter["pending_exec_cnt"],
+        "running_cnt": counter["running_cnt"],
+        "failed_cnt": counter["failed_cnt"],
+        "success_cnt": counter["success_cnt"],
+    }
+    if counter["pending_exec_cnt"] == total_cnt:
         ret["status"] = DtsSyncStatus.PENDING_EXECUTION.value
-    elif transfer_completed_cnt == len(tasks):
+    elif counter["transfer_completed_cnt"] == total_cnt:
         ret["status"] = DtsSyncStatus.TRANSFER_COMPLETED.value
-    elif transfer_terminated_cnt == len(tasks):
+    elif counter["transfer_terminated_cnt"] == total_cnt:
         ret["status"] = DtsSyncStatus.TRANSFER_TERMINATED.value
-    elif full_transfer_failed_cnt > 0:
+    elif counter["full_transfer_failed_cnt"] > 0:
         ret["status"] = DtsSyncStatus.FULL_TRANSFER_FAILED.value
-    elif incremental_sync_failed_cnt > 0:
+    elif counter["incremental_sync_failed_cnt"] > 0:
         ret["status"] = DtsSyncStatus.INCREMENTAL_SYNC_FAILED.value
-    elif full_transfer_running_cnt > 0:
+    elif counter["full_transfer_running_cnt"] > 0:
         ret["status"] = DtsSyncStatus.IN_FULL_TRANSFER.value
-    elif incremental_sync_running_cnt > 0:
+    elif counter["incremental_sync_running_cnt"] > 0:
         ret["status"] = DtsSyncStatus.IN_INCREMENTAL_SYNC.value
     return ret
+
+
+def dts_jobs_cnt_and_status(jobs: List[TbTendisDTSJob]) -> Dict[Tuple[int, str, str], dict]:
+    """
+    批量获取job 任务状态，所有job的task计数通过一次分组聚合查询得到
+    返回 {(bill_id, src_cluster, dst_cluster): 任务状态}
+    """
+    job_keys = [(job.bill_id, job.src_cluster, job.dst_cluster) for job in jobs]
+    if not job_keys:
+        return {}
+
+    job_filter = Q()
+    for bill_id, src_cluster, dst_cluster in job_keys:
+        job_filter |= Q(bill_id=bill_id, src_cluster=src_cluster, dst_cluster=dst_cluster)
+    counters = (
+        TbTendisDtsTask.objects.filter(job_filter)
+        .values("bill_id", "src_cluster", "dst_cluster")
+        .annotate(
+            total_cnt=Count("id"),
+            **{name: Count("id", filter=count_filter) for name, count_filter in DTS_TASK_COUNT_FILTERS.items()},
+        )
+        .order_by()
+    )
+    key__counter = {
+        (counter["bill_id"], counter["src_cluster"], counter["dst_cluster"]): counter for counter in counters
+    }
+
+    # 没有task的job计数均为0
+    empty_counter = {"total_cnt": 0, **{name: 0 for name in DTS_TASK_COUNT_FILTERS}}
+    return {key: _dts_job_status(key__counter.get(key, empty_counter)) for key in job_keys}
+
+
+def dts_job_cnt_and_status(job: TbTendisDTSJob) -> dict:
+    """
+    获取job 任务状态
+    """
+    return dts_jobs_cnt_and_status([job])[(job.bill_id, job.src_cluster, job.dst_cluster)]
@@ -11,7 +11,9 @@ specific language governing permissions and limitations under the License.
 import logging
 
 from django.http import HttpResponse
+from django.utils import translation
 from django.utils.translation import ugettext as _
+from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
@@ -77,9 +79,17 @@ class TaskFlowViewSet(viewsets.AuditedModelViewSet):
     )
     def retrieve(self, requests, *args, **kwargs):
         root_id = kwargs["root_id"]
-        tree_states = BambooEngine(root_id=root_id).get_pipeline_tree_states()
-
-        flow_info = super().retrieve(requests, *args, **kwargs)
+        # 先校验流程存在和访问权限，再计算状态快照
+        instance = self.get_object()
+        version, tree_states = BambooEngine(root_id=root_id).get_pipeline_tree_states_snapshot()
+        # 流程状态未发生变化时，直接告知客户端复用本地数据
+        etag = f'"{root_id}-{version}-{translation.get_language()}"'
+        if requests.META.get("HTTP_IF_NONE_MATCH") == etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response["ETag"] = etag
+            return response
+
+        flow_info = self.get_serializer(instance).data
         try:
             # 获取当前flow的参数
             details = Flow.objects.get(flow_obj_id=root_id).details["ticket_data"]
@@ -89,15 +99,15 @@ class TaskFlowViewSet(viewsets.AuditedModelViewSet):
             )
             bk_biz_id = details["bk_biz_id"]
             # 如果当前pipeline整在运行中，并且是从资源池拿取的机器，则bk_biz_id设置为DBA_APP_BK_BIZ_ID
-            if flow_info.data["status"] != StateType.FINISHED and details.get("ip_source") == IpSource.RESOURCE_POOL:
+            if flow_info["status"] != StateType.FINISHED and details.get("ip_source") == IpSource.RESOURCE_POOL:
                 bk_biz_id = env.DBA_APP_BK_BIZ_ID
             # 更新flow_info
-            flow_info.data.update(bk_host_ids=bk_host_ids, bk_biz_id=bk_biz_id)
+            flow_info.update(bk_host_ids=bk_host_ids, bk_biz_id=bk_biz_id)
         except Exception:
             # 如果没找到flow或者相关bk_host_id参数，则忽略
             logger.info("can not find related host, root_id: {}".format(root_id))
 
-        return Response({"flow_info": flow_info.data, **tree_states})
+        return Response({"flow_info": flow_info, **tree_states}, headers={"ETag": etag})
 
     @common_swagger_auto_schema(
         operation_summary=_("撤销流程"),
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from backend.db_services.redis.redis_dts.distribute_lock import MysqlDtsLock, RedisDtsLock
+from backend.db_services.redis.redis_dts.models import TbTendisDtsDistributeLock
+
+BENCHMARK_LOCK_KEY_PREFIX = "benchmark"
+
+
+class LegacyDtsLock(object):
+    """改造前的加锁方式：先 INSERT，唯一键冲突后再依次尝试重入和接管过期锁"""
+
+    def trylock(self, lock_key: str, holder: str, ttl_sec: int) -> int:
+        now = timezone.now()
+        expire_time = now + timedelta(seconds=ttl_sec)
+        try:
+            with transaction.atomic():
+                TbTendisDtsDistributeLock.objects.create(
+                    lock_key=lock_key, holder=holder, creation_time=now, lock_expire_time=expire_time
+                )
+            return 1
+        except IntegrityError:
+            pass
+        with transaction.atomic():
+            if TbTendisDtsDistributeLock.objects.filter(
+                lock_key=lock_key, holder=holder, lock_expire_time__gt=now
+            ).update(lock_expire_time=expire_time):
+                return 1
+        with transaction.atomic():
+            return TbTendisDtsDistributeLock.objects.filter(lock_key=lock_key, lock_expire_time__lt=now).update(
+                holder=holder, lock_expire_time=expire_time
+            )
+
+    def renew(self, lock_keys, holder: str, ttl_sec: int):
+        # 改造前没有批量续约，每个锁单独 trylock
+        return {lock_key: self.trylock(lock_key, holder, ttl_sec) for lock_key in lock_keys}
+
+    def unlock(self, lock_key: str, holder: str) -> bool:
+        deleted, __ = TbTendisDtsDistributeLock.objects.filter(lock_key=lock_key, holder=holder).delete()
+        return bool(deleted)
+
+
+class Command(BaseCommand):
+    help = "benchmark dts distribute lock throughput with many dts servers."
+
+    backends = {"redis": RedisDtsLock, "mysql": MysqlDtsLock, "legacy": LegacyDtsLock}
+
+    def add_arguments(self, parser):
+        parser.add_argument("--servers", type=int, default=50, help="模拟的 dts server 数量")
+        parser.add_argument("--keys", type=int, default=200, help="竞争的锁数量")
+        parser.add_argument("--duration", type=int, default=10, help="每个后端的压测时间(秒)")
+        parser.add_argument("--ttl", type=int, default=30, help="锁ttl时间(秒)")
+        parser.add_argument("--backend", choices=[*self.backends, "all"], default="all")
+
+    def run_server(self, lock, server_idx: int, lock_keys, ttl_sec: int, deadline: float, results):
+        """模拟 dts server 的调度周期：续约已持有的锁，尝试获取新锁，完成后释放"""
+        holder = f"{BENCHMARK_LOCK_KEY_PREFIX}-server-{server_idx}"
+        held, ops, acquired, errors = [], 0, 0, 0
+        offset = server_idx
+        while time.time() < deadline:
+            try:
+                if held:
+                    held = [lock_key for lock_key, token in lock.renew(held, holder, ttl_sec).items() if token]
+                    ops += 1
+                lock_key = lock_keys[offset % len(lock_keys)]
+                offset += 1
+                ops += 1
+                if lock.trylock(lock_key, holder, ttl_sec):
+                    acquired += 1
+                    held.append(lock_key)
+                # 每个 server 最多同时持有 3 个锁，多余的视为任务完成后释放
+                if len(held) > 3:
+                    lock.unlock(held.pop(0), holder)
+                    ops += 1
+            except Exception:  # pylint: disable=broad-except
+                errors += 1
+        for lock_key in held:
+            lock.unlock(lock_key, holder)
+        results.append({"ops": ops, "acquired": acquired, "errors": errors})
+
+    def benchmark(self, backend: str, servers: int, keys: int, duration: int, ttl_sec: int):
+        lock = self.backends[backend]()
+        lock_keys = [f"{BENCHMARK_LOCK_KEY_PREFIX}:{backend}:{idx}" for idx in range(keys)]
+        results = []
+        deadline = time.time() + duration
+        threads = [
+            threading.Thread(target=self.run_server, args=(lock, idx, lock_keys, ttl_sec, deadline, results))
+            for idx in range(servers)
+        ]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+        TbTendisDtsDistributeLock.objects.filter(lock_key__startswith=f"{BENCHMARK_LOCK_KEY_PREFIX}:").delete()
+
+        stats = defaultdict(int)
+        for result in results:
+            for metric, count in result.items():
+                stats[metric] += count
+
+        self.stdout.write(
+            f"[{backend}] servers={servers} keys={keys} elapsed={elapsed:.2f}s "
+            f"ops={stats['ops']} ops/s={stats['ops'] / elapsed:.1f} "
+            f"acquired={stats['acquired']} errors={stats['errors']}"
+        )
+
+    def handle(self, *args, **options):
+        backends = list(self.backends) if options["backend"] == "all" else [options["backend"]]
+        for backend in backends:
+            self.benchmark(backend, options["servers"], options["keys"], options["duration"], options["ttl"])
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import copy
+import time
+
+from bamboo_engine import builder
+from bamboo_engine.builder import Data, EmptyEndEvent, EmptyStartEvent, ServiceActivity, Var
+from django.core.management.base import BaseCommand
+
+from backend.flow.utils.pipeline_tree import PIPELINE_SENSITIVE_KEYS, insensitive_pipeline_tree
+
+
+def legacy_hide_sensitive_data(copy_data):
+    """改造前的脱敏方式：在深拷贝后的流程树上删除 inputs"""
+    for key, value in list(copy_data.items()):
+        if key in PIPELINE_SENSITIVE_KEYS:
+            copy_data.pop(key)
+            continue
+        if isinstance(value, dict):
+            legacy_hide_sensitive_data(value)
+    return copy_data
+
+
+class Command(BaseCommand):
+    help = "benchmark insensitive pipeline tree serialization on a synthetic flow."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--nodes", type=int, default=5000, help="流程的活动节点数量")
+        parser.add_argument("--kwargs-size", type=int, default=200, help="每个节点 kwargs 中的实例数量")
+        parser.add_argument("--rounds", type=int, default=3, help="重复次数，取平均耗时")
+
+    @staticmethod
+    def build_synthetic_pipeline(nodes: int, kwargs_size: int) -> dict:
+        global_data = Data()
+        global_data.inputs["${global_data}"] = Var(
+            type=Var.PLAIN, value={"uid": 1, "infos": [{"ip": f"127.0.0.{i % 255}"} for i in range(kwargs_size)]}
+        )
+        start = EmptyStartEvent()
+        pipe = start
+        for idx in range(nodes):
+            act = ServiceActivity(name=f"act-{idx}", component_code="benchmark")
+            act.component.inputs.kwargs = Var(
+                type=Var.PLAIN,
+                value={"instances": [{"ip": f"127.0.0.{i % 255}", "port": 30000 + i} for i in range(kwargs_size)]},
+            )
+            act.component.inputs.global_data = Var(type=Var.SPLICE, value="${global_data}")
+            pipe = pipe.extend(act)
+        pipe.extend(EmptyEndEvent())
+        return builder.build_tree(start, data=global_data)
+
+    def handle(self, *args, **options):
+        pipeline = self.build_synthetic_pipeline(options["nodes"], options["kwargs_size"])
+        rounds = options["rounds"]
+
+        start = time.perf_counter()
+        for __ in range(rounds):
+            legacy_tree = legacy_hide_sensitive_data(copy.deepcopy(pipeline))
+        legacy_cost = (time.perf_counter() - start) / rounds
+
+        start = time.perf_counter()
+        for __ in range(rounds):
+            projected_tree = insensitive_pipeline_tree(pipeline)
+        projection_cost = (time.perf_counter() - start) / rounds
+
+        if legacy_tree != projected_tree:
+            self.stderr.write("projected tree is different from the legacy one")
+            return
+        self.stdout.write(
+            f"nodes={options['nodes']} kwargs_size={options['kwargs_size']} "
+            f"deepcopy+strip={legacy_cost:.3f}s projection={projection_cost:.3f}s "
+            f"speedup={legacy_cost / max(projection_cost, 1e-9):.1f}x"
+        )
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from backend.ticket.constants import EXCLUSIVE_TICKET_EXCEL_PATH, EXCLUSIVE_TICKET_MATRIX_PATH
+from backend.ticket.exclusive_matrix import compile_exclusive_ticket_matrix
+
+
+class Command(BaseCommand):
+    help = "compile exclusive_ticket.xlsx into the exclusive ticket matrix json."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--excel", default=EXCLUSIVE_TICKET_EXCEL_PATH, help="互斥矩阵 excel 路径")
+        parser.add_argument("--output", default=EXCLUSIVE_TICKET_MATRIX_PATH, help="编译结果路径")
+
+    def handle(self, *args, **options):
+        exclusive_map = compile_exclusive_ticket_matrix(options["excel"])
+        with open(options["output"], "w", encoding="utf-8") as f:
+            json.dump(exclusive_map, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        self.stdout.write(
+            f"compiled {len(exclusive_map)} ticket types, "
+            f"{sum(len(types) for types in exclusive_map.values())} exclusive pairs into {options['output']}"
+        )
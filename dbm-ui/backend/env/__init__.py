@@ -30,6 +30,9 @@ REDIS_PASSWORD = get_type_env(key="REDIS_PASSWORD", _type=str, default="")
 REDIS_URL = f"redis://{f':{REDIS_PASSWORD}@' if REDIS_PASSWORD else ''}{REDIS_HOST}:{REDIS_PORT}/1"
 
 BROKER_URL = get_type_env(key="BROKER_URL", default=REDIS_URL, _type=str)
+
+# DTS 分布式锁的存储：mysql/dual/redis，切换到 redis 需要先全部切换到 dual，再全部切换到 redis
+DTS_DISTRIBUTE_LOCK_BACKEND = get_type_env(key="DTS_DISTRIBUTE_LOCK_BACKEND", _type=str, default="mysql")
 SESSION_COOKIE_DOMAIN = get_type_env(key="SESSION_COOKIE_DOMAIN", default="", _type=str)
 
 # CC业务模型中的英文业务简称
@@ -8,19 +8,28 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import copy
 import logging
-from typing import Any, Dict, List, Optional
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
 
 from bamboo_engine import api, builder, states
 from bamboo_engine.api import EngineAPIResult
 from bamboo_engine.builder import Data
+from django.core.cache import cache
+from django.utils import translation
 from django.utils.translation import ugettext as _
 from pipeline.eri.runtime import BambooDjangoRuntime
 
 from backend.flow.engine.bamboo.builder import Builder
 from backend.flow.engine.exceptions import PipelineError
 from backend.flow.models import FlowNode, FlowTree, StateType
+from backend.flow.utils.flow_payload import resolve_payload_refs
+from backend.flow.utils.pipeline_snapshot import (
+    PIPELINE_TREE_STATES_SNAPSHOT_CACHE_TIME,
+    PIPELINE_TREE_STATES_SNAPSHOT_KEY,
+    get_tree_states_version,
+)
+from backend.flow.utils.pipeline_tree import insensitive_pipeline_tree
 from backend.utils.string import i18n_str
 from backend.utils.time import datetime2timestamp
 
@@ -44,8 +53,7 @@ class BambooEngine:
         if not start:
             return None
         pipeline = builder.build_tree(start_elem=start, id=self.root_id, data=pipeline_data)
-        pipeline_copy = copy.deepcopy(pipeline)
-        insensitive_data = self.hide_sensitive_data(pipeline_copy)
+        insensitive_data = insensitive_pipeline_tree(pipeline)
         # 考虑到有些任务没有单据关联，因此uid一般为root_id，此时创建FlowTree的时候uid应该为null
         uid = self.data.get("uid") if isinstance(self.data.get("uid"), int) else None
         tree = FlowTree.objects.create(
@@ -94,6 +102,8 @@ class BambooEngine:
 
     def get_node_input_data(self, node_id: str) -> EngineAPIResult:
         result = api.get_execution_data_inputs(runtime=BambooDjangoRuntime(), node_id=node_id)
+        if result.result and result.data:
+            result.data.update(resolve_payload_refs(result.data))
         return result
 
     def get_node_histories(self, node_id: str) -> EngineAPIResult:
@@ -134,100 +144,102 @@ class BambooEngine:
                 elif StateType.SUSPENDED in child_status:
                     status_tree["state"] = StateType.SUSPENDED
 
-    def hide_sensitive_data(self, copy_data: Dict):
-        """隐藏pipeline中敏感数据"""
-        for key, value in list(copy_data.items()):
-            if key == "inputs":
-                copy_data.pop(key)
-                continue
-            if type(value) == dict:
-                self.hide_sensitive_data(value)
-        return copy_data
-
-    def get_subprocess_state(self, children: Dict, children_status: List):
-        """获取指定子流程结点状态"""
-        for key, __ in children.items():
-            children_status.append(children[key]["state"])
-
-    def recursion_subprocess_status(self, activities: Dict, node_maps: Dict):
-        """为子流程添加状态"""
-        raw_data = copy.deepcopy(activities)
-        for node_id, activity in raw_data.items():
-            for key, value in activity.items():
-                if value == "SubProcess":
-                    children_status_list = []
-                    children_states = self.get_children_states(node_id=node_id).data
-                    try:
-                        children = children_states[node_id]["children"]
-                        self.get_subprocess_state(children, children_status_list)
-                        status = children_states[node_id]["state"]
-                        if status == states.RUNNING and states.FAILED in children_status_list:
-                            status = states.FAILED
-                        elif status == states.RUNNING and states.REVOKED in children_status_list:
-                            status = states.REVOKED
-                    except KeyError:
-                        status = states.CREATED
-
-                    act_status = []
-                    self.recursion_subprocess_activity_status(
-                        self.root_id, activity["pipeline"]["activities"], act_status, node_maps
-                    )
-                    if states.FAILED in act_status:
-                        status = states.FAILED
-                    elif states.REVOKED in act_status:
-                        status = states.REVOKED
-
-                    activities[node_id]["status"] = status
-                elif key == "pipeline":
-                    self.recursion_subprocess_status(activities[node_id]["pipeline"]["activities"], node_maps)
-
-    def recursion_nodes_status(self, node: FlowNode, status: str, raw_data: Dict):
-        for key, values in raw_data.items():
-            if key == node.node_id:
-                raw_data[key]["status"] = status
-                raw_data[key]["created_at"] = datetime2timestamp(node.created_at)
-                raw_data[key]["started_at"] = datetime2timestamp(node.started_at)
-                raw_data[key]["updated_at"] = datetime2timestamp(node.updated_at)
-                raw_data[key]["hosts"] = node.hosts
+    def get_subprocess_status(self, node_id: str, act_status: List[str], state_index: Dict, children_index: Dict):
+        """
+        获取子流程结点状态
+        :param node_id: 子流程节点ID
+        :param act_status: 子流程下所有任务节点的状态
+        :param state_index: 引擎节点状态索引 node_id -> state
+        :param children_index: 引擎子节点状态索引 parent_id -> [state]
+        """
+        if node_id not in state_index:
+            status = states.CREATED
+        else:
+            status = state_index[node_id].name
+            children_status_list = [child.name for child in children_index.get(node_id, [])]
+            if status == states.RUNNING and states.FAILED in children_status_list:
+                status = states.FAILED
+            elif status == states.RUNNING and states.REVOKED in children_status_list:
+                status = states.REVOKED
+
+        if states.FAILED in act_status:
+            status = states.FAILED
+        elif states.REVOKED in act_status:
+            status = states.REVOKED
+        return status
+
+    def render_activities_status(
+        self, activities: Dict, node_maps: Dict, state_index: Dict, children_index: Dict
+    ) -> List[str]:
+        """
+        自底向上为子流程添加状态，并翻译节点名称
+        :return: 当前层级及其子流程下所有任务节点的状态
+        """
+        act_status = []
+        for node_id, activity in activities.items():
+            activity["name"] = i18n_str(activity["name"])
+            if activity.get("type") == "ServiceActivity":
+                act_status.append(node_maps.get(node_id))
+            elif activity.get("type") == "SubProcess":
+                sub_act_status = self.render_activities_status(
+                    activity["pipeline"]["activities"], node_maps, state_index, children_index
+                )
+                activity["status"] = self.get_subprocess_status(node_id, sub_act_status, state_index, children_index)
+                act_status.extend(sub_act_status)
+        return act_status
+
+    def render_nodes_status(self, raw_data: Dict, nodes: Dict[str, FlowNode]):
+        """为流程树中的节点添加状态和时间信息"""
+        for key, value in raw_data.items():
+            if not isinstance(value, dict):
                 continue
 
-            if isinstance(values, dict):
-                self.recursion_nodes_status(node, status, values)
+            if key in nodes:
+                node = nodes[key]
+                value["status"] = node.status
+                value["created_at"] = datetime2timestamp(node.created_at)
+                value["started_at"] = datetime2timestamp(node.started_at)
+                value["updated_at"] = datetime2timestamp(node.updated_at)
+                value["hosts"] = node.hosts
 
-    def recursion_subprocess_activity_status(self, root_id: str, activities: Dict, act_status: List, node_maps: Dict):
-        for node_id, activity in activities.items():
-            for key, value in activity.items():
-                if key == "type" and value == "SubProcess":
-                    self.recursion_subprocess_activity_status(
-                        root_id, activity["pipeline"]["activities"], act_status, node_maps
-                    )
-                elif key == "type" and value == "ServiceActivity":
-                    status = node_maps[node_id]
-                    act_status.append(status)
-
-    def recursion_translate_activity(self, activities: Dict):
-        """递归翻译节点名称"""
-        for activity in activities.values():
-            activity["name"] = i18n_str(activity["name"])
-            if "pipeline" in activity:
-                self.recursion_translate_activity(activity["pipeline"]["activities"])
+            self.render_nodes_status(value, nodes)
 
     def get_pipeline_tree_states(self) -> Optional[Dict]:
-        """获取流程数据包括状态"""
+        """获取流程数据包括状态，节点状态和引擎状态均一次查出后建立索引，流程树只遍历一次"""
         tree = self.get_pipeline_tree()
         if not tree:
             return None
-        activities = tree["activities"]
-        node_maps = {}
-        nodes = FlowNode.objects.filter(root_id=self.root_id)
-        for node in nodes:
-            node_maps[node.node_id] = node.status
-        self.recursion_subprocess_status(activities, node_maps)
-        self.recursion_translate_activity(activities)
-        for node in nodes:
-            self.recursion_nodes_status(node, node.status, tree)
+
+        nodes = {node.node_id: node for node in FlowNode.objects.filter(root_id=self.root_id)}
+        node_maps = {node_id: node.status for node_id, node in nodes.items()}
+
+        state_index, children_index = {}, defaultdict(list)
+        for state in self.runtime.get_state_by_root(self.root_id):
+            state_index[state.node_id] = state
+            children_index[state.parent_id].append(state)
+
+        self.render_activities_status(tree["activities"], node_maps, state_index, children_index)
+        self.render_nodes_status(tree, nodes)
         return tree
 
+    def get_pipeline_tree_states_snapshot(self) -> Tuple[int, Optional[Dict]]:
+        """
+        获取流程数据快照，返回(版本号, 流程数据)
+        版本号在节点状态变更时递增，版本号未变化时直接复用缓存的快照，避免轮询时每次都重新计算整棵流程树
+        """
+        version = get_tree_states_version(self.root_id)
+        snapshot_key = PIPELINE_TREE_STATES_SNAPSHOT_KEY.format(
+            root_id=self.root_id, language=translation.get_language()
+        )
+        snapshot = cache.get(snapshot_key)
+        if snapshot and snapshot["version"] == version:
+            return version, snapshot["tree"]
+
+        tree = self.get_pipeline_tree_states()
+        if tree is not None:
+            cache.set(snapshot_key, {"version": version, "tree": tree}, PIPELINE_TREE_STATES_SNAPSHOT_CACHE_TIME)
+        return version, tree
+
     def get_pipeline_tree(self) -> Optional[Dict]:
         try:
             flow = FlowTree.objects.get(root_id=self.root_id)
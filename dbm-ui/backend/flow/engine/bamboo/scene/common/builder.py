@@ -8,9 +8,9 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-import copy
 import logging
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, List, Optional
 
 from bamboo_engine import api, builder
 from bamboo_engine.builder import (
@@ -32,9 +32,14 @@ from pipeline.eri.runtime import BambooDjangoRuntime
 from backend.flow.models import FlowNode, FlowTree, StateType
 from backend.flow.plugins.components.collections.common.create_random_job_user import AddTempUserForClusterComponent
 from backend.flow.plugins.components.collections.common.drop_random_job_user import DropTempUserForClusterComponent
+from backend.flow.utils.flow_payload import externalize_pipeline_payloads, save_flow_payloads
+from backend.flow.utils.pipeline_tree import insensitive_pipeline_tree
 
 logger = logging.getLogger("json")
 
+# 流程节点记录批量写入时单条 INSERT 的最大行数
+FLOW_NODE_BULK_CREATE_BATCH_SIZE = 1000
+
 
 class Builder(object):
     """
@@ -58,6 +63,9 @@ class Builder(object):
         self.need_random_pass_cluster_ids = need_random_pass_cluster_ids
         self.start_act = EmptyStartEvent()
         self.end_act = EmptyEndEvent()
+        # 流程节点记录在构建期间缓存，在 run_pipeline 时统一写入，子流程的记录随子流程汇总到父流程
+        self.flow_nodes: List[FlowNode] = []
+        self.build_start_time = time.perf_counter()
         if not self.data:
             self.data = {}
 
@@ -136,7 +144,7 @@ class Builder(object):
 
         self.rewritable_node_source_keys.append({"source_act": act.id, "source_key": "trans_data"})
 
-        FlowNode.objects.create(uid=self.data.get("uid"), root_id=self.root_id, node_id=act.id)
+        self.flow_nodes.append(FlowNode(uid=self.data.get("uid"), root_id=self.root_id, node_id=act.id))
         if extend:
             self.pipe = self.pipe.extend(act)
         return act
@@ -149,7 +157,6 @@ class Builder(object):
         pg = ParallelGateway()
         cg = ConvergeGateway()
         acts = []
-        flow_node_list = []
 
         # 增加对传入的acts_list做合法判断
         if not isinstance(acts_list, list) or len(acts_list) == 0:
@@ -170,10 +177,9 @@ class Builder(object):
 
             self.rewritable_node_source_keys.append({"source_act": act.id, "source_key": "trans_data"})
 
-            flow_node_list.append(FlowNode(uid=self.data["uid"], root_id=self.root_id, node_id=act.id))
+            self.flow_nodes.append(FlowNode(uid=self.data["uid"], root_id=self.root_id, node_id=act.id))
             acts.append(act)
 
-        FlowNode.objects.bulk_create(flow_node_list)
         self.pipe = self.pipe.extend(pg).connect(*acts).to(pg).converge(cg)
 
     def add_sub_pipeline(self, sub_flow):
@@ -181,7 +187,7 @@ class Builder(object):
         add_sub_pipeline 方法： 为主流程加入子流程
         @param sub_flow: 子流程
         """
-
+        self.collect_sub_flow_nodes(sub_flow)
         self.pipe = self.pipe.extend(sub_flow)
         # return self
 
@@ -190,10 +196,21 @@ class Builder(object):
         add_parallel_sub_pipeline 方法： 为主流程并发加入子流程
         @param sub_flow_list: 子流程列表
         """
+        for sub_flow in sub_flow_list:
+            self.collect_sub_flow_nodes(sub_flow)
         pg = ParallelGateway()
         cg = ConvergeGateway()
         self.pipe = self.pipe.extend(pg).connect(*sub_flow_list).to(pg).converge(cg)
 
+    def collect_sub_flow_nodes(self, sub_flow):
+        """汇总子流程构建期间缓存的流程节点记录"""
+        self.flow_nodes.extend(getattr(sub_flow, "flow_nodes", []))
+
+    def flush_flow_nodes(self):
+        """批量写入构建期间缓存的流程节点记录"""
+        FlowNode.objects.bulk_create(self.flow_nodes, batch_size=FLOW_NODE_BULK_CREATE_BATCH_SIZE)
+        self.flow_nodes = []
+
     def run_pipeline(self, init_trans_data_class: Optional[Any] = None, is_drop_random_user: bool = True) -> bool:
         """
         开始运行 pipeline
@@ -210,9 +227,15 @@ class Builder(object):
             source_act=self.rewritable_node_source_keys, type=Var.SPLICE, value=init_trans_data_class
         )
         self.pipe.extend(self.end_act)
+        build_cost = time.perf_counter() - self.build_start_time
+
+        flush_start_time = time.perf_counter()
+        flow_node_count = len(self.flow_nodes)
+        self.flush_flow_nodes()
+        flush_cost = time.perf_counter() - flush_start_time
+
         pipeline = builder.build_tree(self.start_act, id=self.root_id, data=self.global_data)
-        pipeline_copy = copy.deepcopy(pipeline)
-        insensitive_data = self.hide_sensitive_data(pipeline_copy)
+        insensitive_data = insensitive_pipeline_tree(pipeline)
         # 考虑到有些任务没有单据关联，因此uid一般为root_id，此时创建FlowTree的时候uid应该为null
         uid = self.data.get("uid") if isinstance(self.data.get("uid"), int) else None
         FlowTree.objects.create(
@@ -225,22 +248,27 @@ class Builder(object):
             created_by=self.data["created_by"],
         )
 
+        # 节点参数和全局参数按内容存储一份，流程数据中只保留摘要引用
+        payloads = externalize_pipeline_payloads(pipeline)
+        save_flow_payloads(payloads)
+
+        logger.info(
+            "build pipeline finished, root_id: %s, flow_nodes: %s, payloads: %s, build_cost: %.3fs, "
+            "flush_cost: %.3fs, total_cost: %.3fs",
+            self.root_id,
+            flow_node_count,
+            len(payloads),
+            build_cost,
+            flush_cost,
+            time.perf_counter() - self.build_start_time,
+        )
+
         if not api.run_pipeline(runtime=BambooDjangoRuntime(), pipeline=pipeline).result:
             logger.error(_("部署bamboo流程任务创建失败，任务结束"))
             return False
 
         return True
 
-    def hide_sensitive_data(self, copy_data: Optional[Dict]) -> Optional[Dict]:
-        """隐藏pipeline中敏感数据"""
-        for key, value in list(copy_data.items()):
-            if key == "inputs":
-                copy_data.pop(key)
-                continue
-            if type(value) == dict:
-                self.hide_sensitive_data(value)
-        return copy_data
-
     @staticmethod
     def get_ip_list(ips: list) -> list:
         return [{"bk_cloud_id": 0, "ip": ip} for ip in ips]
@@ -265,7 +293,10 @@ class SubBuilder(Builder):
         # sub_data.inputs['${trans_data}'] = DataInput(type=Var.SPLICE, value='${trans_data}')
         sub_params = Params({"${trans_data}": Var(type=Var.SPLICE, value="${trans_data}")})
         self.pipe.extend(self.end_act)
-        return SubProcess(start=self.start_act, data=sub_data, params=sub_params, name=sub_name)
+        sub_process = SubProcess(start=self.start_act, data=sub_data, params=sub_params, name=sub_name)
+        # 子流程的节点记录由添加该子流程的父流程汇总，最终在主流程 run_pipeline 时统一写入
+        sub_process.flow_nodes = self.flow_nodes
+        return sub_process
 
 
 class RewritableNode(RewritableNodeOutput):
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.19 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("flow", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FlowPayload",
+            fields=[
+                (
+                    "digest",
+                    models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name="内容摘要"),
+                ),
+                ("payload", models.JSONField(verbose_name="参数内容")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="创建时间")),
+            ],
+            options={
+                "db_table": "flow_payload",
+            },
+        ),
+    ]
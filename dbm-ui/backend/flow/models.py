@@ -49,3 +49,14 @@ class FlowNode(models.Model):
     class Meta:
         unique_together = ["root_id", "node_id", "version_id"]
         db_table = "flow_node"
+
+
+class FlowPayload(models.Model):
+    """流程中按内容寻址存储的大参数(活动节点的 kwargs、流程的全局参数)，相同内容只存储一份"""
+
+    digest = models.CharField(_("内容摘要"), max_length=64, primary_key=True)
+    payload = models.JSONField(_("参数内容"))
+    created_at = models.DateTimeField(_("创建时间"), auto_now_add=True)
+
+    class Meta:
+        db_table = "flow_payload"
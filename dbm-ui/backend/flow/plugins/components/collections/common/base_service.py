@@ -18,16 +18,47 @@ from typing import Any, Dict, List, Optional, Union
 from bamboo_engine import states
 from django.utils import translation
 from django.utils.translation import ugettext as _
-from pipeline.core.flow.activity import Service, StaticIntervalGenerator
+from pipeline.core.flow.activity import Service
+from pipeline.core.flow.activity.service_activity import AbstractIntervalGenerator
 
 from backend import env
 from backend.components import JobApi
 from backend.components.sops.client import BkSopsApi
 from backend.core.translation.constants import Language
 from backend.flow.consts import SUCCESS_LIST, WriteContextOpType
+from backend.flow.utils.flow_payload import FLOW_PAYLOAD_INPUT_KEYS, resolve_payload_refs
+from backend.flow.utils.job_status import adaptive_interval, get_job_instance_status
+from backend.flow.utils.pipeline_snapshot import bump_tree_states_version
+from backend.utils.batch_request import request_multi_thread
 
 logger = logging.getLogger("flow")
 cpl = re.compile("<ctx>(?P<context>.+?)</ctx>")  # 非贪婪模式，只匹配第一次出现的自定义tag
+# 批量获取任务日志接口单次请求的最大IP数
+JOB_BATCH_LOG_IP_LIMIT = 500
+
+
+class AdaptiveIntervalGenerator(AbstractIntervalGenerator):
+    """
+    自适应轮询间隔：前几次快速轮询，之后按指数退避，最大不超过 max_interval，并增加随机抖动避免大量节点同时轮询
+    bamboo 会在每次调度前根据调度次数重置 count，因此这里的间隔只依赖 count，可以在多个节点间共享
+    """
+
+    def __init__(self, initial_interval=1, factor=1.5, max_interval=30, jitter=0.2):
+        """
+        @param initial_interval: 首次轮询间隔(秒)
+        @param factor: 每次轮询间隔的增长倍数
+        @param max_interval: 最大轮询间隔(秒)，应根据任务的预期耗时设置
+        @param jitter: 随机抖动比例
+        """
+        super().__init__()
+        self.initial_interval = initial_interval
+        self.factor = factor
+        self.max_interval = max_interval
+        self.jitter = jitter
+
+    def next(self):
+        super().next()
+        return adaptive_interval(self.count, self.initial_interval, self.factor, self.max_interval, self.jitter)
 
 
 class ServiceLogMixin:
@@ -75,7 +106,13 @@ class BaseService(Service, ServiceLogMixin, metaclass=ABCMeta):
         translation.activate(blueking_language)
         # self.log_info(f"System language: {blueking_language}")
 
+    @staticmethod
+    def resolve_inputs(data):
+        """取回以内容摘要引用的节点参数和全局参数，取回后的参数会随节点执行数据保存，schedule 时无需再次取回"""
+        data.inputs.update(resolve_payload_refs({key: data.get_one_of_inputs(key) for key in FLOW_PAYLOAD_INPUT_KEYS}))
+
     def execute(self, data, parent_data):
+        self.resolve_inputs(data)
         self.active_language(data)
 
         kwargs = data.get_one_of_inputs("kwargs") or {}
@@ -88,11 +125,17 @@ class BaseService(Service, ServiceLogMixin, metaclass=ABCMeta):
         except Exception as e:  # pylint: disable=broad-except
             self.log_exception(_("[{}] 失败: {}").format(kwargs.get("node_name", self.__class__.__name__), e))
             return False
+        finally:
+            # 节点执行时可能更新了节点信息(如执行主机)，需要使流程状态快照失效
+            root_pipeline_id = getattr(self, "runtime_attrs", {}).get("root_pipeline_id")
+            if root_pipeline_id:
+                bump_tree_states_version(root_pipeline_id)
 
     def _execute(self, data, parent_data):
         raise NotImplementedError()
 
     def schedule(self, data, parent_data, callback_data=None):
+        self.resolve_inputs(data)
         self.active_language(data)
 
         kwargs = data.get_one_of_inputs("kwargs") or {}
@@ -143,20 +186,14 @@ class BaseService(Service, ServiceLogMixin, metaclass=ABCMeta):
 
 class BkJobService(BaseService, metaclass=ABCMeta):
     __need_schedule__ = True
-    interval = StaticIntervalGenerator(5)
+    interval = AdaptiveIntervalGenerator(initial_interval=1, max_interval=20)
 
     @staticmethod
     def __status__(instance_id: str) -> Optional[Dict]:
         """
-        获取任务状态
+        获取任务状态，优先读取批量轮询服务发布的状态
         """
-        payload = {
-            "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
-            "job_instance_id": instance_id,
-            "return_ip_result": True,
-        }
-        resp = JobApi.get_job_instance_status(payload, raw=True)
-        return resp
+        return get_job_instance_status(instance_id)
 
     def __log__(
         self,
@@ -174,47 +211,70 @@ class BkJobService(BaseService, metaclass=ABCMeta):
         }
         return JobApi.get_job_instance_ip_log({**payload, **ip_dict}, raw=True)
 
-    def __get_target_ip_context(
-        self,
-        job_instance_id: int,
-        step_instance_id: int,
-        ip_dict: dict,
-        data,
-        trans_data,
-        write_payload_var: str,
-        write_op: str,
-    ):
+    def __batch_log__(self, job_instance_id: int, step_instance_id: int, ip_dicts: List[dict]) -> Dict[str, str]:
         """
-        对单个节点获取执行后log，并赋值给定义好流程上下文的trans_data
-        write_op 控制写入变量的方式，rewrite是默认值，代表覆盖写入；append代表以{"ip":xxx} 形式追加里面变量里面
+        批量获取多个IP的任务日志，返回 {ip: log_content}，获取失败的IP不在返回结果中
+        按批量接口的IP数限制拆分后并发请求，批量接口失败时退化为并发的单IP查询
         """
-        resp = self.__log__(job_instance_id, step_instance_id, ip_dict)
-        if not resp["result"]:
-            # 结果返回异常，则异常退出
-            return False
-        try:
-            # 以dict形式追加写入
-            result = json.loads(re.search(cpl, resp["data"]["log_content"]).group("context"))
-            if write_op == WriteContextOpType.APPEND.value:
-                context = copy.deepcopy(getattr(trans_data, write_payload_var))
-                ip = ip_dict["ip"]
-                if context:
-                    context[ip] = copy.deepcopy(result)
-                else:
-                    context = {ip: copy.deepcopy(result)}
-
-                setattr(trans_data, write_payload_var, copy.deepcopy(context))
-
-            else:
-                # 默认覆盖写入
-                setattr(trans_data, write_payload_var, copy.deepcopy(result))
-            data.outputs["trans_data"] = trans_data
 
-            return True
+        def _batch_log(ip_list):
+            payload = {
+                "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
+                "job_instance_id": job_instance_id,
+                "step_instance_id": step_instance_id,
+                "ip_list": ip_list,
+            }
+            resp = JobApi.batch_get_job_instance_ip_log(payload, raw=True)
+            if resp.get("result"):
+                return {log["ip"]: log["log_content"] for log in resp["data"].get("script_task_logs") or []}
+
+            self.log_warning(_("批量获取任务日志失败，改为逐个IP获取: {}").format(resp.get("message")))
+            ip_log_resps = request_multi_thread(
+                lambda ip_dict: (ip_dict["ip"], self.__log__(job_instance_id, step_instance_id, ip_dict)),
+                [{"ip_dict": ip_dict} for ip_dict in ip_list],
+                get_data=lambda x: x,
+            )
+            return {ip: resp["data"]["log_content"] for ip, resp in ip_log_resps if resp.get("result")}
+
+        ip_logs = {}
+        chunks = [
+            {"ip_list": ip_dicts[i : i + JOB_BATCH_LOG_IP_LIMIT]}
+            for i in range(0, len(ip_dicts), JOB_BATCH_LOG_IP_LIMIT)
+        ]
+        for chunk_ip_logs in request_multi_thread(_batch_log, chunks, get_data=lambda x: x):
+            ip_logs.update(chunk_ip_logs)
+        return ip_logs
 
-        except Exception as e:
-            self.log_error(_("[写入上下文结果失败] failed: {}").format(e))
-            return False
+    def __get_target_ip_context(
+        self, ip_logs: Dict[str, str], ip_dicts: List[dict], trans_data, write_payload_var: str, write_op: str
+    ) -> bool:
+        """
+        从各节点执行后的log中解析上下文，一次性赋值给定义好流程上下文的trans_data
+        write_op 控制写入变量的方式，rewrite是默认值，代表覆盖写入；append代表以{"ip":xxx} 形式追加里面变量里面
+        """
+        ip_results, is_success = {}, True
+        for ip_dict in ip_dicts:
+            ip = ip_dict["ip"]
+            try:
+                ip_results[ip] = json.loads(re.search(cpl, ip_logs[ip]).group("context"))
+            except Exception as e:  # pylint: disable=broad-except
+                self.log_error(_("[写入上下文结果失败] failed: {}").format(e))
+                self.log_error(_("获取执行后写入流程上下文失败，ip:[{}]").format(ip))
+                is_success = False
+
+        if not ip_results:
+            return is_success
+
+        if write_op == WriteContextOpType.APPEND.value:
+            # 以dict形式追加写入，只拷贝一次已有上下文
+            context = copy.deepcopy(getattr(trans_data, write_payload_var)) or {}
+            context.update(ip_results)
+            setattr(trans_data, write_payload_var, context)
+        else:
+            # 默认覆盖写入，多个IP时以最后一个成功解析的IP结果为准
+            setattr(trans_data, write_payload_var, list(ip_results.values())[-1])
+
+        return is_success
 
     def _schedule(self, data, parent_data, callback_data=None) -> bool:
         ext_result = data.get_one_of_outputs("ext_result")
@@ -269,10 +329,10 @@ class BkJobService(BaseService, metaclass=ABCMeta):
 
             # 转载job脚本节点报错日志，兼容多IP执行场景的日志输出
             if ip_dicts:
+                ip_logs = self.__batch_log__(job_instance_id, step_instance_id, ip_dicts)
                 for ip_dict in ip_dicts:
-                    resp = self.__log__(job_instance_id, step_instance_id, ip_dict)
-                    if resp.get("result"):
-                        self.log_error(f"{ip_dict}:{resp['data']['log_content']}")
+                    if ip_dict["ip"] in ip_logs:
+                        self.log_error(f"{ip_dict}:{ip_logs[ip_dict['ip']]}")
 
             self.finish_schedule()
             return False
@@ -288,21 +348,18 @@ class BkJobService(BaseService, metaclass=ABCMeta):
         # 追加写入是特殊行为，如果想IP日志结果都写入，可以选择追加写入，上下文变成list，每个元素是{"ip":"log"} WriteContextOpType.APPEND
         self.log_info(_("[{}]该节点需要获取执行后日志，赋值到流程上下文").format(node_name))
 
-        is_false = False
-        for ip_dict in ip_dicts:
-            if not self.__get_target_ip_context(
-                job_instance_id=job_instance_id,
-                step_instance_id=step_instance_id,
-                ip_dict=ip_dict,
-                data=data,
-                trans_data=trans_data,
-                write_payload_var=write_payload_var,
-                write_op=kwargs.get("write_op", WriteContextOpType.REWRITE.value),
-            ):
-                self.log_error(_("[{}] 获取执行后写入流程上下文失败，ip:[{}]").format(node_name, ip_dict["ip"]))
-                is_false = True
-
-        if is_false:
+        ip_logs = self.__batch_log__(job_instance_id, step_instance_id, ip_dicts)
+        is_success = self.__get_target_ip_context(
+            ip_logs=ip_logs,
+            ip_dicts=ip_dicts,
+            trans_data=trans_data,
+            write_payload_var=write_payload_var,
+            write_op=kwargs.get("write_op", WriteContextOpType.REWRITE.value),
+        )
+        data.outputs["trans_data"] = trans_data
+
+        if not is_success:
+            self.log_error(_("[{}] 获取执行后写入流程上下文失败").format(node_name))
             self.finish_schedule()
             return False
 
@@ -312,7 +369,7 @@ class BkJobService(BaseService, metaclass=ABCMeta):
 
 class BkSopsService(BaseService, metaclass=ABCMeta):
     __need_schedule__ = True
-    interval = StaticIntervalGenerator(5)
+    interval = AdaptiveIntervalGenerator(initial_interval=2, max_interval=30)
     """
     定义调用标准运维的基类
     """
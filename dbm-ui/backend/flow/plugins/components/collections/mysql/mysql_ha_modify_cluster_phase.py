@@ -14,6 +14,7 @@ from django.db import transaction
 from django.utils.translation import ugettext as _
 from pipeline.component_framework.component import Component
 
+from backend.db_meta.change_feed import InstanceKind, record_instance_id_changes
 from backend.db_meta.enums import ClusterPhase, InstancePhase
 from backend.db_meta.models import Cluster, ProxyInstance, StorageInstance
 from backend.flow.plugins.components.collections.common.base_service import BaseService
@@ -28,8 +29,13 @@ class MySQLHAModifyClusterPhaseService(BaseService):
         cluster_ids = trans_data.cluster_ids
 
         Cluster.objects.filter(id__in=cluster_ids).update(phase=ClusterPhase.ONLINE.value)
-        ProxyInstance.objects.filter(cluster__in=cluster_ids).update(phase=InstancePhase.ONLINE.value)
-        StorageInstance.objects.filter(cluster__in=cluster_ids).update(phase=InstancePhase.ONLINE.value)
+        proxies = ProxyInstance.objects.filter(cluster__in=cluster_ids)
+        storages = StorageInstance.objects.filter(cluster__in=cluster_ids)
+        proxies.update(phase=InstancePhase.ONLINE.value)
+        storages.update(phase=InstancePhase.ONLINE.value)
+        # 批量更新不会触发信号，需要主动记录元数据变更
+        record_instance_id_changes(InstanceKind.PROXY, proxies.values_list("id", flat=True))
+        record_instance_id_changes(InstanceKind.STORAGE, storages.values_list("id", flat=True))
 
         self.log_info(_("[{}] 修改集群状态完成".format(kwargs["node_name"])))
         return True
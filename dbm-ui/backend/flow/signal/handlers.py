@@ -22,6 +22,7 @@ from backend.exceptions import ApiError
 from backend.flow.consts import StateType
 from backend.flow.engine.bamboo.engine import BambooEngine
 from backend.flow.models import FlowNode, FlowTree
+from backend.flow.utils.pipeline_snapshot import bump_tree_states_version
 from backend.ticket.constants import FlowCallbackType, FlowType, TicketFlowStatus
 from backend.ticket.flow_manager.inner import InnerFlow
 from backend.ticket.flow_manager.manager import TicketFlowManager
@@ -43,6 +44,7 @@ def post_set_state_signal_handler(sender, node_id, to_state, version, root_id, *
     FlowNode.objects.filter(root_id=root_id, node_id=node_id).update(
         version_id=version, status=to_state, updated_at=now
     )
+    bump_tree_states_version(root_id)
     try:
         tree = FlowTree.objects.get(root_id=root_id)
     except FlowTree.DoesNotExist:
@@ -72,6 +74,7 @@ def post_set_state_signal_handler(sender, node_id, to_state, version, root_id, *
             # 更新flow tree和inner flow的状态
             tree.updated_at, tree.status = now, target_tree_status
             tree.save()
+            bump_tree_states_version(root_id)
             DBDirtyMachineHandler.handle_dirty_machine(tree.uid, root_id, origin_tree_status, target_tree_status)
             callback_ticket(tree.uid, root_id)
         except Exception as e:  # pylint: disable=broad-except
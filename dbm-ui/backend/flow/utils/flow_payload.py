@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+
+流程参数的内容寻址存储：
+- 构建流程时，较大的活动节点 kwargs 和流程全局参数按内容摘要存储到 FlowPayload 中，流程数据中只保留摘要引用
+- 节点执行时由 BaseService 按摘要批量取回参数，相同内容的参数在流程数据中只存储一份
+"""
+import copy
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from bamboo_engine.builder import Var
+
+from backend.flow.engine.exceptions import PipelineError
+from backend.flow.models import FlowPayload
+
+# 参数引用中保存内容摘要的字段
+FLOW_PAYLOAD_REF_KEY = "__flow_payload__"
+# 序列化后小于该长度的参数直接内嵌在流程数据中，不值得额外的查询
+FLOW_PAYLOAD_MIN_SIZE = 1024
+FLOW_PAYLOAD_BULK_CREATE_BATCH_SIZE = 500
+# 活动节点各自独有的 kwargs 字段，不参与内容寻址，保留在引用中
+FLOW_PAYLOAD_NODE_KEYS = frozenset(["root_id", "node_id", "node_name"])
+# 流程数据中按内容寻址存储的全局参数
+PIPELINE_PAYLOAD_DATA_KEYS = ("${global_data}",)
+# 节点执行时需要解析引用的入参
+FLOW_PAYLOAD_INPUT_KEYS = ("kwargs", "global_data")
+
+
+def make_payload_ref(value: Dict, payloads: Dict[str, Dict], inline_keys: frozenset = frozenset()) -> Dict:
+    """
+    生成参数的内容摘要引用，无法序列化或过小的参数原样返回
+    @param value: 参数内容
+    @param payloads: 收集待存储的参数 {digest: payload}
+    @param inline_keys: 保留在引用中、不参与内容寻址的字段
+    """
+    payload = {key: val for key, val in value.items() if key not in inline_keys}
+    try:
+        content = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return value
+    if len(content) < FLOW_PAYLOAD_MIN_SIZE:
+        return value
+
+    digest = hashlib.sha256(content.encode()).hexdigest()
+    # 存储序列化后的内容，与节点取回时的结果保持一致(如 tuple 会变为 list)
+    payloads.setdefault(digest, json.loads(content))
+    ref = {key: value[key] for key in inline_keys if key in value}
+    ref[FLOW_PAYLOAD_REF_KEY] = digest
+    return ref
+
+
+def externalize_pipeline_payloads(pipeline: Dict, payloads: Optional[Dict[str, Dict]] = None) -> Dict[str, Dict]:
+    """
+    将流程树(包括子流程)中的全局参数和活动节点 kwargs 替换为内容摘要引用，返回待存储的参数
+    只修改 builder.build_tree 生成的流程树，不影响构建流程时传入的参数
+    @param pipeline: builder.build_tree 生成的流程树
+    @param payloads: 收集待存储的参数 {digest: payload}
+    """
+    payloads = {} if payloads is None else payloads
+
+    def _externalize(var: Optional[Dict], inline_keys: frozenset = frozenset()):
+        if var and var.get("type") == Var.PLAIN and isinstance(var.get("value"), dict):
+            var["value"] = make_payload_ref(var["value"], payloads, inline_keys)
+
+    for key in PIPELINE_PAYLOAD_DATA_KEYS:
+        _externalize(pipeline["data"]["inputs"].get(key))
+
+    for act in pipeline["activities"].values():
+        if act["type"] == "SubProcess":
+            externalize_pipeline_payloads(act["pipeline"], payloads)
+        elif act["type"] == "ServiceActivity":
+            _externalize(act["component"]["inputs"].get("kwargs"), FLOW_PAYLOAD_NODE_KEYS)
+    return payloads
+
+
+def save_flow_payloads(payloads: Dict[str, Dict]):
+    """存储参数，已存在的相同内容直接复用"""
+    FlowPayload.objects.bulk_create(
+        [FlowPayload(digest=digest, payload=payload) for digest, payload in payloads.items()],
+        batch_size=FLOW_PAYLOAD_BULK_CREATE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def is_payload_ref(value: Any) -> bool:
+    return isinstance(value, dict) and FLOW_PAYLOAD_REF_KEY in value
+
+
+def resolve_payload_refs(values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    批量解析参数引用，只返回被解析的参数
+    @param values: {参数名: 参数值}，非引用的参数会被忽略
+    """
+    refs = {key: value for key, value in values.items() if is_payload_ref(value)}
+    if not refs:
+        return {}
+
+    digests = {ref[FLOW_PAYLOAD_REF_KEY] for ref in refs.values()}
+    payloads = dict(FlowPayload.objects.filter(digest__in=digests).values_list("digest", "payload"))
+    resolved, used_digests = {}, set()
+    for key, ref in refs.items():
+        digest = ref[FLOW_PAYLOAD_REF_KEY]
+        if digest not in payloads:
+            raise PipelineError(f"flow payload {digest} of {key} not found")
+        # 节点可能修改参数，同一内容被多个参数引用时需要各自持有一份
+        payload = copy.deepcopy(payloads[digest]) if digest in used_digests else payloads[digest]
+        used_digests.add(digest)
+        payload.update({key: val for key, val in ref.items() if key != FLOW_PAYLOAD_REF_KEY})
+        resolved[key] = payload
+    return resolved
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+
+Job 任务状态的批量轮询：
+- BkJobService 调度时只读取缓存中的任务状态，并把未完成的 job_instance_id 登记到待轮询集合
+- 周期任务只查询到期的任务，每个任务的轮询间隔按轮询次数指数退避，并发布到短期缓存中
+这样 Job 的调用量只和正在运行的任务及其运行时长相关，而与同时在调度的节点数量无关
+"""
+import logging
+import random
+import time
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+
+from backend import env
+from backend.components import JobApi
+from backend.utils.batch_request import request_multi_thread
+from backend.utils.redis import RedisConn
+
+logger = logging.getLogger("flow")
+
+# 待轮询的 job_instance_id 集合(有序集合，score 为下一次轮询的时间)
+JOB_STATUS_PENDING_KEY = "bk_job_status_pending_instances"
+# 节点最近一次登记任务的时间(有序集合，score 为登记时间)，用于清理无人关心的任务
+JOB_STATUS_REGISTER_KEY = "bk_job_status_registered_instances"
+# 任务已轮询的次数(hash)，用于计算轮询间隔
+JOB_STATUS_POLL_COUNT_KEY = "bk_job_status_poll_counts"
+# 任务状态缓存
+JOB_STATUS_CACHE_KEY_TPL = "bk_job_status_{job_instance_id}"
+# 轮询间隔：首次 1s，之后按 1.5 倍增长，最大 30s
+JOB_STATUS_POLL_INITIAL_INTERVAL = 1
+JOB_STATUS_POLL_FACTOR = 1.5
+JOB_STATUS_POLL_MAX_INTERVAL = 30
+# 任务状态缓存时间，需要大于最大轮询间隔，避免两次轮询之间节点缓存缺失而直接查询 Job
+JOB_STATUS_CACHE_TIME = 2 * JOB_STATUS_POLL_MAX_INTERVAL
+# 超过该时间没有节点登记的任务认为已无人关心(如流程被终止)，不再轮询
+JOB_STATUS_PENDING_EXPIRE_TIME = 10 * 60
+# 单次批量轮询的最大任务数
+JOB_STATUS_POLL_BATCH_SIZE = 1000
+# 认领任务后的最长轮询时间，超时(如 worker 异常退出)后任务重新到期，由其他批次轮询
+JOB_STATUS_POLL_CLAIM_TIMEOUT = 60
+
+# 原子地认领到期任务：推迟到认领超时时间，避免重叠的周期任务重复查询，并累计轮询次数
+CLAIM_DUE_JOBS_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+local counts = {}
+for i, id in ipairs(ids) do
+    redis.call('ZADD', KEYS[1], 'XX', ARGV[3], id)
+    counts[i] = redis.call('HINCRBY', KEYS[2], id, 1)
+end
+return {ids, counts}
+"""
+_claim_due_jobs_script = RedisConn.register_script(CLAIM_DUE_JOBS_SCRIPT)
+
+
+def adaptive_interval(
+    count: int,
+    initial_interval: float = JOB_STATUS_POLL_INITIAL_INTERVAL,
+    factor: float = JOB_STATUS_POLL_FACTOR,
+    max_interval: float = JOB_STATUS_POLL_MAX_INTERVAL,
+    jitter: float = 0.2,
+) -> int:
+    """
+    第 count 次轮询后的间隔(秒)：指数退避，并增加随机抖动避免大量任务同时轮询
+    @param count: 已轮询的次数，从 1 开始
+    @param initial_interval: 首次轮询间隔(秒)
+    @param factor: 每次轮询间隔的增长倍数
+    @param max_interval: 最大轮询间隔(秒)
+    @param jitter: 随机抖动比例
+    """
+    interval = min(initial_interval * factor ** (max(count, 1) - 1), max_interval)
+    interval *= 1 + random.uniform(-jitter, jitter)
+    return max(1, int(round(interval)))
+
+
+def query_job_instance_status(job_instance_id: int) -> Dict:
+    """直接查询 Job 获取任务状态"""
+    payload = {
+        "bk_biz_id": env.JOB_BLUEKING_BIZ_ID,
+        "job_instance_id": job_instance_id,
+        "return_ip_result": True,
+    }
+    return JobApi.get_job_instance_status(payload, raw=True)
+
+
+def is_job_finished(resp: Optional[Dict]) -> bool:
+    return bool(resp and resp.get("result") and resp["data"]["finished"])
+
+
+def remove_pending_job_instances(job_instance_ids: List[int]):
+    if not job_instance_ids:
+        return
+    pipeline = RedisConn.pipeline()
+    pipeline.zrem(JOB_STATUS_PENDING_KEY, *job_instance_ids)
+    pipeline.zrem(JOB_STATUS_REGISTER_KEY, *job_instance_ids)
+    pipeline.hdel(JOB_STATUS_POLL_COUNT_KEY, *job_instance_ids)
+    pipeline.execute()
+
+
+def publish_job_instance_status(job_instance_id: int, resp: Dict):
+    """发布任务状态，查询失败的结果不缓存，已完成的任务不再需要轮询"""
+    if not resp.get("result"):
+        return
+    cache.set(JOB_STATUS_CACHE_KEY_TPL.format(job_instance_id=job_instance_id), resp, JOB_STATUS_CACHE_TIME)
+    if is_job_finished(resp):
+        remove_pending_job_instances([job_instance_id])
+
+
+def get_job_instance_status(job_instance_id: int) -> Dict:
+    """
+    获取任务状态：优先读取批量轮询发布的结果，缓存缺失时(如首次调度)直接查询 Job
+    未完成的任务会登记到待轮询集合，由周期任务批量刷新
+    """
+    resp = cache.get(JOB_STATUS_CACHE_KEY_TPL.format(job_instance_id=job_instance_id))
+    if resp is None:
+        resp = query_job_instance_status(job_instance_id)
+        publish_job_instance_status(job_instance_id, resp)
+
+    if not is_job_finished(resp):
+        now = time.time()
+        pipeline = RedisConn.pipeline()
+        pipeline.zadd(JOB_STATUS_REGISTER_KEY, {job_instance_id: now})
+        # 已在轮询中的任务保留原有的轮询时间，重复登记不会重置退避
+        pipeline.zadd(JOB_STATUS_PENDING_KEY, {job_instance_id: now + adaptive_interval(1)}, nx=True)
+        pipeline.execute()
+    return resp
+
+
+def poll_pending_job_instance_status(batch_size: int = JOB_STATUS_POLL_BATCH_SIZE) -> List[int]:
+    """并发刷新已到轮询时间的任务状态，返回本次刷新的 job_instance_id"""
+    now = time.time()
+    # 清理长时间没有节点关心的任务
+    expired_ids = RedisConn.zrangebyscore(JOB_STATUS_REGISTER_KEY, "-inf", now - JOB_STATUS_PENDING_EXPIRE_TIME)
+    remove_pending_job_instances(expired_ids)
+
+    # 优先刷新最早到期的任务，已完成的任务在发布状态时会一并清理轮询次数
+    job_instance_ids, poll_counts = _claim_due_jobs_script(
+        keys=[JOB_STATUS_PENDING_KEY, JOB_STATUS_POLL_COUNT_KEY],
+        args=[now, batch_size, now + JOB_STATUS_POLL_CLAIM_TIMEOUT],
+    )
+    job_instance_ids = [int(job_instance_id) for job_instance_id in job_instance_ids]
+    if not job_instance_ids:
+        return []
+
+    def _poll(job_instance_id):
+        try:
+            resp = query_job_instance_status(job_instance_id)
+        except Exception as err:  # pylint: disable=broad-except
+            # 查询失败时不发布，按退避间隔稍后重试，节点在缓存缺失时会自行查询
+            logger.warning("poll job instance status failed, job_instance_id: %s, error: %s", job_instance_id, err)
+            return
+        publish_job_instance_status(job_instance_id, resp)
+
+    request_multi_thread(_poll, [{"job_instance_id": job_instance_id} for job_instance_id in job_instance_ids])
+
+    # 未完成的任务按轮询次数确定下一次轮询时间，只更新仍在集合中的任务，避免把已完成的任务重新加回
+    pipeline = RedisConn.pipeline()
+    for job_instance_id, count in zip(job_instance_ids, poll_counts):
+        pipeline.zadd(JOB_STATUS_PENDING_KEY, {job_instance_id: time.time() + adaptive_interval(count)}, xx=True)
+    pipeline.execute()
+    return job_instance_ids
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+
+流程状态快照的版本管理：节点状态或节点信息变更时递增版本号，任务详情接口据此判断快照是否需要重新计算
+"""
+import time
+
+from django.core.cache import cache
+
+# 流程状态快照版本号，节点状态或节点信息变更时递增
+PIPELINE_TREE_STATES_VERSION_KEY = "pipeline_tree_states_version_{root_id}"
+PIPELINE_TREE_STATES_VERSION_CACHE_TIME = 24 * 60 * 60
+# 流程状态快照，节点名称需要翻译，因此按语言区分
+PIPELINE_TREE_STATES_SNAPSHOT_KEY = "pipeline_tree_states_snapshot_{root_id}_{language}"
+PIPELINE_TREE_STATES_SNAPSHOT_CACHE_TIME = 60 * 60
+
+
+def _init_version() -> int:
+    # 以毫秒时间戳作为初始版本号，避免缓存淘汰后版本号回退，导致客户端的旧 etag 被误判为最新
+    return int(time.time() * 1000)
+
+
+def get_tree_states_version(root_id: str) -> int:
+    """获取流程状态快照的当前版本号"""
+    version_key = PIPELINE_TREE_STATES_VERSION_KEY.format(root_id=root_id)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, _init_version(), PIPELINE_TREE_STATES_VERSION_CACHE_TIME)
+        version = cache.get(version_key)
+    return version
+
+
+def bump_tree_states_version(root_id: str):
+    """流程状态发生变化，使流程状态快照失效"""
+    version_key = PIPELINE_TREE_STATES_VERSION_KEY.format(root_id=root_id)
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.set(version_key, _init_version(), PIPELINE_TREE_STATES_VERSION_CACHE_TIME)
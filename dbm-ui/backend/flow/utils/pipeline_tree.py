@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+
+流程树的脱敏投影：一次遍历直接生成不含 inputs 的流程树，避免先深拷贝整个流程(包含各节点的 kwargs 等大字段)再删除
+"""
+from typing import Any, Dict
+
+# 流程树中的敏感字段，包括各节点的入参和流程的全局数据
+PIPELINE_SENSITIVE_KEYS = frozenset(["inputs"])
+
+
+def insensitive_pipeline_tree(tree: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    生成不含敏感字段的流程树，只复制字典结构，其余叶子值与原流程树共享
+    返回值用于直接序列化入库，调用方不应修改其中的列表等可变值
+    @param tree: builder.build_tree 生成的流程树
+    """
+    return {
+        key: insensitive_pipeline_tree(value) if isinstance(value, dict) else value
+        for key, value in tree.items()
+        if key not in PIPELINE_SENSITIVE_KEYS
+    }
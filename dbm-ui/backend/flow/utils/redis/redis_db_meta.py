@@ -24,6 +24,7 @@ from backend.db_meta.api.cluster.nosqlcomm.create_cluster import update_cluster_
 from backend.db_meta.api.cluster.tendiscache.handler import TendisCacheClusterHandler
 from backend.db_meta.api.cluster.tendispluscluster.handler import TendisPlusClusterHandler
 from backend.db_meta.api.cluster.tendisssd.handler import TendisSSDClusterHandler
+from backend.db_meta.change_feed import InstanceKind, record_instance_id_changes
 from backend.db_meta.enums import (
     AccessLayer,
     ClusterEntryType,
@@ -434,9 +435,9 @@ class RedisDBMeta(object):
         """"""
         with atomic():
             for slave_info in self.cluster["old_slaves"]:
-                StorageInstance.objects.filter(machine__ip=slave_info["ip"], port__in=slave_info["ports"]).update(
-                    status=InstanceStatus.UNAVAILABLE
-                )
+                old_slaves = StorageInstance.objects.filter(machine__ip=slave_info["ip"], port__in=slave_info["ports"])
+                old_slaves.update(status=InstanceStatus.UNAVAILABLE)
+                record_instance_id_changes(InstanceKind.STORAGE, old_slaves.values_list("id", flat=True))
                 logger.info(
                     "update old_slave {} ports: {} status to UNAVAILABLE".format(slave_info["ip"], slave_info["ports"])
                 )
@@ -481,13 +482,14 @@ class RedisDBMeta(object):
         with atomic():
             machine_obj = Machine.objects.get(ip=self.cluster["meta_update_ip"])
             if machine_obj.access_layer == AccessLayer.PROXY.value:
-                ProxyInstance.objects.filter(
-                    machine__ip=self.cluster["meta_update_ip"], port__in=self.cluster["meta_update_ports"]
-                ).update(status=self.cluster["meta_update_status"])
+                model, kind = ProxyInstance, InstanceKind.PROXY
             else:
-                StorageInstance.objects.filter(
-                    machine__ip=self.cluster["meta_update_ip"], port__in=self.cluster["meta_update_ports"]
-                ).update(status=self.cluster["meta_update_status"])
+                model, kind = StorageInstance, InstanceKind.STORAGE
+            instances = model.objects.filter(
+                machine__ip=self.cluster["meta_update_ip"], port__in=self.cluster["meta_update_ports"]
+            )
+            instances.update(status=self.cluster["meta_update_status"])
+            record_instance_id_changes(kind, instances.values_list("id", flat=True))
         return True
 
     def instances_failover_4_scene(self) -> bool:
@@ -730,7 +732,7 @@ class RedisDBMeta(object):
         polaris_entry.save()
 
     def tendis_add_clb_domain_4_scene(self):
-        """ 增加CLB 域名 """
+        """增加CLB 域名"""
         cluster = Cluster.objects.get(
             bk_cloud_id=self.cluster["bk_cloud_id"], immute_domain=self.cluster["immute_domain"]
         )
@@ -746,7 +748,7 @@ class RedisDBMeta(object):
         cluster_entry.save()
 
     def tendis_bind_clb_domain_4_scene(self):
-        """ 主域名直接指向CLB """
+        """主域名直接指向CLB"""
         cluster = Cluster.objects.get(
             bk_cloud_id=self.cluster["bk_cloud_id"], immute_domain=self.cluster["immute_domain"]
         )
@@ -762,7 +764,7 @@ class RedisDBMeta(object):
 
     # 主域名解绑CLB
     def tendis_unBind_clb_domain_4_scene(self):
-        """ 主域名解绑CLB """
+        """主域名解绑CLB"""
         cluster = Cluster.objects.get(
             bk_cloud_id=self.cluster["bk_cloud_id"], immute_domain=self.cluster["immute_domain"]
         )
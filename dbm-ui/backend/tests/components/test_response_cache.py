@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import uuid
+from unittest.mock import MagicMock
+
+import pytest
+from django.core.cache import cache
+
+from backend.components.response_cache import ResponseCache
+
+
+@pytest.fixture
+def cache_key():
+    key = f"test_response_cache:{uuid.uuid4().hex}"
+    yield key
+    cache.delete(key)
+
+
+class TestResponseCache:
+    def test_mutate_response_not_affect_cache(self, cache_key):
+        response_cache = ResponseCache()
+        fetch_func = MagicMock(return_value={"result": True, "data": [{"bk_cloud_id": 0}]})
+
+        # 未命中、本地命中、远程命中返回的都是副本
+        response = response_cache.fetch("test_api", cache_key, 60, fetch_func)
+        response["data"][0]["bk_cloud_name"] = "default area"
+        response = response_cache.fetch("test_api", cache_key, 60, fetch_func)
+        response["data"].append({"bk_cloud_id": 1})
+        response_cache.local_cache.clear()
+        response = response_cache.fetch("test_api", cache_key, 60, fetch_func)
+        response["data"].clear()
+
+        assert response_cache.fetch("test_api", cache_key, 60, fetch_func) == {
+            "result": True,
+            "data": [{"bk_cloud_id": 0}],
+        }
+        assert fetch_func.call_count == 1
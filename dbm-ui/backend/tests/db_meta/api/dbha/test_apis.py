@@ -9,12 +9,18 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 import ipaddress
+from unittest.mock import patch
 
 import pytest
 from rest_framework.exceptions import ValidationError
 
 from backend.constants import IP_PORT_DIVIDER
-from backend.db_meta import api, models
+from backend.db_meta import api, change_feed, flatten, models
+from backend.db_meta.change_feed import (
+    DBHA_META_CHANGE_FEED_KEY,
+    DBHA_META_CHANGE_TRIMMED_VERSION_KEY,
+    DBHA_META_CHANGE_VERSION_KEY,
+)
 from backend.db_meta.enums import (
     AccessLayer,
     ClusterPhase,
@@ -25,8 +31,10 @@ from backend.db_meta.enums import (
     InstanceStatus,
     MachineType,
 )
+from backend.flow.utils.redis.redis_db_meta import RedisDBMeta
 from backend.tests.mock_data import constant
 from backend.tests.mock_data.components import cc
+from backend.utils.redis import RedisConn
 
 pytestmark = pytest.mark.django_db
 
@@ -165,6 +173,22 @@ class TestDBHA:
     def test_instance_filter2(self, dbha_fixture):
         assert len(api.dbha.instances(statuses=[InstanceStatus.UNAVAILABLE.value])) == 4
 
+    def test_instance_compact(self, dbha_fixture):
+        infos = api.dbha.instances(compact=True)
+        assert len(infos) == 9
+        assert all(set(info.keys()) <= api.dbha.DBHA_INSTANCE_COMPACT_FIELDS for info in infos)
+
+    def test_flatten_storage_instance(self, dbha_fixture, django_assert_max_num_queries):
+        storages = models.StorageInstance.objects.all()
+        # 查询次数与实例数量无关
+        with django_assert_max_num_queries(10):
+            infos = flatten.storage_instance(storages)
+        assert len(infos) == 6
+        assert list(flatten.storage_instance(storages, iterator=True, chunk_size=4)) == infos
+        assert flatten.storage_instance(storages, fields=["ip", "port"]) == [
+            {"ip": info["ip"], "port": info["port"]} for info in infos
+        ]
+
     def test_update_success(self, dbha_fixture):
         api.dbha.update_status(
             [
@@ -193,6 +217,20 @@ class TestDBHA:
         )
         assert p.cluster.first().status == ClusterStatus.ABNORMAL.value
 
+    def test_bulk_update_with_not_found(self, dbha_fixture):
+        results = api.dbha.update_status(
+            [
+                {"ip": cc.NORMAL_IP2, "port": TEST_STORAGE_PORT1, "status": InstanceStatus.UNAVAILABLE.value},
+                {"ip": cc.IP_NOT_IN_BKCC, "port": TEST_PROXY_PORT1, "status": InstanceStatus.RUNNING.value},
+            ],
+            bk_cloud_id=0,
+            bulk=True,
+        )
+        assert [result["result"] for result in results] == [True, False]
+        assert models.StorageInstance.objects.filter(
+            machine__ip=cc.NORMAL_IP2, port=TEST_STORAGE_PORT1, status=InstanceStatus.UNAVAILABLE.value
+        ).exists()
+
     def test_update_invalid_status(self):
         with pytest.raises(Exception):
             api.dbha.update_status(
@@ -289,3 +327,64 @@ class TestDBHA:
                     }
                 ]
             )
+
+
+@pytest.fixture
+def change_feed_on_commit():
+    keys = [DBHA_META_CHANGE_VERSION_KEY, DBHA_META_CHANGE_FEED_KEY, DBHA_META_CHANGE_TRIMMED_VERSION_KEY]
+    RedisConn.delete(*keys)
+    # 测试用例运行在事务中，变更需要立即写入变更流
+    with patch.object(change_feed.transaction, "on_commit", side_effect=lambda func: func()):
+        yield
+    RedisConn.delete(*keys)
+
+
+class TestDBHAInstanceChanges:
+    def test_full_resync(self, change_feed_on_commit, dbha_fixture):
+        version, __ = change_feed.get_version_range()
+        assert api.dbha.instance_changes(since_version=0)["full"]
+        assert len(api.dbha.instance_changes(since_version=0)["changes"]) == 9
+        assert not api.dbha.instance_changes(since_version=version - 1)["full"]
+        # 版本号异常(大于当前版本)时全量拉取
+        assert api.dbha.instance_changes(since_version=version + 1)["full"]
+
+        # 客户端的版本号早于已裁剪的版本时，变更流不完整，需要全量拉取
+        RedisConn.set(DBHA_META_CHANGE_TRIMMED_VERSION_KEY, version - 1)
+        result = api.dbha.instance_changes(since_version=version - 2)
+        assert result["full"]
+        assert result["version"] == version
+        assert len(result["changes"]) == 9
+
+    def test_incremental_changes(self, change_feed_on_commit, dbha_fixture):
+        version, __ = change_feed.get_version_range()
+        storage = models.StorageInstance.objects.get(machine__ip=cc.NORMAL_IP2, port=TEST_STORAGE_PORT1)
+        storage.status = InstanceStatus.UNAVAILABLE
+        storage.save()
+        proxy = models.ProxyInstance.objects.get(machine__ip=cc.NORMAL_IP, port=TEST_PROXY_PORT1)
+        proxy.save()
+
+        result = api.dbha.instance_changes(since_version=version, statuses=[InstanceStatus.RUNNING])
+        assert not result["full"]
+        assert result["version"] > version
+        # 不再满足过滤条件的实例需要客户端移除
+        assert [(inst["ip"], inst["port"]) for inst in result["changes"]] == [(cc.NORMAL_IP, TEST_PROXY_PORT1)]
+        assert result["deleted"] == [f"{cc.NORMAL_IP2}{IP_PORT_DIVIDER}{TEST_STORAGE_PORT1}"]
+
+        # 拉取到最新版本后没有新的变化
+        assert api.dbha.instance_changes(since_version=result["version"])["changes"] == []
+
+    def test_redis_instances_status_update(self, change_feed_on_commit, dbha_fixture):
+        version, __ = change_feed.get_version_range()
+        RedisDBMeta(
+            ticket_data={},
+            cluster={
+                "meta_update_ip": cc.NORMAL_IP,
+                "meta_update_ports": [TEST_PROXY_PORT1, TEST_PROXY_PORT2],
+                "meta_update_status": InstanceStatus.UNAVAILABLE,
+            },
+        ).instances_status_update()
+
+        # queryset.update 不会触发信号，需要显式记录到变更流
+        result = api.dbha.instance_changes(since_version=version)
+        assert sorted(inst["port"] for inst in result["changes"]) == [TEST_PROXY_PORT1, TEST_PROXY_PORT2]
+        assert {inst["status"] for inst in result["changes"]} == {InstanceStatus.UNAVAILABLE.value}
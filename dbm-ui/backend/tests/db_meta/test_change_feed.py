@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import patch
+
+import pytest
+
+from backend.db_meta import change_feed
+from backend.db_meta.change_feed import (
+    DBHA_META_CHANGE_FEED_KEY,
+    DBHA_META_CHANGE_TRIMMED_VERSION_KEY,
+    DBHA_META_CHANGE_VERSION_KEY,
+    InstanceKind,
+    get_changes,
+    get_version_range,
+)
+from backend.utils.redis import RedisConn
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clean_change_feed():
+    keys = [DBHA_META_CHANGE_VERSION_KEY, DBHA_META_CHANGE_FEED_KEY, DBHA_META_CHANGE_TRIMMED_VERSION_KEY]
+    RedisConn.delete(*keys)
+    # 测试用例运行在事务中，变更需要立即写入变更流
+    with patch.object(change_feed.transaction, "on_commit", side_effect=lambda func: func()):
+        yield
+    RedisConn.delete(*keys)
+
+
+class TestChangeFeed:
+    def test_version_ordering(self):
+        change_feed._record_changes(["storage:1:127.0.0.1:20000"])
+        first_version, trimmed_version = get_version_range()
+        # 版本号以毫秒时间戳初始化，初始化之前的版本都视为已裁剪
+        assert first_version == trimmed_version + 1
+
+        change_feed._record_changes(["proxy:2:127.0.0.1:10000"])
+        change_feed._record_changes(["storage:1:127.0.0.1:20000"])
+        version, __ = get_version_range()
+        assert version == first_version + 2
+
+        # 再次变化的实例以最新版本号记录
+        assert get_changes(first_version) == {
+            InstanceKind.STORAGE: {1: "127.0.0.1:20000"},
+            InstanceKind.PROXY: {2: "127.0.0.1:10000"},
+        }
+        assert get_changes(version - 1) == {InstanceKind.STORAGE: {1: "127.0.0.1:20000"}}
+        assert get_changes(version) == {}
+        assert get_changes(first_version, version - 1) == {InstanceKind.PROXY: {2: "127.0.0.1:10000"}}
+
+    @patch.object(change_feed, "DBHA_META_CHANGE_FEED_MAX_LENGTH", 2)
+    def test_trim(self):
+        versions = []
+        for inst_id in range(1, 5):
+            change_feed._record_changes([f"storage:{inst_id}:127.0.0.1:{20000 + inst_id}"])
+            versions.append(get_version_range()[0])
+
+        # 只保留最近的 2 个实例，已裁剪的版本号为最后一个被移除的实例的版本
+        assert RedisConn.zcard(DBHA_META_CHANGE_FEED_KEY) == 2
+        assert get_version_range() == (versions[-1], versions[1])
+        assert get_changes(versions[1]) == {InstanceKind.STORAGE: {3: "127.0.0.1:20003", 4: "127.0.0.1:20004"}}
+
+    def test_record_failed_not_raise(self):
+        with patch.object(change_feed, "_record_changes_script", side_effect=ConnectionError):
+            change_feed._record_changes(["storage:1:127.0.0.1:20000"])
+        assert get_version_range() == (0, 0)
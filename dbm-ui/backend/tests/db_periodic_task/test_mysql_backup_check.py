@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+
+from backend.db_meta.enums import ClusterType
+from backend.db_meta.models import Cluster
+from backend.db_periodic_task.local_tasks.mysql_backup.check_binlog_backup import _check_binlog_backup
+from backend.db_periodic_task.local_tasks.mysql_backup.check_full_backup import _check_tendbha_full_backup
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def tendbha_cluster():
+    return Cluster.objects.create(
+        bk_biz_id=1, name="backup-check", immute_domain="backup-check.db", cluster_type=ClusterType.TenDBHA.value
+    )
+
+
+def full_backup_file(cluster, file_type):
+    return {
+        "backup_id": "backup-1",
+        "cluster_id": cluster.id,
+        "cluster_domain": cluster.immute_domain,
+        "data_schema_grant": "all",
+        "file_name": f"backup-1.{file_type}",
+        "file_size": 1,
+        "file_type": file_type,
+    }
+
+
+class TestMysqlBackupCheck:
+    def test_binlog_report_cluster_type(self, tendbha_cluster):
+        binlogs = [
+            {
+                "mysql_host": "127.0.0.1",
+                "mysql_port": 20000,
+                "mysql_role": "master",
+                "backup_status": 4,
+                "file_name": f"binlog20000.{suffix}",
+            }
+            for suffix in ["000001", "000003"]
+        ]
+        reports = _check_binlog_backup(ClusterType.TenDBHA, {tendbha_cluster.id: binlogs})
+        # 报告记录的是实际的集群类型，而不是固定的 TenDBCluster
+        assert [report.cluster_type for report in reports] == [ClusterType.TenDBHA]
+
+    def test_full_backup_missing_index_or_priv(self, tendbha_cluster):
+        # 只上报了 tar 文件的备份，index/priv 保持为空，判定为备份不完整
+        reports = _check_tendbha_full_backup({tendbha_cluster.id: [full_backup_file(tendbha_cluster, "tar")]})
+        assert [report.cluster for report in reports] == [tendbha_cluster.immute_domain]
+
+        backup_files = [full_backup_file(tendbha_cluster, file_type) for file_type in ["index", "priv", "tar"]]
+        assert _check_tendbha_full_backup({tendbha_cluster.id: backup_files}) == []
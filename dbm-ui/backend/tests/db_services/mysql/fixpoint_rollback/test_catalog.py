@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+
+from backend.db_periodic_task.local_tasks.mysql_backup_catalog import sync_mysql_backup_catalog
+from backend.db_services.mysql.fixpoint_rollback import catalog
+from backend.db_services.mysql.fixpoint_rollback.catalog import (
+    get_synced_range,
+    ingest_backup_logs,
+    ingest_binlog_logs,
+    query_catalog_backup_logs,
+    query_catalog_binlogs,
+    set_synced_range,
+)
+from backend.db_services.mysql.fixpoint_rollback.constants import BACKUP_CATALOG_SYNC_LOCK_KEY
+from backend.db_services.mysql.fixpoint_rollback.handlers import FixPointRollbackHandler
+from backend.utils.redis import JSONSerializer
+from backend.utils.time import datetime2str
+
+pytestmark = pytest.mark.django_db
+
+
+class JSONCache:
+    """按默认缓存的 JSON 序列化方式存取，模拟 django_redis 的读写"""
+
+    def __init__(self):
+        self.serializer = JSONSerializer({})
+        self.data = {}
+
+    def get(self, key, default=None):
+        return self.serializer.loads(self.data[key]) if key in self.data else default
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = self.serializer.dumps(value)
+
+
+@pytest.fixture
+def json_cache():
+    with patch.object(catalog, "cache", JSONCache()) as cache:
+        yield cache
+
+
+def _backup_log(backup_id, host, backup_time):
+    return {
+        "cluster_id": 1,
+        "backup_id": backup_id,
+        "backup_host": host,
+        "backup_port": 20000,
+        "mysql_role": "slave",
+        "consistent_backup_time": datetime2str(backup_time),
+    }
+
+
+def _binlog(task_id, start_time, stop_time):
+    return {
+        "cluster_id": 1,
+        "host": "127.0.0.1",
+        "port": 20000,
+        "task_id": task_id,
+        "filename": f"binlog20000.{task_id}",
+        "start_time": datetime2str(start_time),
+        "stop_time": datetime2str(stop_time),
+    }
+
+
+class TestBackupCatalog:
+    def test_query_backup_logs(self):
+        now = timezone.now()
+        logs = [
+            _backup_log("b1", "127.0.0.1", now - timedelta(days=2)),
+            _backup_log("b2", "127.0.0.1", now - timedelta(hours=1)),
+            # 同一个备份的不同实例，备份时间落在查询范围外也需要返回
+            _backup_log("b2", "127.0.0.2", now + timedelta(minutes=1)),
+        ]
+        assert ingest_backup_logs(logs) == 3
+        # 重复写入会被忽略
+        ingest_backup_logs(logs)
+
+        results = query_catalog_backup_logs(1, now - timedelta(days=1), now)
+        assert [(log["backup_id"], log["backup_host"]) for log in results] == [
+            ("b2", "127.0.0.1"),
+            ("b2", "127.0.0.2"),
+        ]
+
+    def test_query_binlogs(self):
+        now = timezone.now()
+        ingest_binlog_logs(
+            [
+                _binlog(1, now - timedelta(hours=3), now - timedelta(hours=2)),
+                _binlog(2, now - timedelta(hours=2), now - timedelta(hours=1)),
+                _binlog(3, now - timedelta(hours=1), now),
+            ]
+        )
+
+        results = query_catalog_binlogs("127.0.0.1", 20000, now - timedelta(minutes=90), now - timedelta(minutes=30))
+        assert [log["task_id"] for log in results] == [2, 3]
+
+    def test_skip_invalid_logs(self):
+        now = timezone.now()
+        backup_log = _backup_log("b1", "127.0.0.1", now)
+        backup_log.pop("backup_port")
+        binlog = _binlog(1, now - timedelta(hours=1), now)
+        binlog.pop("filename")
+
+        # 缺少字段的记录被跳过，不影响同一批次的其他记录
+        assert ingest_backup_logs([backup_log, _backup_log("b2", "127.0.0.1", now)]) == 1
+        assert ingest_binlog_logs([binlog, _binlog(2, now - timedelta(hours=1), now)]) == 1
+
+
+class TestSyncedRange:
+    def test_synced_range_round_trip(self, json_cache):
+        since, until = timezone.now() - timedelta(days=1), timezone.now()
+        set_synced_range(since, until)
+
+        synced_since, synced_until = get_synced_range()
+        assert timezone.is_aware(synced_since) and timezone.is_aware(synced_until)
+        assert abs((synced_since - since).total_seconds()) < 1e-3
+        assert abs((synced_until - until).total_seconds()) < 1e-3
+
+    @patch("backend.db_periodic_task.local_tasks.mysql_backup_catalog.query_bklog_logs", return_value=[])
+    def test_sync_twice_and_query(self, mock_query_bklog_logs, json_cache):
+        # 第二次同步会读取第一次写入的同步范围
+        sync_mysql_backup_catalog()
+        sync_mysql_backup_catalog()
+        synced_since, synced_until = get_synced_range()
+        assert synced_since < synced_until
+
+        now = timezone.now()
+        ingest_binlog_logs([_binlog(1, now - timedelta(hours=2), now - timedelta(hours=1))])
+        handler = FixPointRollbackHandler.__new__(FixPointRollbackHandler)
+        tail_log = {"task_id": 2}
+        with patch.object(FixPointRollbackHandler, "_get_log_from_bklog", return_value=[tail_log]) as mock_bklog:
+            logs = handler._get_log_from_catalog(
+                collector="mysql_binlog_result",
+                start_time=now - timedelta(hours=3),
+                end_time=now,
+                query_string="*",
+                query_catalog=lambda start, end: query_catalog_binlogs("127.0.0.1", 20000, start, end),
+                dedupe_key=lambda log: log["task_id"],
+            )
+
+        # 已同步范围内走本地索引，未同步的尾部从日志平台补齐
+        assert [log["task_id"] for log in logs] == [1, 2]
+        assert mock_bklog.call_args[0][1] == synced_until
+
+    @patch("backend.db_periodic_task.local_tasks.mysql_backup_catalog.query_bklog_logs", return_value=[])
+    def test_skip_overlapping_sync(self, mock_query_bklog_logs, json_cache):
+        cache.add(BACKUP_CATALOG_SYNC_LOCK_KEY, 1, 60)
+        try:
+            sync_mysql_backup_catalog()
+        finally:
+            cache.delete(BACKUP_CATALOG_SYNC_LOCK_KEY)
+
+        mock_query_bklog_logs.assert_not_called()
+        assert get_synced_range() is None
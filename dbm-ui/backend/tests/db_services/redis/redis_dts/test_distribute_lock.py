@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+import uuid
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.utils import timezone
+from redis.exceptions import ConnectionError
+
+from backend.db_services.redis.redis_dts.distribute_lock import (
+    DTS_LOCK_FENCING_TOKEN_KEY,
+    DtsDistributeLock,
+    DualDtsLock,
+    MysqlDtsLock,
+    RedisDtsLock,
+)
+from backend.db_services.redis.redis_dts.models import TbTendisDtsDistributeLock
+from backend.utils.redis import RedisConn
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def lock_key():
+    key = f"test_dts_lock:{uuid.uuid4().hex}"
+    yield key
+    RedisConn.delete(RedisDtsLock._key(key))
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class TestRedisDtsLock:
+    def test_trylock_and_reentry(self, lock_key):
+        lock = RedisDtsLock()
+        token = lock.trylock(lock_key, "server-a", 30)
+        assert token >= now_ms() - 1000
+
+        # 其他持有者加锁失败，重入和续约不改变 token
+        assert lock.trylock(lock_key, "server-b", 30) == 0
+        assert lock.trylock(lock_key, "server-a", 30) == token
+        assert lock.renew([lock_key, f"{lock_key}:lost"], "server-a", 30) == {lock_key: token, f"{lock_key}:lost": 0}
+
+    def test_token_increase_after_unlock(self, lock_key):
+        lock = RedisDtsLock()
+        token = lock.trylock(lock_key, "server-a", 30)
+        assert not lock.unlock(lock_key, "server-b")
+        assert lock.unlock(lock_key, "server-a")
+        assert lock.trylock(lock_key, "server-b", 30) > token
+
+    def test_token_not_rollback_after_counter_lost(self, lock_key):
+        lock = RedisDtsLock()
+        token = lock.trylock(lock_key, "server-a", 30)
+        lock.unlock(lock_key, "server-a")
+
+        # 计数器丢失后以毫秒时间戳兜底
+        RedisConn.delete(DTS_LOCK_FENCING_TOKEN_KEY)
+        assert lock.trylock(lock_key, "server-b", 30) > token
+
+    def test_refuse_lock_when_redis_error(self, lock_key):
+        lock = DtsDistributeLock(backend=RedisDtsLock())
+        with patch.object(lock.backend, "_trylock_script", side_effect=ConnectionError):
+            assert lock.trylock(lock_key, "server-a") == 0
+        with patch.object(lock.backend, "_renew_script", side_effect=ConnectionError):
+            assert lock.renew([lock_key], "server-a") == {lock_key: 0}
+        with patch.object(lock.backend, "_unlock_script", side_effect=ConnectionError):
+            assert not lock.unlock(lock_key, "server-a")
+
+        # redis 异常期间没有在任何存储上加锁
+        assert not TbTendisDtsDistributeLock.objects.filter(lock_key=lock_key).exists()
+
+
+class TestMysqlDtsLock:
+    def test_lease_keep_token(self, lock_key):
+        lock = MysqlDtsLock()
+        token = lock.trylock(lock_key, "server-a", 30)
+        assert token > 0
+        assert lock.trylock(lock_key, "server-b", 30) == 0
+        assert lock.trylock(lock_key, "server-a", 30) == token
+        assert lock.renew([lock_key], "server-a", 30) == {lock_key: token}
+        assert lock.renew([lock_key], "server-b", 30) == {lock_key: 0}
+
+    def test_takeover_expired_lock(self, lock_key):
+        lock = MysqlDtsLock()
+        lock.trylock(lock_key, "server-a", 30)
+        token = now_ms() + 60 * 1000
+        TbTendisDtsDistributeLock.objects.filter(lock_key=lock_key).update(
+            lock_expire_time=timezone.now() - timedelta(seconds=1), fencing_token=token
+        )
+
+        # 即使旧 token 超前于当前时间，新租约的 token 仍然递增
+        new_token = lock.trylock(lock_key, "server-b", 30)
+        assert new_token == TbTendisDtsDistributeLock.objects.get(lock_key=lock_key).fencing_token
+        assert new_token > token
+        assert lock.renew([lock_key], "server-a", 30) == {lock_key: 0}
+
+
+class TestDualDtsLock:
+    def test_exclusive_with_single_backend(self, lock_key):
+        lock = DualDtsLock()
+        # 仍只使用 MySQL 的进程持有锁时，redis 上的锁会被回滚
+        MysqlDtsLock().trylock(lock_key, "server-mysql", 30)
+        assert lock.trylock(lock_key, "server-a", 30) == 0
+        assert RedisDtsLock().trylock(lock_key, "server-redis", 30) > 0
+        RedisDtsLock().unlock(lock_key, "server-redis")
+
+        # 只使用 redis 的进程持有锁时加锁失败
+        TbTendisDtsDistributeLock.objects.filter(lock_key=lock_key).delete()
+        RedisDtsLock().trylock(lock_key, "server-redis", 30)
+        assert lock.trylock(lock_key, "server-a", 30) == 0
+        RedisDtsLock().unlock(lock_key, "server-redis")
+
+    def test_hold_both_backends(self, lock_key):
+        lock = DualDtsLock()
+        token = lock.trylock(lock_key, "server-a", 30)
+        assert token > 0
+        assert RedisDtsLock().trylock(lock_key, "server-b", 30) == 0
+        assert MysqlDtsLock().trylock(lock_key, "server-b", 30) == 0
+        assert lock.renew([lock_key], "server-a", 30) == {lock_key: token}
+
+        # MySQL 上的租约丢失时视为锁已丢失
+        TbTendisDtsDistributeLock.objects.filter(lock_key=lock_key).delete()
+        assert lock.renew([lock_key], "server-a", 30) == {lock_key: 0}
+        assert lock.unlock(lock_key, "server-a")
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import itertools
+from collections import defaultdict
+
+import pytest
+
+from backend.db_meta.enums import ClusterType
+from backend.db_services.redis.redis_dts.constants import DtsOperateType, DtsTaskType
+from backend.db_services.redis.redis_dts.enums import DtsSyncStatus
+from backend.db_services.redis.redis_dts.models import TbTendisDTSJob, TbTendisDtsTask
+from backend.db_services.redis.redis_dts.util import (
+    DTS_TASK_COUNT_FILTERS,
+    dts_jobs_cnt_and_status,
+    is_full_transfer_failed,
+    is_in_full_transfer,
+    is_in_incremental_sync,
+    is_incremental_sync_failed,
+    is_pending_execution,
+    is_transfer_competed,
+    is_transfer_terminated,
+)
+
+pytestmark = pytest.mark.django_db
+
+BILL_ID = 10086
+SRC_DBTYPES = [
+    ClusterType.TendisTendisSSDInstance.value,
+    ClusterType.TendisRedisInstance.value,
+    ClusterType.TendisTendisplusInsance.value,
+    "unknown",
+]
+TASK_TYPES = [task_type.value for task_type in DtsTaskType] + ["", "unknown"]
+STATUSES = [-1, 0, 1, 2, 3]
+SYNC_OPERATES = ["", DtsOperateType.FORCE_KILL_SUCC.value, DtsOperateType.FORCE_KILL_TODO.value]
+MESSAGES = ["", "sync rdb data"]
+
+
+def legacy_task_buckets(task: TbTendisDtsTask):
+    """改造前 dts_job_cnt_and_status 逐个task的分类逻辑"""
+    if is_pending_execution(task):
+        exec_bucket = "pending_exec_cnt"
+    elif task.task_type == DtsTaskType.TENDISSSD_BACKUP.value and task.status == 0:
+        exec_bucket = "pending_exec_cnt"
+    elif task.task_type == DtsTaskType.TENDISSSD_BACKUP.value and task.status == 1:
+        exec_bucket = "running_cnt"
+    elif task.task_type != DtsTaskType.TENDISSSD_BACKUP.value and (task.status == 0 or task.status == 1):
+        exec_bucket = "running_cnt"
+    elif task.status == -1:
+        exec_bucket = "failed_cnt"
+    elif task.status == 2:
+        exec_bucket = "success_cnt"
+    else:
+        exec_bucket = None
+
+    if is_transfer_competed(task):
+        sync_bucket = "transfer_completed_cnt"
+    elif is_transfer_terminated(task):
+        sync_bucket = "transfer_terminated_cnt"
+    elif is_full_transfer_failed(task):
+        sync_bucket = "full_transfer_failed_cnt"
+    elif is_incremental_sync_failed(task):
+        sync_bucket = "incremental_sync_failed_cnt"
+    elif is_in_full_transfer(task):
+        sync_bucket = "full_transfer_running_cnt"
+    elif is_in_incremental_sync(task):
+        sync_bucket = "incremental_sync_running_cnt"
+    else:
+        sync_bucket = None
+    return exec_bucket, sync_bucket
+
+
+def legacy_job_status(tasks):
+    """按改造前的逻辑汇总 job 状态"""
+    counter = defaultdict(int)
+    for task in tasks:
+        for bucket in legacy_task_buckets(task):
+            if bucket:
+                counter[bucket] += 1
+    total_cnt = len(tasks)
+    ret = {
+        "total_cnt": total_cnt,
+        "pending_exec_cnt": counter["pending_exec_cnt"],
+        "running_cnt": counter["running_cnt"],
+        "failed_cnt": counter["failed_cnt"],
+        "success_cnt": counter["success_cnt"],
+    }
+    if counter["pending_exec_cnt"] == total_cnt:
+        ret["status"] = DtsSyncStatus.PENDING_EXECUTION.value
+    elif counter["transfer_completed_cnt"] == total_cnt:
+        ret["status"] = DtsSyncStatus.TRANSFER_COMPLETED.value
+    elif counter["transfer_terminated_cnt"] == total_cnt:
+        ret["status"] = DtsSyncStatus.TRANSFER_TERMINATED.value
+    elif counter["full_transfer_failed_cnt"] > 0:
+        ret["status"] = DtsSyncStatus.FULL_TRANSFER_FAILED.value
+    elif counter["incremental_sync_failed_cnt"] > 0:
+        ret["status"] = DtsSyncStatus.INCREMENTAL_SYNC_FAILED.value
+    elif counter["full_transfer_running_cnt"] > 0:
+        ret["status"] = DtsSyncStatus.IN_FULL_TRANSFER.value
+    elif counter["incremental_sync_running_cnt"] > 0:
+        ret["status"] = DtsSyncStatus.IN_INCREMENTAL_SYNC.value
+    return ret
+
+
+@pytest.fixture
+def dts_tasks():
+    TbTendisDtsTask.objects.bulk_create(
+        [
+            TbTendisDtsTask(
+                bill_id=BILL_ID,
+                src_cluster=f"src{idx}",
+                dst_cluster="dst",
+                src_dbtype=src_dbtype,
+                task_type=task_type,
+                status=status,
+                sync_operate=sync_operate,
+                message=message,
+            )
+            for idx, (src_dbtype, task_type, status, sync_operate, message) in enumerate(
+                itertools.product(SRC_DBTYPES, TASK_TYPES, STATUSES, SYNC_OPERATES, MESSAGES)
+            )
+        ]
+    )
+    return list(TbTendisDtsTask.objects.filter(bill_id=BILL_ID))
+
+
+class TestDtsJobCounter:
+    def test_count_filters_match_legacy_buckets(self, dts_tasks):
+        bucket_ids = defaultdict(set)
+        for task in dts_tasks:
+            for bucket in legacy_task_buckets(task):
+                if bucket:
+                    bucket_ids[bucket].add(task.id)
+
+        for name, count_filter in DTS_TASK_COUNT_FILTERS.items():
+            task_ids = set(TbTendisDtsTask.objects.filter(count_filter, bill_id=BILL_ID).values_list("id", flat=True))
+            assert task_ids == bucket_ids[name], name
+
+    def test_job_status_match_legacy(self, dts_tasks):
+        # 每个 job 包含多个不同分类的 task
+        for task in dts_tasks:
+            task.src_cluster = f"src{task.id % 50}"
+        TbTendisDtsTask.objects.bulk_update(dts_tasks, ["src_cluster"])
+        jobs = [TbTendisDTSJob(bill_id=BILL_ID, src_cluster=f"src{idx}", dst_cluster="dst") for idx in range(51)]
+
+        job_tasks = defaultdict(list)
+        for task in dts_tasks:
+            job_tasks[task.src_cluster].append(task)
+        results = dts_jobs_cnt_and_status(jobs)
+        for job in jobs:
+            assert results[(BILL_ID, job.src_cluster, "dst")] == legacy_job_status(job_tasks[job.src_cluster])
@@ -18,6 +18,7 @@ from rest_framework.permissions import AllowAny
 from rest_framework.test import APIClient
 
 from backend.db_services.taskflow.views.flow import TaskFlowViewSet
+from backend.flow.engine.bamboo.engine import BambooEngine
 from backend.flow.models import FlowNode, FlowTree, StateType
 from backend.tests.mock_data import constant
 from backend.tests.mock_data.components.bklog import BKLogApiMock
@@ -90,3 +91,14 @@ class TestTaskflowApi:
         data = client.get(url, data={"node_id": self.node_id, "version_id": "1"}).data
 
         assert len(data) == 2
+
+
+class TestTaskflowRetrieveEtag:
+    @patch.object(TaskFlowViewSet, "get_permissions", lambda x: [])
+    @patch.object(BambooEngine, "get_pipeline_tree_states_snapshot")
+    def test_unknown_root_id_not_modified(self, mocked_snapshot):
+        # 流程不存在时需要返回 404，而不是按 ETag 返回 304
+        response = client.get("/apis/taskflow/not_exist_root_id/", HTTP_IF_NONE_MATCH='"not_exist_root_id-0-zh-cn"')
+
+        assert response.status_code == 404
+        mocked_snapshot.assert_not_called()
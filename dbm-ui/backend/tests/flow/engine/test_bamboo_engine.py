@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import copy
+from collections import namedtuple
+from types import SimpleNamespace
+from typing import Dict, List
+from unittest.mock import patch
+
+import pytest
+from bamboo_engine import states
+
+from backend.flow.engine.bamboo.engine import BambooEngine
+from backend.flow.models import FlowNode, FlowTree
+from backend.utils.string import i18n_str
+from backend.utils.time import datetime2timestamp
+
+pytestmark = pytest.mark.django_db
+
+ROOT_ID = "r0a2f8a3c7d54f9e8b1c2d3e4f5a6b7c"
+State = namedtuple("State", ["node_id", "parent_id", "name"])
+
+
+def _activity(name):
+    return {"name": name, "type": "ServiceActivity"}
+
+
+def _subprocess(name, activities):
+    return {"name": name, "type": "SubProcess", "pipeline": {"activities": activities}}
+
+
+TREE = {
+    "id": ROOT_ID,
+    "activities": {
+        "act1": _activity("act1"),
+        "sub1": _subprocess(
+            "sub1",
+            {
+                "act2": _activity("act2"),
+                # 尚未开始执行，引擎中没有状态
+                "sub2": _subprocess("sub2", {"act3": _activity("act3")}),
+            },
+        ),
+        "sub3": _subprocess("sub3", {"act4": _activity("act4")}),
+        "sub4": _subprocess("sub4", {"act5": _activity("act5")}),
+    },
+}
+FLOW_NODE_STATUS = {
+    "act1": states.FINISHED,
+    "act2": states.FAILED,
+    "act3": states.CREATED,
+    "act4": states.RUNNING,
+    "act5": states.FINISHED,
+}
+ENGINE_STATES = [
+    State(ROOT_ID, ROOT_ID, states.RUNNING),
+    State("act1", ROOT_ID, states.FINISHED),
+    State("sub1", ROOT_ID, states.RUNNING),
+    State("act2", "sub1", states.FAILED),
+    State("sub3", ROOT_ID, states.RUNNING),
+    State("act4", "sub3", states.REVOKED),
+    State("sub4", ROOT_ID, states.FINISHED),
+    State("act5", "sub4", states.FINISHED),
+]
+
+
+class LegacyBambooEngine(BambooEngine):
+    """改造前逐个子流程查询引擎状态、逐个节点遍历流程树的渲染逻辑"""
+
+    def get_children_states(self, node_id: str):
+        state = next((state for state in ENGINE_STATES if state.node_id == node_id), None)
+        if state is None:
+            return SimpleNamespace(data={})
+        children = {s.node_id: {"state": s.name} for s in ENGINE_STATES if s.parent_id == node_id}
+        return SimpleNamespace(data={node_id: {"state": state.name, "children": children}})
+
+    def recursion_subprocess_status(self, activities: Dict, node_maps: Dict):
+        raw_data = copy.deepcopy(activities)
+        for node_id, activity in raw_data.items():
+            for key, value in activity.items():
+                if value == "SubProcess":
+                    children_status_list = []
+                    children_states = self.get_children_states(node_id=node_id).data
+                    try:
+                        children = children_states[node_id]["children"]
+                        children_status_list = [child["state"] for child in children.values()]
+                        status = children_states[node_id]["state"]
+                        if status == states.RUNNING and states.FAILED in children_status_list:
+                            status = states.FAILED
+                        elif status == states.RUNNING and states.REVOKED in children_status_list:
+                            status = states.REVOKED
+                    except KeyError:
+                        status = states.CREATED
+
+                    act_status = []
+                    self.recursion_subprocess_activity_status(
+                        activity["pipeline"]["activities"], act_status, node_maps
+                    )
+                    if states.FAILED in act_status:
+                        status = states.FAILED
+                    elif states.REVOKED in act_status:
+                        status = states.REVOKED
+
+                    activities[node_id]["status"] = status
+                elif key == "pipeline":
+                    self.recursion_subprocess_status(activities[node_id]["pipeline"]["activities"], node_maps)
+
+    def recursion_subprocess_activity_status(self, activities: Dict, act_status: List, node_maps: Dict):
+        for node_id, activity in activities.items():
+            if activity["type"] == "SubProcess":
+                self.recursion_subprocess_activity_status(activity["pipeline"]["activities"], act_status, node_maps)
+            elif activity["type"] == "ServiceActivity":
+                act_status.append(node_maps[node_id])
+
+    def recursion_nodes_status(self, node: FlowNode, raw_data: Dict):
+        for key, values in raw_data.items():
+            if key == node.node_id:
+                raw_data[key]["status"] = node.status
+                raw_data[key]["created_at"] = datetime2timestamp(node.created_at)
+                raw_data[key]["started_at"] = datetime2timestamp(node.started_at)
+                raw_data[key]["updated_at"] = datetime2timestamp(node.updated_at)
+                raw_data[key]["hosts"] = node.hosts
+            if isinstance(values, dict):
+                self.recursion_nodes_status(node, values)
+
+    def recursion_translate_activity(self, activities: Dict):
+        for activity in activities.values():
+            activity["name"] = i18n_str(activity["name"])
+            if "pipeline" in activity:
+                self.recursion_translate_activity(activity["pipeline"]["activities"])
+
+    def get_pipeline_tree_states(self):
+        tree = self.get_pipeline_tree()
+        nodes = FlowNode.objects.filter(root_id=self.root_id)
+        node_maps = {node.node_id: node.status for node in nodes}
+        self.recursion_subprocess_status(tree["activities"], node_maps)
+        self.recursion_translate_activity(tree["activities"])
+        for node in nodes:
+            self.recursion_nodes_status(node, tree)
+        return tree
+
+
+@pytest.fixture
+def pipeline_tree():
+    FlowTree.objects.create(root_id=ROOT_ID, tree=copy.deepcopy(TREE), bk_biz_id=0, ticket_type="", status="RUNNING")
+    for node_id, status in FLOW_NODE_STATUS.items():
+        FlowNode.objects.create(root_id=ROOT_ID, node_id=node_id, status=status, hosts=[f"127.0.0.{len(node_id)}"])
+
+
+class TestPipelineTreeStates:
+    def test_render_same_as_legacy(self, pipeline_tree):
+        engine = BambooEngine(root_id=ROOT_ID)
+        with patch.object(engine.runtime, "get_state_by_root", return_value=ENGINE_STATES):
+            tree = engine.get_pipeline_tree_states()
+
+        assert tree == LegacyBambooEngine(root_id=ROOT_ID).get_pipeline_tree_states()
+        activities = tree["activities"]
+        # 子流程内的任务失败，即使子流程本身没有引擎状态也向上传递
+        assert activities["sub1"]["status"] == states.FAILED
+        assert activities["sub1"]["pipeline"]["activities"]["sub2"]["status"] == states.CREATED
+        assert activities["sub3"]["status"] == states.REVOKED
+        assert activities["sub4"]["status"] == states.FINISHED
+        assert activities["act1"]["hosts"] == ["127.0.0.4"]
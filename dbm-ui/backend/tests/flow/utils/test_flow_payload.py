@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+
+from backend.flow.utils.flow_payload import (
+    FLOW_PAYLOAD_REF_KEY,
+    externalize_pipeline_payloads,
+    resolve_payload_refs,
+    save_flow_payloads,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def _act(node_id, kwargs):
+    return {
+        "id": node_id,
+        "type": "ServiceActivity",
+        "component": {"code": "test", "inputs": {"kwargs": {"type": "plain", "value": kwargs}}},
+    }
+
+
+def _pipeline(global_data, activities):
+    return {
+        "data": {"inputs": {"${global_data}": {"type": "plain", "value": global_data}}},
+        "activities": {act["id"]: act for act in activities},
+    }
+
+
+class TestFlowPayload:
+    def test_externalize_and_resolve(self):
+        global_data = {"uid": 1, "infos": [{"ip": f"127.0.0.{i}", "port": 30000} for i in range(50)]}
+        payload = {"cluster": {"instances": [f"127.0.0.{i}:30000" for i in range(100)]}}
+        sub_pipeline = _pipeline(global_data, [_act("act2", {**payload, "node_id": "act2", "node_name": "b"})])
+        pipeline = _pipeline(
+            global_data,
+            [
+                _act("act1", {**payload, "node_id": "act1", "node_name": "a"}),
+                {"id": "sub", "type": "SubProcess", "pipeline": sub_pipeline},
+                _act("act3", {"node_id": "act3", "node_name": "small"}),
+            ],
+        )
+
+        payloads = externalize_pipeline_payloads(pipeline)
+        save_flow_payloads(payloads)
+
+        # 相同内容的全局参数和节点参数各只存储一份，过小的参数仍然内嵌
+        assert len(payloads) == 2
+        act1_kwargs = pipeline["activities"]["act1"]["component"]["inputs"]["kwargs"]["value"]
+        act2_kwargs = sub_pipeline["activities"]["act2"]["component"]["inputs"]["kwargs"]["value"]
+        assert act1_kwargs[FLOW_PAYLOAD_REF_KEY] == act2_kwargs[FLOW_PAYLOAD_REF_KEY]
+        assert act1_kwargs["node_id"] == "act1"
+        assert pipeline["activities"]["act3"]["component"]["inputs"]["kwargs"]["value"] == {
+            "node_id": "act3",
+            "node_name": "small",
+        }
+
+        resolved = resolve_payload_refs(
+            {"kwargs": act2_kwargs, "global_data": sub_pipeline["data"]["inputs"]["${global_data}"]["value"]}
+        )
+        assert resolved["kwargs"] == {**payload, "node_id": "act2", "node_name": "b"}
+        assert resolved["global_data"] == global_data
+        assert resolve_payload_refs({"kwargs": {"node_id": "act3"}}) == {}
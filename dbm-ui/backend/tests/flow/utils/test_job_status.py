@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+
+from backend.flow.utils import job_status
+from backend.flow.utils.job_status import (
+    JOB_STATUS_CACHE_KEY_TPL,
+    JOB_STATUS_PENDING_KEY,
+    JOB_STATUS_POLL_CLAIM_TIMEOUT,
+    JOB_STATUS_POLL_COUNT_KEY,
+    JOB_STATUS_REGISTER_KEY,
+    get_job_instance_status,
+    poll_pending_job_instance_status,
+)
+from backend.utils.redis import RedisConn
+
+JOB_INSTANCE_ID = 10086
+RUNNING_RESP = {"result": True, "data": {"finished": False}}
+FINISHED_RESP = {"result": True, "data": {"finished": True}}
+
+
+@pytest.fixture(autouse=True)
+def clean_job_status():
+    def _clean():
+        RedisConn.delete(JOB_STATUS_PENDING_KEY, JOB_STATUS_REGISTER_KEY, JOB_STATUS_POLL_COUNT_KEY)
+        cache.delete(JOB_STATUS_CACHE_KEY_TPL.format(job_instance_id=JOB_INSTANCE_ID))
+
+    _clean()
+    yield
+    _clean()
+
+
+@pytest.fixture
+def now():
+    with patch.object(job_status, "time") as mock_time:
+        mock_time.time.return_value = 1000
+        yield mock_time
+
+
+class TestJobStatus:
+    def test_poll_due_jobs_only(self, now):
+        with patch.object(job_status, "query_job_instance_status", return_value=RUNNING_RESP) as mock_query:
+            get_job_instance_status(JOB_INSTANCE_ID)
+            # 未到轮询时间
+            assert poll_pending_job_instance_status() == []
+
+            now.time.return_value = 1002
+            assert poll_pending_job_instance_status() == [JOB_INSTANCE_ID]
+            # 重复登记不会重置已退避的轮询时间
+            get_job_instance_status(JOB_INSTANCE_ID)
+            assert poll_pending_job_instance_status() == []
+            assert mock_query.call_count == 2
+
+            mock_query.return_value = FINISHED_RESP
+            now.time.return_value = 1010
+            assert poll_pending_job_instance_status() == [JOB_INSTANCE_ID]
+
+        assert not RedisConn.exists(JOB_STATUS_PENDING_KEY, JOB_STATUS_REGISTER_KEY, JOB_STATUS_POLL_COUNT_KEY)
+
+    def test_overlapping_poll_skip_claimed_jobs(self, now):
+        overlapped_polls = []
+
+        def _query(job_instance_id):
+            # 上一批次尚未完成时，下一次周期任务不会重复认领同一任务
+            overlapped_polls.append(poll_pending_job_instance_status())
+            return RUNNING_RESP
+
+        with patch.object(job_status, "query_job_instance_status", return_value=RUNNING_RESP):
+            get_job_instance_status(JOB_INSTANCE_ID)
+        now.time.return_value = 1002
+        with patch.object(job_status, "query_job_instance_status", side_effect=_query):
+            assert poll_pending_job_instance_status() == [JOB_INSTANCE_ID]
+
+        assert overlapped_polls == [[]]
+        assert RedisConn.hget(JOB_STATUS_POLL_COUNT_KEY, JOB_INSTANCE_ID) == "1"
+        assert RedisConn.zscore(JOB_STATUS_PENDING_KEY, JOB_INSTANCE_ID) < 1002 + JOB_STATUS_POLL_CLAIM_TIMEOUT
+
+    def test_failed_response_not_cached(self, now):
+        with patch.object(job_status, "query_job_instance_status", return_value={"result": False}):
+            assert get_job_instance_status(JOB_INSTANCE_ID) == {"result": False}
+        assert cache.get(JOB_STATUS_CACHE_KEY_TPL.format(job_instance_id=JOB_INSTANCE_ID)) is None
+        assert RedisConn.zscore(JOB_STATUS_PENDING_KEY, JOB_INSTANCE_ID) is not None
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from backend.flow.utils.pipeline_tree import insensitive_pipeline_tree
+
+
+class TestInsensitivePipelineTree:
+    def test_strip_inputs(self):
+        tree = {
+            "id": "root",
+            "data": {"inputs": {"${global_data}": {"value": {"password": "xxx"}}}, "outputs": []},
+            "activities": {
+                "act": {"id": "act", "component": {"code": "test", "inputs": {"kwargs": {"value": {"pwd": "xxx"}}}}},
+                "sub": {"id": "sub", "pipeline": {"data": {"inputs": {}}, "activities": {}}},
+            },
+            "flows": {"flow": {"source": "act", "target": "sub"}},
+        }
+
+        insensitive_tree = insensitive_pipeline_tree(tree)
+
+        assert insensitive_tree == {
+            "id": "root",
+            "data": {"outputs": []},
+            "activities": {
+                "act": {"id": "act", "component": {"code": "test"}},
+                "sub": {"id": "sub", "pipeline": {"data": {}, "activities": {}}},
+            },
+            "flows": {"flow": {"source": "act", "target": "sub"}},
+        }
+        # 原流程树用于运行，不能被修改
+        assert "kwargs" in tree["activities"]["act"]["component"]["inputs"]
+        assert "inputs" in tree["data"]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+
+from backend.ticket.constants import EXCLUSIVE_TICKET_MATRIX_PATH, TicketType
+from backend.ticket.exclusive_matrix import ExclusiveTicketMatrix, compile_exclusive_ticket_matrix
+
+
+class TestExclusiveTicketMatrix:
+    def test_bitset_lookup(self):
+        matrix = ExclusiveTicketMatrix(
+            {
+                TicketType.MYSQL_MASTER_SLAVE_SWITCH: [TicketType.MYSQL_MASTER_FAIL_OVER],
+                TicketType.MYSQL_MASTER_FAIL_OVER: [TicketType.MYSQL_MASTER_SLAVE_SWITCH],
+            }
+        )
+
+        assert matrix.is_exclusive(TicketType.MYSQL_MASTER_SLAVE_SWITCH, TicketType.MYSQL_MASTER_FAIL_OVER)
+        assert not matrix.is_exclusive(TicketType.MYSQL_MASTER_SLAVE_SWITCH, TicketType.MYSQL_MASTER_SLAVE_SWITCH)
+        assert not matrix.is_exclusive(TicketType.MYSQL_HA_APPLY, TicketType.MYSQL_MASTER_FAIL_OVER)
+        assert matrix.exclusive_types(TicketType.MYSQL_MASTER_FAIL_OVER) == (TicketType.MYSQL_MASTER_SLAVE_SWITCH,)
+
+    def test_compiled_matrix_up_to_date(self):
+        """修改 exclusive_ticket.xlsx 后需要执行 compile_exclusive_ticket_matrix 重新生成"""
+        with open(EXCLUSIVE_TICKET_MATRIX_PATH, encoding="utf-8") as f:
+            assert json.load(f) == compile_exclusive_ticket_matrix()
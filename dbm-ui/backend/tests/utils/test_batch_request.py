@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import asyncio
+import threading
+import time
+
+from backend.components.base import AsyncDataAPI
+from backend.utils.batch_request import abatch_request, async_batch_request, iter_batch_request
+
+PAGE_LIMIT = 10
+TOTAL_COUNT = 45
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class FakeAsyncApi:
+    """按分页返回 0 ~ TOTAL_COUNT 的异步接口，越靠后的分页返回越快，起始位置不小于 block_from 的分页一直阻塞"""
+
+    def __init__(self, block_from=TOTAL_COUNT):
+        self.block_from = block_from
+        self.cancelled = []
+
+    async def __call__(self, params):
+        start = params["page"]["start"]
+        try:
+            if start >= self.block_from:
+                await asyncio.Event().wait()
+            await asyncio.sleep((TOTAL_COUNT - start) / 1000)
+        except asyncio.CancelledError:
+            self.cancelled.append(start)
+            raise
+        return {"count": TOTAL_COUNT, "info": list(range(start, min(start + PAGE_LIMIT, TOTAL_COUNT)))}
+
+
+class ConcurrencyCounter:
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+    def __exit__(self, *args):
+        with self._lock:
+            self.running -= 1
+
+
+class FakeDataAPI:
+    def __init__(self, base, counter):
+        self.base = base
+        self.counter = counter
+
+    def __call__(self, params=None, **kwargs):
+        with self.counter:
+            time.sleep(0.02)
+        return params
+
+
+class FakeApi:
+    """FakeAsyncApi 的同步版本，记录已发出的分页请求"""
+
+    def __init__(self):
+        self.started = []
+
+    def __call__(self, params):
+        start, limit = params["page"]["start"], params["page"]["limit"]
+        # 忽略获取总数的请求
+        if limit == PAGE_LIMIT:
+            self.started.append(start)
+        time.sleep((TOTAL_COUNT - start) / 1000)
+        return {"count": TOTAL_COUNT, "info": list(range(start, min(start + limit, TOTAL_COUNT)))}
+
+
+class TestIterBatchRequest:
+    def test_in_order(self):
+        pages = list(iter_batch_request(FakeApi(), {}, limit=PAGE_LIMIT))
+        assert [page[0] for page in pages] == [0, 10, 20, 30, 40]
+        assert sum(pages, []) == list(range(TOTAL_COUNT))
+
+    def test_max_in_flight(self):
+        api = FakeApi()
+        for consumed, page in enumerate(iter_batch_request(api, {}, limit=PAGE_LIMIT, max_in_flight=2), start=1):
+            # 分页未被消费前，最多只会多发出 max_in_flight - 1 个请求
+            assert len(api.started) <= consumed + 1
+        assert sorted(api.started) == [0, 10, 20, 30, 40]
+
+    def test_early_exit(self):
+        api = FakeApi()
+        pages = iter_batch_request(api, {}, limit=PAGE_LIMIT, max_in_flight=2)
+        assert next(pages) == list(range(0, 10))
+        pages.close()
+        assert len(api.started) <= 2
+
+
+class TestAsyncBatchRequest:
+    def test_in_order(self):
+        assert async_batch_request(FakeAsyncApi(), {}, limit=PAGE_LIMIT) == list(range(TOTAL_COUNT))
+
+    def test_as_completed(self):
+        async def collect():
+            return [page async for page in abatch_request(FakeAsyncApi(), {}, limit=PAGE_LIMIT)]
+
+        pages = run(collect())
+        # 第一页用于获取总数，其余分页按完成顺序返回
+        assert [page[0] for page in pages] == [0, 40, 30, 20, 10]
+
+    def test_cancel_on_early_exit(self):
+        api = FakeAsyncApi(block_from=20)
+
+        async def first_two_pages():
+            pages = abatch_request(api, {}, limit=PAGE_LIMIT, in_order=True)
+            result = [await pages.__anext__(), await pages.__anext__()]
+            await pages.aclose()
+            # 让被取消的请求执行到取消点
+            await asyncio.sleep(0)
+            return result
+
+        assert run(first_two_pages()) == [list(range(0, 10)), list(range(10, 20))]
+        assert sorted(api.cancelled) == [20, 30, 40]
+
+    def test_upstream_semaphore(self):
+        cmdb_counter, job_counter = ConcurrencyCounter(), ConcurrencyCounter()
+        cmdb_apis = [
+            AsyncDataAPI(FakeDataAPI("http://cmdb.example.com/api/c/", cmdb_counter), max_concurrency=2),
+            AsyncDataAPI(FakeDataAPI("http://cmdb.example.com/api/v3/", cmdb_counter), max_concurrency=2),
+        ]
+        job_api = AsyncDataAPI(FakeDataAPI("http://job.example.com/api/", job_counter), max_concurrency=2)
+
+        async def fanout():
+            calls = [api({"idx": idx}) for idx in range(4) for api in cmdb_apis]
+            calls += [job_api({"idx": idx}) for idx in range(4)]
+            return await asyncio.gather(*calls)
+
+        assert run(fanout())[:2] == [{"idx": 0}, {"idx": 0}]
+        # 同一 upstream 的不同接口共享信号量，不同 upstream 之间互不影响
+        assert cmdb_counter.max_running == 2
+        assert job_counter.max_running == 2
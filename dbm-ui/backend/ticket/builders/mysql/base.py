@@ -84,7 +84,7 @@ class MySQLBaseOperateDetailSerializer(SkipToRepresentationMixin, serializers.Se
 
     def validate_cluster_can_access(self, attrs):
         """校验集群状态是否可以提单"""
-        clusters = Cluster.objects.filter(id__in=fetch_cluster_ids(details=attrs))
+        clusters = Cluster.attach_status_flags(list(Cluster.objects.filter(id__in=fetch_cluster_ids(details=attrs))))
         ticket_type = self.context["ticket_type"]
 
         for cluster in clusters:
@@ -42,7 +42,9 @@ class MySQLHaFullBackupDetailSerializer(MySQLBaseOperateDetailSerializer):
         try:
             self.validate_cluster_can_access(attrs)
         except serializers.ValidationError as e:
-            clusters = Cluster.objects.filter(id__in=fetch_cluster_ids(details=attrs))
+            clusters = Cluster.attach_status_flags(
+                list(Cluster.objects.filter(id__in=fetch_cluster_ids(details=attrs)))
+            )
             id__cluster = {cluster.id: cluster for cluster in clusters}
             # 如果备份位置选的是master，但是slave异常，则认为是可以的
             for info in attrs["infos"]["clusters"]:
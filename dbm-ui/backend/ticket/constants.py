@@ -100,6 +100,8 @@ BAMBOO_STATE__TICKET_STATE_MAP = {
 }
 
 EXCLUSIVE_TICKET_EXCEL_PATH = "backend/ticket/exclusive_ticket.xlsx"
+# 由 exclusive_ticket.xlsx 编译生成的互斥矩阵，修改 excel 后需执行 compile_exclusive_ticket_matrix 重新生成
+EXCLUSIVE_TICKET_MATRIX_PATH = "backend/ticket/exclusive_ticket_matrix.json"
 
 
 class TicketType(str, StructuredEnum):
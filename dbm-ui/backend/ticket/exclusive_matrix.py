@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+TencentBlueKing is pleased to support the open source community by making 蓝鲸智云-DB管理系统(BlueKing-BK-DBM) available.
+Copyright (C) 2017-2023 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at https://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+
+单据执行互斥矩阵：
+- exclusive_ticket.xlsx 由 compile_exclusive_ticket_matrix 命令编译为 exclusive_ticket_matrix.json，运行时不再解析 excel
+- 加载后每种单据类型对应一个位图，(当前单据类型, 运行中单据类型) 的互斥判断为一次位运算
+"""
+import json
+import logging
+import os
+from collections import defaultdict
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Iterable, List
+
+from django.utils import translation
+
+from backend.ticket.constants import EXCLUSIVE_TICKET_EXCEL_PATH, EXCLUSIVE_TICKET_MATRIX_PATH, TicketType
+
+logger = logging.getLogger("root")
+
+# excel 中表示互斥的单元格值
+EXCLUSIVE_CELL_VALUE = "N"
+
+
+class ExclusiveTicketMatrix(object):
+    """只读的单据互斥矩阵，以单据类型在矩阵中的序号作为位图的位"""
+
+    __slots__ = ("_index", "_masks", "_exclusive_types")
+
+    def __init__(self, exclusive_map: Dict[str, Iterable[str]]):
+        """
+        @param exclusive_map: {单据类型: 与之互斥的运行中单据类型列表}
+        """
+        ticket_types = sorted(set(exclusive_map) | {t for types in exclusive_map.values() for t in types})
+        index = {ticket_type: idx for idx, ticket_type in enumerate(ticket_types)}
+        masks = {}
+        for ticket_type, active_types in exclusive_map.items():
+            mask = 0
+            for active_type in active_types:
+                mask |= 1 << index[active_type]
+            masks[ticket_type] = mask
+
+        self._index = MappingProxyType(index)
+        self._masks = MappingProxyType(masks)
+        self._exclusive_types = MappingProxyType(
+            {ticket_type: tuple(sorted(active_types)) for ticket_type, active_types in exclusive_map.items()}
+        )
+
+    def is_exclusive(self, ticket_type: str, active_type: str) -> bool:
+        """判断当前单据类型是否与运行中的单据类型互斥"""
+        bit = self._index.get(active_type)
+        return bit is not None and bool(self._masks.get(ticket_type, 0) >> bit & 1)
+
+    def exclusive_types(self, ticket_type: str) -> tuple:
+        """获取与当前单据类型互斥的所有单据类型"""
+        return self._exclusive_types.get(ticket_type, ())
+
+
+def compile_exclusive_ticket_matrix(excel_path: str = EXCLUSIVE_TICKET_EXCEL_PATH) -> Dict[str, List[str]]:
+    """
+    解析互斥矩阵 excel，将单据名称转换为单据类型，返回 {单据类型: 与之互斥的单据类型列表}
+    excel 的第一行为当前单据，第一列为运行中的单据，单元格为 N 表示互斥
+    """
+    # 仅在编译时依赖 openpyxl
+    from backend.utils.excel import ExcelHandler
+
+    exclusive_map: Dict[str, List[str]] = defaultdict(list)
+    ticket_types = set(TicketType.get_values())
+    # excel 中是单据的中文名称，按源语言匹配单据类型
+    with translation.override(None):
+        for row_label, inner_dict in ExcelHandler.paser_matrix(excel_path).items():
+            for col_label, value in inner_dict.items():
+                if value != EXCLUSIVE_CELL_VALUE:
+                    continue
+                ticket_type, active_type = TicketType.get_choice_value(row_label), TicketType.get_choice_value(
+                    col_label
+                )
+                if ticket_type not in ticket_types or active_type not in ticket_types:
+                    logger.warning("unknown ticket in exclusive matrix: %s, %s", row_label, col_label)
+                    continue
+                exclusive_map[ticket_type].append(active_type)
+
+    return {ticket_type: sorted(set(active_types)) for ticket_type, active_types in sorted(exclusive_map.items())}
+
+
+@lru_cache(maxsize=1)
+def get_exclusive_ticket_matrix() -> ExclusiveTicketMatrix:
+    """加载编译好的互斥矩阵，编译结果缺失时回退为解析 excel"""
+    if os.path.exists(EXCLUSIVE_TICKET_MATRIX_PATH):
+        with open(EXCLUSIVE_TICKET_MATRIX_PATH, encoding="utf-8") as f:
+            return ExclusiveTicketMatrix(json.load(f))
+
+    logger.warning("compiled exclusive ticket matrix not found, parse %s instead", EXCLUSIVE_TICKET_EXCEL_PATH)
+    return ExclusiveTicketMatrix(compile_exclusive_ticket_matrix())
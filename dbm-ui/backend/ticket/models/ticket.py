@@ -11,7 +11,7 @@ specific language governing permissions and limitations under the License.
 
 import logging
 from collections import defaultdict
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from django.db import models, transaction
 from django.utils import timezone
@@ -21,15 +21,8 @@ from backend import env
 from backend.bk_web.constants import LEN_LONG, LEN_MIDDLE, LEN_NORMAL, LEN_SHORT
 from backend.bk_web.models import AuditedModel
 from backend.configuration.constants import DBType
-from backend.ticket.constants import (
-    EXCLUSIVE_TICKET_EXCEL_PATH,
-    FlowRetryType,
-    FlowType,
-    TicketFlowStatus,
-    TicketStatus,
-    TicketType,
-)
-from backend.utils.excel import ExcelHandler
+from backend.ticket.constants import FlowRetryType, FlowType, TicketFlowStatus, TicketStatus, TicketType
+from backend.ticket.exclusive_matrix import get_exclusive_ticket_matrix
 from backend.utils.time import calculate_cost_time
 
 logger = logging.getLogger("root")
@@ -225,10 +218,14 @@ class ClusterOperateRecordManager(models.Manager):
 
     def filter_inner_actives(self, cluster_id, *args, **kwargs):
         """获取集群正在运行的inner flow的单据记录。此时认为集群会在互斥阶段"""
+        return self.filter_clusters_inner_actives([cluster_id], *args, **kwargs)
+
+    def filter_clusters_inner_actives(self, cluster_ids: List[int], *args, **kwargs):
+        """批量获取多个集群正在运行的inner flow的单据记录"""
         # 排除特定的单据，如自身单据重试排除自身
         exclude_ticket_ids = kwargs.pop("exclude_ticket_ids", [])
         return self.filter(
-            cluster_id=cluster_id,
+            cluster_id__in=cluster_ids,
             flow__flow_type=FlowType.INNER_FLOW,
             flow__status=TicketFlowStatus.RUNNING,
             *args,
@@ -241,33 +238,28 @@ class ClusterOperateRecordManager(models.Manager):
 
     def has_exclusive_operations(self, ticket_type, cluster_id, **kwargs):
         """判断当前单据类型与集群正在进行中的单据是否互斥"""
-        active_tickets = self.filter_inner_actives(cluster_id, **kwargs)
-        exclusive_infos = []
-        for active_ticket in active_tickets:
-            try:
-                if self.exclusive_ticket_map[ticket_type][active_ticket.ticket.ticket_type]:
-                    exclusive_infos.append(
-                        {"exclusive_ticket": active_ticket.ticket, "root_id": active_ticket.flow.flow_obj_id}
-                    )
-            except KeyError:
-                pass
-
-        return exclusive_infos
+        return self.get_exclusive_operations(ticket_type, [cluster_id], **kwargs).get(cluster_id, [])
 
-    @property
-    def exclusive_ticket_map(self):
-        if hasattr(self, "_exclusive_ticket_map"):
-            return self._exclusive_ticket_map
-
-        _exclusive_matrix = ExcelHandler.paser_matrix(EXCLUSIVE_TICKET_EXCEL_PATH)
-        _exclusive_ticket_map = defaultdict(dict)
-        for row_key, inner_dict in _exclusive_matrix.items():
-            for col_key, value in inner_dict.items():
-                row_key, col_key = TicketType.get_choice_value(row_key), TicketType.get_choice_value(col_key)
-                _exclusive_ticket_map[row_key][col_key] = value == "N"
-
-        setattr(self, "_exclusive_ticket_map", _exclusive_ticket_map)
-        return self._exclusive_ticket_map
+    def get_exclusive_operations(self, ticket_type, cluster_ids: List[int], **kwargs) -> Dict[int, List[Dict]]:
+        """
+        批量判断当前单据类型与各集群正在进行中的单据是否互斥，按互斥矩阵一次查询取出所有集群的互斥记录
+        @param ticket_type: 当前单据类型
+        @param cluster_ids: 集群ID列表
+        返回存在互斥的集群 {cluster_id: [{"exclusive_ticket": 互斥单据, "root_id": 互斥流程ID}]}
+        """
+        exclusive_types = get_exclusive_ticket_matrix().exclusive_types(ticket_type)
+        if not cluster_ids or not exclusive_types:
+            return {}
+
+        active_records = self.filter_clusters_inner_actives(
+            cluster_ids, ticket__ticket_type__in=exclusive_types, **kwargs
+        ).select_related("ticket", "flow")
+        cluster_exclusive_infos: Dict[int, List[Dict]] = defaultdict(list)
+        for record in active_records:
+            cluster_exclusive_infos[record.cluster_id].append(
+                {"exclusive_ticket": record.ticket, "root_id": record.flow.flow_obj_id}
+            )
+        return cluster_exclusive_infos
 
 
 class ClusterOperateRecord(AuditedModel):
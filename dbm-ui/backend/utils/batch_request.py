@@ -8,9 +8,10 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import asyncio
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from copy import deepcopy
-from multiprocessing.pool import ThreadPool
 from typing import Callable
 
 import wrapt
@@ -89,6 +90,54 @@ def batch_request(
     if not get_count:
         return sync_batch_request(func, params, get_data, limit, start_key, limit_key)
 
+    data = []
+    for page_data in iter_batch_request(
+        func, params, start_key, limit_key, get_data, get_count, limit, sort, split_params
+    ):
+        data.extend(page_data)
+
+    return data
+
+
+def iter_batch_request(
+    func,
+    params,
+    start_key="start",
+    limit_key="limit",
+    get_data=lambda x: x["info"],
+    get_count=lambda x: x["count"],
+    limit=QUERY_CMDB_LIMIT,
+    sort=None,
+    split_params=False,
+    max_in_flight=None,
+):
+    """
+    流式并发请求接口，按分页顺序逐页返回数据，调用方可以边请求边处理，无需一次性持有全部结果
+    :param func: 请求方法
+    :param params: 请求参数
+    :param start_key: 分页起始key
+    :param limit_key: 分页最大数key
+    :param get_data: 获取数据函数
+    :param get_count: 获取总数函数
+    :param limit: 一次请求数量
+    :param sort: 排序
+    :param split_params: 是否拆分参数
+    :param max_in_flight: 最多同时请求(或已返回但未被消费)的分页数，默认为并发数的两倍
+    :return: 每一页的请求结果
+    """
+
+    # 如果该接口没有返回count参数，只能逐页同步请求
+    if not get_count:
+        start = 0
+        while True:
+            request_params = {"page": {limit_key: limit, start_key: start}}
+            request_params.update(params)
+            result = get_data(func(request_params))
+            yield result
+            if len(result) < limit:
+                return
+            start += limit
+
     if not split_params:
         final_request_params = [
             {"count": get_count(func(dict(page={start_key: 0, limit_key: 1}, **params))), "params": params}
@@ -96,31 +145,102 @@ def batch_request(
     else:
         final_request_params = format_params(params, get_count, func, start_key, limit_key)
 
-    data = []
+    def iter_request_params():
+        for req in final_request_params:
+            for start in range(0, req["count"], limit):
+                request_params = {"page": {limit_key: limit, start_key: start}}
+                if sort:
+                    request_params["page"]["sort"] = sort
+                request_params.update(req["params"])
+                yield request_params
 
-    # 根据请求总数并发请求
-    pool = ThreadPool(settings.CONCURRENT_NUMBER)
-    futures = []
+    max_in_flight = max_in_flight or settings.CONCURRENT_NUMBER * 2
+    request_func = inject_request(func)
+    in_flight = deque()
 
-    for req in final_request_params:
-        start = 0
-        while start < req["count"]:
-            request_params = {"page": {limit_key: limit, start_key: start}}
-            if sort:
-                request_params["page"]["sort"] = sort
-            request_params.update(req["params"])
-            futures.append(pool.apply_async(inject_request(func), args=(request_params,)))
+    # 根据请求总数并发请求，按提交顺序取值，保证返回顺序与分页顺序一致
+    with ThreadPoolExecutor(max_workers=settings.CONCURRENT_NUMBER) as ex:
+        try:
+            for request_params in iter_request_params():
+                if len(in_flight) >= max_in_flight:
+                    yield get_data(in_flight.popleft().result())
+                in_flight.append(ex.submit(request_func, request_params))
 
-            start += limit
+            while in_flight:
+                yield get_data(in_flight.popleft().result())
+        finally:
+            # 调用方提前结束迭代时，取消尚未开始的请求
+            for future in in_flight:
+                future.cancel()
+
+
+async def abatch_request(
+    func,
+    params,
+    start_key="start",
+    limit_key="limit",
+    get_data=lambda x: x["info"],
+    get_count=lambda x: x["count"],
+    limit=QUERY_CMDB_LIMIT,
+    sort=None,
+    in_order=False,
+):
+    """
+    asyncio 版本的并发分页请求，以异步生成器的方式逐页返回数据
+    和 batch_request 不同，这里直接用第一页的请求结果获取总数，省去单独的 count 探测请求
+    :param func: 异步请求方法，通常为 AsyncDataAPI，并发数由其按 upstream 控制
+    :param params: 请求参数
+    :param start_key: 分页起始key
+    :param limit_key: 分页最大数key
+    :param get_data: 获取数据函数
+    :param get_count: 获取总数函数
+    :param limit: 一次请求数量
+    :param sort: 排序
+    :param in_order: 是否按分页顺序返回，默认按请求完成的顺序返回
+    """
 
-    pool.close()
-    pool.join()
+    def build_page_params(start):
+        request_params = {"page": {limit_key: limit, start_key: start}}
+        if sort:
+            request_params["page"]["sort"] = sort
+        request_params.update(params)
+        return request_params
 
-    # 取值
-    for future in futures:
-        data.extend(get_data(future.get()))
+    first_page = await func(build_page_params(0))
+    yield get_data(first_page)
 
-    return data
+    futures = [
+        asyncio.ensure_future(func(build_page_params(start))) for start in range(limit, get_count(first_page), limit)
+    ]
+    try:
+        for future in futures if in_order else asyncio.as_completed(futures):
+            yield get_data(await future)
+    finally:
+        # 调用方提前结束迭代时，取消未完成的请求
+        for future in futures:
+            future.cancel()
+
+
+def async_batch_request(func, params, **kwargs):
+    """
+    在同步代码中使用 abatch_request，按分页顺序返回全部数据
+    :param func: 异步请求方法，通常为 AsyncDataAPI
+    :param params: 请求参数
+    :param kwargs: 其他参数同 abatch_request
+    :return: 请求结果
+    """
+
+    async def collect():
+        data = []
+        async for page_data in abatch_request(func, params, in_order=True, **kwargs):
+            data.extend(page_data)
+        return data
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(collect())
+    finally:
+        loop.close()
 
 
 def sync_batch_request(func, params, get_data=lambda x: x["info"], limit=500, start_key="start", limit_key="limit"):
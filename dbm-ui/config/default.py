@@ -101,6 +101,7 @@ INSTALLED_APPS += (
     "backend.db_report",
     "backend.db_services.redis.slots_migrate",
     "backend.db_services.mysql.dumper",
+    "backend.db_services.mysql.fixpoint_rollback",
 )
 
 
@@ -500,6 +501,11 @@ DEFAULT_FILE_STORAGE = STORAGE_TYPE_IMPORT_PATH_MAP[STORAGE_TYPE]
 # 并发数
 CONCURRENT_NUMBER = 10
 
+# 第三方接口(DataAPI)连接池配置：单host最大连接数，连接失败重试次数和重试退避因子
+DATA_API_POOL_MAXSIZE = 20
+DATA_API_CONNECT_RETRIES = 2
+DATA_API_RETRY_BACKOFF_FACTOR = 0.5
+
 # grafana代理配置
 BACKEND_DIR = os.path.join(BASE_DIR, "backend/bk_dataview")
 GRAFANA = {